@@ -0,0 +1,88 @@
+'''Stress benchmark of the converter, filter and reformatter on wide and
+deeply nested code.
+
+Generates modules of growing size of four shapes: a function definition with
+a wide body of calls, a long method chain, nested calls and nested lists.
+Each module is converted, filtered and reformatted, both in two passes and
+with the fused filter, and the time per AST node is reported. The time per
+node should stay flat as the modules grow, and no size should fail with a
+RecursionError. The depth of nested calls and lists is limited by the
+parser itself (about 200 levels).
+
+Usage (from the repository root):
+  python -m benchmarks.bench_deepcode [--scale 1]
+'''
+import argparse
+import ast
+import time
+
+from src.ast.astconverter import ASTConverter
+from src.ast.astfilter import ASTFilter
+from src.ast.astfusedfilter import FusedASTFilter
+from src.ast.astreformatter import ASTReformatter
+
+FUNC_ARGS = {'torch.nn.Linear': ['in_features', 'out_features']}
+
+def wide_body(size):
+  lines = ['import torch.nn as nn', 'def build():']
+  for i in range(size):
+    lines.append('  layer%d = nn.Linear(in_features=%d, out_features=2)' % (i, i))
+  return '\n'.join(lines) + '\n'
+
+def method_chain(size):
+  links = ''.join('.add(nn.Linear(in_features=%d, out_features=2))' % i for i in range(size))
+  return 'import torch.nn as nn\nmodel = nn.Sequential()' + links + '\n'
+
+def nested_calls(size):
+  return 'import torch.nn as nn\nx = ' + 'f(' * size + 'nn.Linear(in_features=1, out_features=2)' + ')' * size + '\n'
+
+def nested_lists(size):
+  return 'import torch.nn as nn\nx = ' + '[' * size + 'nn.Linear(in_features=1, out_features=2)' + ']' * size + '\n'
+
+SHAPES = [
+  ('wide body', wide_body, [1000, 2000, 4000, 8000]),
+  ('method chain', method_chain, [125, 250, 500, 1000]),
+  ('nested calls', nested_calls, [25, 50, 100, 190]),
+  ('nested lists', nested_lists, [25, 50, 100, 190])
+]
+
+def two_passes(tree):
+  filtered = ASTFilter(FUNC_ARGS).run(ASTConverter().run(tree))
+  return ASTReformatter(FUNC_ARGS).run(filtered)
+
+def fused(tree):
+  return ASTReformatter(FUNC_ARGS).run(FusedASTFilter(FUNC_ARGS).run(tree))
+
+def measure(func, tree, nodes):
+  '''Returns the time per node in microseconds and the number of results, or
+  the name of the exception raised.
+  '''
+  try:
+    start_time = time.perf_counter()
+    results = func(tree)
+    elapsed = time.perf_counter() - start_time
+  except RecursionError:
+    return None, 'RecursionError'
+  return elapsed * 1e6 / nodes, len(results)
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--scale', type = int, default = 1)
+  args = parser.parse_args()
+
+  print('%-13s %6s %8s %22s %22s' % ('shape', 'size', 'nodes', 'two passes (us/node)', 'fused (us/node)'))
+  for name, generate, sizes in SHAPES:
+    for size in sizes:
+      # Nesting depth is bounded by the parser, so only wide shapes scale.
+      if name == 'wide body':
+        size *= args.scale
+      tree = ast.parse(generate(size))
+      nodes = sum(1 for _ in ast.walk(tree))
+      columns = []
+      for func in (two_passes, fused):
+        per_node, results = measure(func, tree, nodes)
+        columns.append('%14s' % results if per_node == None else '%8.2f (%5d out)' % (per_node, results))
+      print('%-13s %6d %8d %22s %22s' % (name, size, nodes, columns[0], columns[1]))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,125 @@
+'''Microbenchmarks of the dispatch tables of the converter, filter and
+reformatter against the isinstance / type tag chains they replaced.
+
+The first benchmark looks up the converter handler of every node of the
+files, the second the filter reducer of every value of their conversions.
+Both run on the Python files under a directory (the standard library by
+default) and check that the chains and the tables pick the same handlers.
+
+Usage (from the repository root):
+  python -m benchmarks.bench_dispatch [--path DIR] [--files 500] [--repeat 5]
+'''
+import argparse
+import ast
+import gc
+import os
+import time
+
+from src.ast.astconverter import ASTConverter
+from src.ast.astfilter import ASTFilter
+from src.ast.astnodes import Node, value_type
+
+def chain_argument_converter(root):
+  if isinstance(root, ast.Call):
+    return ASTConverter.generate_call
+  elif isinstance(root, ast.Name):
+    return ASTConverter.convert_name
+  elif isinstance(root, ast.FunctionDef):
+    return ASTConverter.generate_function_def
+  elif isinstance(root, (ast.Import, ast.ImportFrom)):
+    return ASTConverter.convert_import
+  elif isinstance(root, (ast.Tuple, ast.List, ast.Set)):
+    return ASTConverter.generate_iterable
+  elif isinstance(root, ast.Dict):
+    return ASTConverter.generate_dict
+  elif isinstance(root, ast.Constant):
+    return ASTConverter.convert_constant
+  else:
+    return ASTConverter.convert_source
+
+def table_argument_converter(root):
+  return ASTConverter.argument_converters[type(root)]
+
+def chain_value_reducer(value):
+  if isinstance(value, Node):
+    if value.type == 'call':
+      return ASTFilter.reduce_call
+    elif value.type == 'set' or value.type == 'list' or value.type == 'tuple':
+      return ASTFilter.reduce_iterable
+    elif value.type == 'dict':
+      return ASTFilter.reduce_dict
+  return ASTFilter.reduce_other
+
+def table_value_reducer(value):
+  return ASTFilter.value_reducers[value_type(value)]
+
+def converted_values(converted):
+  '''Returns every node and string in a conversion.'''
+  values = []
+  todo = list(converted.values())
+  while todo:
+    value = todo.pop()
+    if isinstance(value, Node):
+      values.append(value)
+      todo.extend(getattr(value, name) for name in value.fields)
+    elif isinstance(value, (list, tuple)):
+      todo.extend(value)
+    elif isinstance(value, str):
+      values.append(value)
+  return values
+
+def load_trees(path, limit):
+  trees = []
+  for root, dirs, files in os.walk(path):
+    dirs.sort()
+    for name in sorted(files):
+      if not name.endswith('.py'):
+        continue
+      try:
+        with open(os.path.join(root, name), 'rb') as f:
+          tree = ast.parse(f.read())
+        ASTConverter().run(tree)
+      except Exception:
+        continue
+      trees.append(tree)
+      if len(trees) == limit:
+        return trees
+  return trees
+
+def timed_run(func, inputs):
+  gc.collect()
+  gc.disable()
+  start_time = time.perf_counter()
+  results = [func(value) for value in inputs]
+  elapsed = time.perf_counter() - start_time
+  gc.enable()
+  return elapsed, results
+
+def compare(name, chain, table, inputs, repeat):
+  # The runs of both versions are interleaved so that they are affected
+  # equally by the state of the machine. The best time of each is reported.
+  chain_time = table_time = None
+  for _ in range(repeat):
+    elapsed, expected = timed_run(chain, inputs)
+    chain_time = elapsed if chain_time == None else min(chain_time, elapsed)
+    elapsed, results = timed_run(table, inputs)
+    table_time = elapsed if table_time == None else min(table_time, elapsed)
+  print('%-10s %9d lookups  chains %7.3f s  tables %7.3f s  speedup %5.2fx  same handlers: %s' % (name, len(inputs), chain_time, table_time, chain_time / table_time, results == expected))
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--path', default = os.path.dirname(ast.__file__))
+  parser.add_argument('--files', type = int, default = 500)
+  parser.add_argument('--repeat', type = int, default = 5)
+  args = parser.parse_args()
+
+  trees = load_trees(args.path, args.files)
+  print('%d files from %s' % (len(trees), args.path))
+
+  nodes = [node for tree in trees for node in ast.walk(tree)]
+  compare('nodes', chain_argument_converter, table_argument_converter, nodes, args.repeat)
+  values = [value for tree in trees for value in converted_values(ASTConverter().run(tree))]
+  compare('values', chain_value_reducer, table_value_reducer, values, args.repeat)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,111 @@
+'''Scaling benchmark of the function matcher against the size of the
+configuration.
+
+Builds configurations of growing size from function_names.json padded with
+synthetic API entries (as when the whole torch/keras/tensorflow API surface
+is configured), with one entry in a hundred a wildcard pattern. For each
+size it reports:
+
+- the time per lookup of the matcher for the function names found in a
+  synthetic corpus, against matching the patterns one by one with fnmatch,
+- the time of the fused filter and reformatter over the corpus.
+
+The matcher should take about the same time at every size.
+
+Usage (from the repository root):
+  python -m benchmarks.bench_functionmatcher [--files 300]
+'''
+import argparse
+import ast
+import fnmatch
+import gc
+import random
+import time
+
+from benchmarks.corpus import random_module
+from src.ast.astconverter import ASTConverter
+from src.ast.astfusedfilter import FusedASTFilter
+from src.ast.astnodes import AttributeNode, CallNode
+from src.ast.astreformatter import ASTReformatter
+from src.readers.functionmatcher import WILDCARD, FunctionMatcher
+from src.readers.readfunctionnames import read_function_names
+
+SIZES = [100, 1000, 10000, 50000]
+MODULES = ['torch', 'torch.nn', 'torch.nn.functional', 'tensorflow', 'tf.keras.layers', 'tensorflow.math', 'keras.layers', 'keras.losses']
+
+def make_config(func_args, size, rng):
+  config = dict(func_args)
+  i = 0
+  while len(config) < size:
+    module = rng.choice(MODULES) + '.sub%d' % (i % 50)
+    if i % 100 == 0:
+      config[module + '.' + WILDCARD] = ['name']
+    else:
+      config[module + '.Function%d' % i] = ['arg%d' % j for j in range(i % 4)]
+    i += 1
+  return config
+
+def function_names(trees):
+  '''Returns the resolved function names of all calls in the trees, as the
+  filter looks them up.
+  '''
+  names = []
+  for tree in trees:
+    converted = ASTConverter().run(tree)
+    todo = list(converted['calls'])
+    while todo:
+      value = todo.pop()
+      if isinstance(value, CallNode):
+        todo.append(value.function)
+        todo.extend(value.args)
+        todo.extend(keyword.value for keyword in value.keywords)
+      elif isinstance(value, AttributeNode):
+        todo.append(value.instance)
+        names.append(value.attr)
+      elif isinstance(value, str):
+        names.append(value)
+  return names
+
+def naive_arguments(config, patterns, name):
+  if name in config:
+    return config[name]
+  for pattern in patterns:
+    if fnmatch.fnmatchcase(name, pattern) and pattern.count('.') == name.count('.'):
+      return config[pattern]
+  return None
+
+def timed(func):
+  gc.collect()
+  gc.disable()
+  start_time = time.perf_counter()
+  result = func()
+  elapsed = time.perf_counter() - start_time
+  gc.enable()
+  return elapsed, result
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--files', type = int, default = 300)
+  args = parser.parse_args()
+
+  rng = random.Random(0)
+  sources = [random_module(rng, statements = 60) for _ in range(args.files)]
+  trees = [ast.parse(source) for source in sources]
+  names = function_names(trees)
+  func_args = read_function_names('./function_names.json')
+  print('%d files, %d function name lookups' % (len(trees), len(names)))
+  print('%8s %16s %16s %14s' % ('entries', 'matcher (ns)', 'fnmatch (ns)', 'filter (s)'))
+
+  for size in SIZES:
+    config = make_config(func_args, size, rng)
+    patterns = [name for name in config if WILDCARD in name]
+    matcher = FunctionMatcher(config)
+
+    matcher_time, results = timed(lambda: [matcher.arguments(name) for name in names])
+    naive_time, expected = timed(lambda: [naive_arguments(config, patterns, name) for name in names])
+    expected = [frozenset(args) if args != None else None for args in expected]
+    filter_time, _ = timed(lambda: [ASTReformatter(matcher).run(FusedASTFilter(matcher).run(tree, source) or {'calls': [], 'function_defs': []}) for source, tree in zip(sources, trees)])
+    print('%8d %16.0f %16.0f %14.2f  same matches: %s' % (len(config), matcher_time * 1e9 / len(names), naive_time * 1e9 / len(names), filter_time, results == expected))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,68 @@
+'''Benchmark of the fused converter and filter against the two separate
+passes.
+
+Parses a synthetic corpus once, then times ASTFilter(ASTConverter()) and
+FusedASTFilter on the same trees, reports the peak memory allocated by each
+with tracemalloc and checks that both produce the same results. The fused
+filter is run both without and with the source of the trees, with which
+arguments are unparsed only if they are written out.
+
+Usage (from the repository root):
+  python -m benchmarks.bench_fusedfilter [--files 1000]
+'''
+import argparse
+import ast
+import gc
+import random
+import time
+import tracemalloc
+
+from benchmarks.corpus import random_module
+from src.ast.astconverter import ASTConverter
+from src.ast.astfilter import ASTFilter
+from src.ast.astfusedfilter import FusedASTFilter
+from src.ast.astnodes import to_json
+from src.readers.readfunctionnames import read_function_names
+
+def two_passes(func_args, source, tree):
+  return ASTFilter(func_args).run(ASTConverter().run(tree))
+
+def fused(func_args, source, tree):
+  return FusedASTFilter(func_args).run(tree)
+
+def fused_lazy(func_args, source, tree):
+  return FusedASTFilter(func_args).run(tree, source)
+
+def measure(func, func_args, sources, trees):
+  gc.collect()
+  gc.disable()
+  start_time = time.perf_counter()
+  results = [func(func_args, source, tree) for source, tree in zip(sources, trees)]
+  elapsed = time.perf_counter() - start_time
+  gc.enable()
+
+  tracemalloc.start()
+  for source, tree in zip(sources, trees):
+    func(func_args, source, tree)
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return repr(to_json(results)), elapsed, peak
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--files', type = int, default = 1000)
+  args = parser.parse_args()
+
+  rng = random.Random(0)
+  sources = [random_module(rng, statements = 60) for _ in range(args.files)]
+  trees = [ast.parse(source) for source in sources]
+  func_args = read_function_names('./function_names.json')
+
+  expected, baseline, baseline_peak = measure(two_passes, func_args, sources, trees)
+  print('two passes:  %7.2f s  peak %8.1f KB' % (baseline, baseline_peak / 1024))
+  for name, func in (('fused:', fused), ('fused, lazy:', fused_lazy)):
+    results, elapsed, peak = measure(func, func_args, sources, trees)
+    print('%-12s %7.2f s  peak %8.1f KB  speedup %.2fx  identical output: %s' % (name, elapsed, peak / 1024, baseline / elapsed, results == expected))
+
+if __name__ == '__main__':
+  main()
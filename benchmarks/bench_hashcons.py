@@ -0,0 +1,121 @@
+'''Benchmark of the hash-consing of converted nodes (see astnodes.NodeTable)
+against the same converter, filter and reformatter building a separate node
+for every occurrence of a subtree.
+
+Runs on model definition code that repeats the same layer calls (e.g.
+nn.ReLU(inplace = True)) and on random modules with little repetition. For
+each it reports the nodes built per occurrence, the memory retained by the
+conversions and the time of the two-pass and fused filters followed by the
+reformatter, and checks that the outputs are identical.
+
+Usage (from the repository root):
+  python -m benchmarks.bench_hashcons [--files 200] [--repeat 5]
+'''
+import argparse
+import ast
+import gc
+import random
+import time
+import tracemalloc
+
+from benchmarks.corpus import model_module, random_module
+from src.ast.astconverter import ASTConverter
+from src.ast.astfilter import ASTFilter
+from src.ast.astfusedfilter import FusedASTFilter
+from src.ast.astnodes import NodeTable, build_node
+from src.ast.astreformatter import ASTReformatter
+from src.readers.functionmatcher import FunctionMatcher
+from src.readers.readfunctionnames import read_function_names
+
+class UnsharedNodeTable(NodeTable):
+  '''Builds a new node for every occurrence of a subtree.'''
+
+  def node(self, *key):
+    return build_node(key)
+
+class CountingNodeTable(NodeTable):
+  def __init__(self):
+    super().__init__()
+    self.occurrences = 0
+
+  def node(self, *key):
+    self.occurrences += 1
+    return super().node(*key)
+
+def converter(table_class):
+  converter = ASTConverter()
+  converter.nodes = table_class()
+  return converter
+
+def fused_filter(matcher, table_class):
+  fused_filter = FusedASTFilter(matcher)
+  fused_filter.nodes = table_class()
+  return fused_filter
+
+def reformat(matcher, filtered):
+  return ASTReformatter(matcher).run(filtered) if filtered != None else None
+
+def two_pass(matcher, table_class, tree):
+  return reformat(matcher, ASTFilter(matcher).run(converter(table_class).run(tree)))
+
+def fused(matcher, table_class, tree):
+  return reformat(matcher, fused_filter(matcher, table_class).run(tree))
+
+def timed_run(func, matcher, table_class, trees):
+  gc.collect()
+  gc.disable()
+  start_time = time.perf_counter()
+  results = [func(matcher, table_class, tree) for tree in trees]
+  elapsed = time.perf_counter() - start_time
+  gc.enable()
+  return elapsed, results
+
+def retained_memory(table_class, trees):
+  gc.collect()
+  tracemalloc.start()
+  conversions = [converter(table_class).run(tree) for tree in trees]
+  gc.collect()
+  retained = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  return retained
+
+def compare(name, func, matcher, trees, repeat):
+  # The runs of both versions are interleaved so that they are affected
+  # equally by the state of the machine. The best time of each is reported.
+  unshared_time = shared_time = None
+  for _ in range(repeat):
+    elapsed, expected = timed_run(func, matcher, UnsharedNodeTable, trees)
+    unshared_time = elapsed if unshared_time == None else min(unshared_time, elapsed)
+    elapsed, results = timed_run(func, matcher, NodeTable, trees)
+    shared_time = elapsed if shared_time == None else min(shared_time, elapsed)
+  print('  %-9s unshared %7.3f s  shared %7.3f s  speedup %5.2fx  identical output: %s' % (name, unshared_time, shared_time, unshared_time / shared_time, results == expected))
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--files', type = int, default = 200)
+  parser.add_argument('--repeat', type = int, default = 5)
+  args = parser.parse_args()
+
+  matcher = FunctionMatcher(read_function_names('./function_names.json'))
+  rng = random.Random(0)
+  corpora = [
+    ('model code', [ast.parse(model_module(rng)) for _ in range(args.files)]),
+    ('random modules', [ast.parse(random_module(rng, statements = 60)) for _ in range(args.files)])
+  ]
+
+  for name, trees in corpora:
+    occurrences = built = 0
+    for tree in trees:
+      counting = converter(CountingNodeTable)
+      counting.run(tree)
+      occurrences += counting.nodes.occurrences
+      built += len(counting.nodes)
+    unshared_memory = retained_memory(UnsharedNodeTable, trees)
+    shared_memory = retained_memory(NodeTable, trees)
+    print('%s: %d files, %d nodes built for %d occurrences (%.0f%%)' % (name, len(trees), built, occurrences, 100.0 * built / occurrences))
+    print('  memory    unshared %7.1f MB  shared %7.1f MB  (%.0f%% less)' % (unshared_memory / 2 ** 20, shared_memory / 2 ** 20, 100.0 * (1 - shared_memory / unshared_memory)))
+    compare('two-pass', two_pass, matcher, trees, args.repeat)
+    compare('fused', fused, matcher, trees, args.repeat)
+
+if __name__ == '__main__':
+  main()
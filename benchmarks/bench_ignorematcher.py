@@ -0,0 +1,80 @@
+'''Benchmark for the compiled ignore matcher.
+
+Generates a synthetic tree with 1M entries (directories and files named like
+those found in ML repositories) and compares the per-pattern regex checks in
+filecrawler.is_valid_file against IgnoreMatcher.
+
+Usage (from the repository root):
+  python -m benchmarks.bench_ignorematcher [--entries 1000000]
+'''
+import argparse
+import random
+import time
+
+from src.readers.filecrawler import is_pattern_match, is_valid_file
+from src.readers.ignore import create_ignore_dict
+from src.readers.ignorematcher import IgnoreMatcher
+
+FILE_NAMES = ['__init__.py', 'utils.py', 'model.py', 'train.py', 'resnet.py', 'README.md', 'setup.cfg', 'data.csv', 'weights.h5', 'notebook.ipynb']
+DIR_NAMES = ['src', 'models', 'tests', 'data', 'docs', 'scripts', 'configs', 'layers']
+
+def synthetic_tree(entries, seed = 0):
+  '''Returns a list of (is_directory, name) pairs. Roughly 1 in 8 entries is a
+  directory and a third of the names are unique to mimic generated files.
+  '''
+  rng = random.Random(seed)
+  tree = []
+  for i in range(entries):
+    if rng.random() < 0.125:
+      name = rng.choice(DIR_NAMES)
+      tree.append((True, name if rng.random() < 0.7 else name + str(i)))
+    else:
+      name = rng.choice(FILE_NAMES)
+      if rng.random() < 0.3:
+        name = str(i) + '_' + name
+      tree.append((False, name))
+  return tree
+
+def original_is_valid_directory(dir_name, ignore_list):
+  in_include_list = is_pattern_match(dir_name, ignore_list['include_patterns']) or is_pattern_match(dir_name + '/', ignore_list['include_directories'])
+  in_ignore_list = is_pattern_match(dir_name, ignore_list['name_patterns']) or is_pattern_match(dir_name + '/', ignore_list['directories'])
+  return in_include_list or not in_ignore_list
+
+def run_original(tree, ignore_list):
+  kept = 0
+  for is_directory, name in tree:
+    if is_directory:
+      kept += original_is_valid_directory(name, ignore_list)
+    else:
+      kept += is_valid_file(name, ignore_list)
+  return kept
+
+def run_matcher(tree, ignore_list):
+  matcher = IgnoreMatcher(ignore_list)
+  kept = 0
+  for is_directory, name in tree:
+    if is_directory:
+      kept += matcher.is_valid_directory(name)
+    else:
+      kept += matcher.is_valid_file(name)
+  return kept
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--entries', type = int, default = 1000000)
+  args = parser.parse_args()
+
+  ignore_list = create_ignore_dict()
+  tree = synthetic_tree(args.entries)
+
+  timings = {}
+  for label, func in [('re.search per pattern', run_original), ('IgnoreMatcher', run_matcher)]:
+    start_time = time.perf_counter()
+    kept = func(tree, ignore_list)
+    timings[label] = time.perf_counter() - start_time
+    print('%-22s %8.3f s  (%d of %d entries kept)' % (label, timings[label], kept, len(tree)))
+
+  print('Speedup: %.1fx' % (timings['re.search per pattern'] / timings['IgnoreMatcher']))
+
+if __name__ == '__main__':
+  main()
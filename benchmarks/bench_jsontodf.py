@@ -0,0 +1,159 @@
+'''Benchmark of the loader of jsontodf.py (see output_gen.callframe) on a
+synthetic output tree.
+
+Writes --calls calls to the functions of function_names.json, with random
+constant keyword values, spread over the records of --repos repositories,
+to JSON Lines shards or with --format files to a JSON file per record.
+Each loader runs in a fresh process, which reports its time and the growth
+of its peak resident memory: load_calls with the keywords in the long table, then the
+pivot of the keywords to a column per keyword name.
+
+The loader of earlier versions of jsontodf.py concatenated a DataFrame per
+record and turned the keywords of each call into a dict with iterrows, in
+quadratic time. It is timed on a tree of --baseline-calls calls only.
+
+Usage (from the repository root):
+  python -m benchmarks.bench_jsontodf [--calls 2000000] [--repos 100] [--format jsonl] [--baseline-calls 20000]
+'''
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+
+from src.output_gen.callframe import load_calls, pd, pivot_keywords
+from src.output_gen.jsonlsink import JSONLSink, read_records
+from src.output_gen.output import FileSink
+from src.readers.readfunctionnames import read_function_names
+
+STRINGS = ['relu', 'same', 'valid', 'mean', 'sum', 'zeros', 'cuda', 'float32']
+
+def random_value(rng):
+  kind = rng.randrange(5)
+  if kind == 0:
+    return rng.randrange(1024)
+  elif kind == 1:
+    return rng.choice((0.1, 0.5, 1e-5, 0.9, 0.999))
+  elif kind == 2:
+    return rng.random() < 0.5
+  elif kind == 3:
+    return rng.choice(STRINGS)
+  return None
+
+def random_record(rng, functions, calls):
+  result = []
+  for _ in range(calls):
+    function, arguments = rng.choice(functions)
+    keywords = [{'keyword': name, 'value': random_value(rng)} for name in arguments if rng.random() < 0.7]
+    result.append({'type': 'call', 'function': function, 'args': [], 'keywords': keywords})
+  return result
+
+def write_tree(output_path, output_format, functions, calls, repos, seed = 0):
+  # Records of 1 to 19 calls, like the output of a source file.
+  rng = random.Random(seed)
+  written = 0
+  record = 0
+  sinks = 0
+  while written < calls:
+    repo = 'user%d/repo' % (sinks % repos)
+    sinks += 1
+    project_path = os.path.join('/project', repo)
+    if output_format == 'jsonl':
+      sink = JSONLSink(project_path, output_path, repo)
+    else:
+      sink = FileSink(project_path, os.path.join(output_path, repo))
+    for _ in range(max(1, calls // repos // 10)):
+      result = random_record(rng, functions, min(rng.randrange(1, 20), calls - written))
+      sink.write(os.path.join(project_path, 'pkg', '%d.py' % record), result)
+      written += len(result)
+      record += 1
+      if written >= calls:
+        break
+    sink.close()
+  return record
+
+def load_baseline(output_path):
+  # The loader of earlier versions of jsontodf.py.
+  bigDf = pd.DataFrame()
+  for record in read_records(output_path):
+    df = pd.DataFrame(record['calls'])
+    df['project_type'] = record['repo'].split('/')[0]
+    bigDf = pd.concat([bigDf, df])
+  bigDf = bigDf.reset_index()
+  bigDf = bigDf[['project_type', 'function', 'keywords']]
+  for index, row in bigDf.iterrows():
+    newDict = {}
+    if len(row['keywords']) > 0:
+      for i in row['keywords']:
+        newDict[i['keyword']] = i['value']
+      bigDf.at[index, 'keywords'] = newDict
+    else:
+      bigDf = bigDf.drop(index)
+  return bigDf
+
+def measure(loader, output_path, results):
+  # ru_maxrss is in kB.
+  start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  start_time = time.perf_counter()
+  peaks = []
+  if loader == 'baseline':
+    rows = len(load_baseline(output_path))
+    times = [time.perf_counter() - start_time]
+  else:
+    calls, keywords = load_calls(output_path)
+    times = [time.perf_counter() - start_time]
+    rows = (len(calls), len(keywords))
+    peaks = [(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_rss) / 1024]
+    start_time = time.perf_counter()
+    wide = pivot_keywords(keywords)
+    times.append(time.perf_counter() - start_time)
+    rows += wide.shape
+  peaks.append((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_rss) / 1024)
+  results.put((times, rows, peaks))
+
+def run(loader, output_path):
+  # A fresh process, so that the peak memory is that of the loader.
+  context = multiprocessing.get_context('spawn')
+  results = context.Queue()
+  process = context.Process(target = measure, args = (loader, output_path, results))
+  process.start()
+  result = results.get()
+  process.join()
+  return result
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--calls', type = int, default = 2000000)
+  parser.add_argument('--repos', type = int, default = 100)
+  parser.add_argument('--format', choices = ['jsonl', 'files'], default = 'jsonl')
+  parser.add_argument('--baseline-calls', type = int, default = 20000)
+  args = parser.parse_args()
+
+  if pd == None:
+    print('pandas is not installed')
+    return
+
+  functions = sorted(read_function_names('./function_names.json').items())
+
+  root = tempfile.mkdtemp()
+  try:
+    for loader, calls in (('callframe', args.calls), ('baseline', args.baseline_calls)):
+      output_path = os.path.join(root, loader)
+      start_time = time.perf_counter()
+      records = write_tree(output_path, args.format if loader == 'callframe' else 'jsonl', functions, calls, args.repos)
+      print('%s: %d calls in %d records written in %.1f s' % (loader, calls, records, time.perf_counter() - start_time))
+      times, rows, peaks = run(loader, output_path)
+      if loader == 'baseline':
+        print('  load   %7.2f s  %8.0f calls/s  peak %7.1f MB  %d calls with keywords' % (times[0], calls / times[0], peaks[0], rows))
+      else:
+        print('  load   %7.2f s  %8.0f calls/s  peak %7.1f MB  %5.1f bytes/call  %d calls, %d keywords' % (times[0], calls / times[0], peaks[0], peaks[0] * (1 << 20) / calls, rows[0], rows[1]))
+        print('  pivot  %7.2f s  %8.0f calls/s  peak %7.1f MB  %d calls x %d keyword names' % (times[1], calls / times[1], peaks[1], rows[2], rows[3]))
+      shutil.rmtree(output_path)
+  finally:
+    shutil.rmtree(root)
+
+if __name__ == '__main__':
+  main()
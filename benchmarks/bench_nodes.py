@@ -0,0 +1,74 @@
+'''Memory benchmark of the compact node model of the converter against the
+dictionaries of its JSON representation.
+
+Converts the Python files under a directory (the standard library by
+default) and keeps every conversion in memory, once as nodes (the output of
+ASTConverter.run()) and once as dictionaries (the same conversions turned
+into their JSON representation with to_json). The memory retained by each
+is measured with tracemalloc, and the filter and reformatter are run over
+the nodes to check that they produce the same output as over the
+dictionaries' round trip through from_json.
+
+Usage (from the repository root):
+  python -m benchmarks.bench_nodes [--path DIR] [--files 500]
+'''
+import argparse
+import ast
+import gc
+import os
+import tracemalloc
+
+from benchmarks.bench_dispatch import load_trees
+from src.ast.astconverter import ASTConverter
+from src.ast.astfilter import ASTFilter
+from src.ast.astnodes import from_json, to_json
+from src.ast.astreformatter import ASTReformatter
+
+FUNC_ARGS = {
+  'os.path.join': [],
+  'isinstance': [],
+  'len': [],
+  'print': ['file'],
+  'open': ['mode', 'encoding']
+}
+
+def retained_memory(convert, trees):
+  '''Returns the conversions of the trees and the memory they retain.'''
+  gc.collect()
+  tracemalloc.start()
+  results = [convert(tree) for tree in trees]
+  gc.collect()
+  retained = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  return results, retained
+
+def as_nodes(tree):
+  return ASTConverter().run(tree)
+
+def as_dicts(tree):
+  return to_json(ASTConverter().run(tree))
+
+def output(converted):
+  filtered = ASTFilter(FUNC_ARGS).run(converted)
+  return ASTReformatter(FUNC_ARGS).run(filtered) if filtered != None else None
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--path', default = os.path.dirname(ast.__file__))
+  parser.add_argument('--files', type = int, default = 500)
+  args = parser.parse_args()
+
+  trees = load_trees(args.path, args.files)
+  print('%d files from %s' % (len(trees), args.path))
+
+  dicts, dicts_memory = retained_memory(as_dicts, trees)
+  nodes, nodes_memory = retained_memory(as_nodes, trees)
+  print('dictionaries: %8.1f MB' % (dicts_memory / 2 ** 20))
+  print('nodes:        %8.1f MB  (%.0f%% less)' % (nodes_memory / 2 ** 20, 100.0 * (1 - nodes_memory / dicts_memory)))
+
+  expected = [output(from_json(converted)) for converted in dicts]
+  results = [output(converted) for converted in nodes]
+  print('identical output: %s' % (results == expected))
+
+if __name__ == '__main__':
+  main()
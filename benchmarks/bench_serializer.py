@@ -0,0 +1,149 @@
+'''Benchmark of the JSON serializer backends (see output_gen.serializer) on
+reformatter output.
+
+The records are the output of the fused filter and the reformatter on
+model definition code and random modules, or on the Python files under
+--path. Each backend writes them through the output sinks: as indented and
+compact files with FileSink and as shards with JSONLSink. The benchmark
+reports the throughput and the bytes written, and checks that the output of
+every backend parses to the records. For the files, 'stdlib-iterencode'
+streams the chunks of JSONEncoder.iterencode to the file instead of
+encoding each record in one call.
+
+Usage (from the repository root):
+  python -m benchmarks.bench_serializer [--files 400] [--path DIR] [--repeat 5]
+'''
+import argparse
+import ast
+import gc
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.corpus import model_module, random_module
+from src.ast.astfusedfilter import FusedASTFilter
+from src.ast.astreformatter import ASTReformatter
+from src.output_gen.jsonlsink import JSONLSink, read_records
+from src.output_gen.output import FileSink, get_output_file
+from src.output_gen.serializer import StdlibSerializer, available_backends, get_serializer
+from src.readers.functionmatcher import FunctionMatcher
+from src.readers.readfunctionnames import read_function_names
+
+class StreamingSerializer(StdlibSerializer):
+  name = 'stdlib-iterencode'
+
+  def dump(self, value, output_file):
+    for chunk in self.encoder.iterencode(value):
+      output_file.write(chunk.encode())
+
+def reformatted(matcher, sources):
+  results = []
+  for source in sources:
+    try:
+      filtered = FusedASTFilter(matcher).run(ast.parse(source), source)
+    except Exception:
+      continue
+    if filtered != None:
+      results.append(ASTReformatter(matcher).run(filtered))
+  return results
+
+def read_sources(path, limit):
+  sources = []
+  for root, dirs, files in os.walk(path):
+    dirs.sort()
+    for name in sorted(files):
+      if name.endswith('.py'):
+        with open(os.path.join(root, name), 'rb') as f:
+          sources.append(f.read())
+        if len(sources) == limit:
+          return sources
+  return sources
+
+def write_files(serializer, records, output_path):
+  sink = FileSink(output_path, output_path, serializer)
+  for index, result in enumerate(records):
+    sink.write(os.path.join(output_path, 'f%d.py' % index), result)
+  sink.close()
+
+def write_jsonl(serializer, records, output_path):
+  sink = JSONLSink(output_path, output_path, 'user/repo', serializer = serializer)
+  for index, result in enumerate(records):
+    sink.write(os.path.join(output_path, 'f%d.py' % index), result)
+  sink.close()
+
+def read_files(records, output_path):
+  results = []
+  for index in range(len(records)):
+    with open(get_output_file(os.path.join(output_path, 'f%d.py' % index), output_path, output_path), 'rb') as f:
+      results.append(json.load(f))
+  return results
+
+def read_jsonl(records, output_path):
+  return [record['calls'] for record in read_records(output_path)]
+
+def output_size(output_path):
+  return sum(os.path.getsize(os.path.join(root, name)) for root, dirs, files in os.walk(output_path) for name in files)
+
+def timed_write(write, serializer, records, root):
+  output_path = tempfile.mkdtemp(dir = root)
+  gc.collect()
+  gc.disable()
+  start_time = time.perf_counter()
+  write(serializer, records, output_path)
+  elapsed = time.perf_counter() - start_time
+  gc.enable()
+  return elapsed, output_path
+
+def compare(name, write, read, serializers, records, root, repeat):
+  # The runs of the backends are interleaved so that they are affected
+  # equally by the state of the machine. The best time of each is reported.
+  expected = json.loads(json.dumps(records))
+  times = {}
+  sizes = {}
+  same = {}
+  for _ in range(repeat):
+    for serializer in serializers:
+      elapsed, output_path = timed_write(write, serializer, records, root)
+      times[serializer.name] = min(times.get(serializer.name, elapsed), elapsed)
+      sizes[serializer.name] = output_size(output_path)
+      same[serializer.name] = read(records, output_path) == expected
+      shutil.rmtree(output_path)
+
+  print(name)
+  baseline = times[serializers[0].name]
+  for serializer in serializers:
+    elapsed = times[serializer.name]
+    size = sizes[serializer.name]
+    print('  %-18s %7.3f s  %7.1f MB/s  %10d bytes  speedup %5.2fx  same records: %s' % (serializer.name, elapsed, size / elapsed / 2 ** 20, size, baseline / elapsed, same[serializer.name]))
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--files', type = int, default = 400)
+  parser.add_argument('--path', help = 'directory of Python files to analyse instead of generated modules')
+  parser.add_argument('--repeat', type = int, default = 5)
+  args = parser.parse_args()
+
+  matcher = FunctionMatcher(read_function_names('./function_names.json'))
+  if args.path != None:
+    sources = read_sources(args.path, args.files)
+  else:
+    rng = random.Random(0)
+    sources = [(model_module(rng) if index % 2 == 0 else random_module(rng)).encode() for index in range(args.files)]
+  records = reformatted(matcher, sources)
+  print('%d records of %d files, backends: %s' % (len(records), len(sources), ', '.join(available_backends())))
+
+  root = tempfile.mkdtemp()
+  try:
+    for name, indent, write, read in (('indented files', 2, write_files, read_files), ('compact files', None, write_files, read_files), ('jsonl', None, write_jsonl, read_jsonl)):
+      serializers = [get_serializer(backend, indent) for backend in available_backends()]
+      if write == write_files:
+        serializers.insert(1, StreamingSerializer(indent))
+      compare(name, write, read, serializers, records, root, args.repeat)
+  finally:
+    shutil.rmtree(root)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,100 @@
+'''Benchmark of the SQLite output sink (see output_gen.sqlitesink).
+
+Analyses generated model code and random modules once and writes the
+reformatter output of every file to --repos repositories, with the SQLite
+sink and with the JSON Lines sink. Reports the insert throughput against
+the time the analysis of the files took, which the sink has to keep up
+with, and the time of lookups of the repositories that call a function
+with a keyword value, which match one or all of the repositories: a query
+on the database against a scan of the JSON Lines shards.
+
+Usage (from the repository root):
+  python -m benchmarks.bench_sqlitesink [--files 400] [--repos 50] [--repeat 5]
+'''
+import argparse
+import ast
+import gc
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.corpus import model_module, random_module
+from src.ast.astfusedfilter import FusedASTFilter
+from src.ast.astreformatter import ASTReformatter
+from src.output_gen.jsonlsink import JSONLSink, read_records
+from src.output_gen.sqlitesink import DATABASE_NAME, SQLiteSink, connect, find_repos
+from src.readers.functionmatcher import FunctionMatcher
+from src.readers.readfunctionnames import read_function_names
+
+def analyse(matcher, sources):
+  results = []
+  for source in sources:
+    filtered = FusedASTFilter(matcher).run(ast.parse(source), source)
+    if filtered != None:
+      results.append(ASTReformatter(matcher).run(filtered))
+  return results
+
+def write_repos(sink_class, results, repos, output_path):
+  # The repositories differ in one call, which the selective lookup finds.
+  for repo in range(repos):
+    sink = sink_class(output_path, output_path, 'user/repo%d' % repo)
+    sink.write(os.path.join(output_path, 'config.py'), [{'type': 'call', 'function': 'torch.nn.Conv2d', 'args': [], 'keywords': [{'keyword': 'stride', 'value': repo}]}])
+    for index, result in enumerate(results):
+      sink.write(os.path.join(output_path, '%d.py' % index), result)
+    sink.close()
+
+def scan_repos(output_path, function, keyword, value):
+  repos = set()
+  for record in read_records(output_path):
+    for call in record['calls']:
+      if call['function'] == function and any(item['keyword'] == keyword and item['value'] == value and type(item['value']) is type(value) for item in call['keywords']):
+        repos.add(record['repo'])
+  return sorted(repos)
+
+def timed(func, *args):
+  gc.collect()
+  gc.disable()
+  start_time = time.perf_counter()
+  result = func(*args)
+  elapsed = time.perf_counter() - start_time
+  gc.enable()
+  return elapsed, result
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--files', type = int, default = 400)
+  parser.add_argument('--repos', type = int, default = 50)
+  parser.add_argument('--repeat', type = int, default = 5)
+  args = parser.parse_args()
+
+  matcher = FunctionMatcher(read_function_names('./function_names.json'))
+  rng = random.Random(0)
+  sources = [(model_module(rng) if index % 2 == 0 else random_module(rng)).encode() for index in range(args.files)]
+  analysis_time, results = min(timed(analyse, matcher, sources) for _ in range(args.repeat))
+  calls = sum(len(result) for result in results)
+  print('%d files, %d with output, %d calls, analysis %.3f s (%.0f calls/s)' % (len(sources), len(results), calls, analysis_time, calls / analysis_time))
+
+  root = tempfile.mkdtemp()
+  try:
+    sqlite_path = os.path.join(root, 'sqlite')
+    jsonl_path = os.path.join(root, 'jsonl')
+    sqlite_time = timed(write_repos, SQLiteSink, results, args.repos, sqlite_path)[0]
+    jsonl_time = timed(write_repos, JSONLSink, results, args.repos, jsonl_path)[0]
+    total = calls * args.repos
+    print('%d repos, %d calls' % (args.repos, total))
+    print('  insert  sqlite %7.3f s  %8.0f calls/s  %5.1fx the analysis rate  %6.1f MB' % (sqlite_time, total / sqlite_time, total / sqlite_time / (calls / analysis_time), os.path.getsize(os.path.join(sqlite_path, DATABASE_NAME)) / 2 ** 20))
+    print('  write   jsonl  %7.3f s  %8.0f calls/s' % (jsonl_time, total / jsonl_time))
+
+    connection = connect(os.path.join(sqlite_path, DATABASE_NAME))
+    for name, lookup in (('selective', ('torch.nn.Conv2d', 'stride', 7)), ('common', ('torch.nn.ReLU', 'inplace', True))):
+      query_time, repos = min(timed(find_repos, connection, *lookup) for _ in range(args.repeat))
+      scan_time, scanned = timed(scan_repos, jsonl_path, *lookup)
+      print('  lookup  %-9s query %8.4f s  scan %7.3f s  speedup %6.0fx  same repos: %s (%d)' % (name, query_time, scan_time, scan_time / query_time, repos == scanned, len(repos)))
+    connection.close()
+  finally:
+    shutil.rmtree(root)
+
+if __name__ == '__main__':
+  main()
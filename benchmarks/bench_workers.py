@@ -0,0 +1,60 @@
+'''Scaling benchmark for main.py --workers.
+
+Runs main.py on a synthetic corpus with 1, 2, 4, ... up to N worker
+processes, reports the throughput of each run and checks that every run
+produced byte-for-byte the same output tree as the serial run.
+
+Usage (from the repository root):
+  python -m benchmarks.bench_workers [--files 2000] [--max-workers N]
+'''
+import argparse
+import filecmp
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import make_corpus
+
+def same_tree(left, right):
+  comparison = filecmp.dircmp(left, right)
+  if comparison.left_only or comparison.right_only or comparison.funny_files:
+    return False
+  _, mismatch, errors = filecmp.cmpfiles(left, right, comparison.common_files, shallow = False)
+  if mismatch or errors:
+    return False
+  return all(same_tree(os.path.join(left, d), os.path.join(right, d)) for d in comparison.common_dirs)
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--files', type = int, default = 2000)
+  parser.add_argument('--max-workers', type = int, default = os.cpu_count())
+  args = parser.parse_args()
+
+  root = tempfile.mkdtemp()
+  try:
+    corpus = make_corpus(os.path.join(root, 'corpus'), args.files)
+    worker_counts = [1]
+    while worker_counts[-1] * 2 <= args.max_workers:
+      worker_counts.append(worker_counts[-1] * 2)
+    if worker_counts[-1] != args.max_workers:
+      worker_counts.append(args.max_workers)
+
+    baseline = None
+    for workers in worker_counts:
+      output_path = os.path.join(root, 'output_%d' % workers)
+      start_time = time.perf_counter()
+      subprocess.run([sys.executable, 'main.py', corpus, output_path, '--workers', str(workers)], check = True, stdout = subprocess.DEVNULL)
+      elapsed = time.perf_counter() - start_time
+
+      if baseline == None:
+        baseline = (output_path, elapsed)
+      identical = same_tree(baseline[0], output_path)
+      print('workers %3d: %7.2f s  %8.1f files/s  speedup %5.2fx  identical output: %s' % (workers, elapsed, args.files / elapsed, baseline[1] / elapsed, identical))
+  finally:
+    shutil.rmtree(root)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,70 @@
+'''Synthetic source trees for the benchmarks.
+
+The generated modules look like typical model definition code: imports of
+torch/tensorflow, layer constructors with positional and keyword arguments,
+nested calls, function definitions and nn.Module classes.
+'''
+import os
+import random
+
+CALLS = ['nn.Conv2d', 'nn.Linear', 'nn.ReLU', 'nn.BatchNorm2d', 'nn.Dropout', 'torch.nn.Conv1d', 'layers.Dense', 'tf.keras.layers.Conv2D', 'optim.SGD', 'print', 'np.zeros', 'os.path.join']
+KEYWORDS = ['in_channels', 'out_channels', 'inplace', 'p', 'bias', 'lr', 'momentum', 'units', 'activation', 'stride', 'padding']
+VALUES = ['3', '64', 'True', "'relu'", '0.5', 'x', 'x + 1', 'f(1)', '[1, 2]', '(3, 3)', 'None', 'self.dim']
+IMPORTS = ['import torch', 'import torch.nn as nn', 'from torch import nn', 'from torch import optim', 'import tensorflow as tf', 'from tensorflow.keras import layers', 'import numpy as np', 'import os']
+
+def random_call(rng, depth = 0):
+  args = []
+  for _ in range(rng.randint(0, 3)):
+    args.append(random_call(rng, depth + 1) if depth < 2 and rng.random() < 0.15 else rng.choice(VALUES))
+  for keyword in rng.sample(KEYWORDS, rng.randint(0, 3)):
+    args.append(keyword + ' = ' + rng.choice(VALUES))
+  return rng.choice(CALLS) + '(' + ', '.join(args) + ')'
+
+def random_module(rng, statements = 30):
+  '''Returns the source of a random module.'''
+  lines = rng.sample(IMPORTS, rng.randint(0, 4))
+  for i in range(rng.randint(1, statements)):
+    kind = rng.random()
+    if kind < 0.5:
+      lines.append('y%d = %s' % (i, random_call(rng)))
+    elif kind < 0.8:
+      lines.append('def f%d(x, y = 1):\n  z = %s\n  if x:\n    return %s\n  return z' % (i, random_call(rng), random_call(rng)))
+    else:
+      layers = ', '.join(random_call(rng) for _ in range(rng.randint(1, 8)))
+      lines.append('class Block%d(nn.Module):\n  def __init__(self):\n    super().__init__()\n    self.layers = nn.Sequential(%s)' % (i, layers))
+  return '\n'.join(lines) + '\n'
+
+# Layers repeated by the blocks of model_module, as in ResNet or VGG style
+# model definitions.
+BLOCK_LAYERS = [
+  'nn.Conv2d(%(c)d, %(c)d, kernel_size = 3, stride = 1, padding = 1, bias = False)',
+  'nn.BatchNorm2d(%(c)d)',
+  'nn.ReLU(inplace = True)',
+  'nn.Conv2d(%(c)d, %(c)d, kernel_size = 3, padding = 1, bias = False)',
+  'nn.BatchNorm2d(%(c)d, momentum = 0.1)',
+  'nn.Dropout(p = 0.5)',
+  'nn.MaxPool2d(kernel_size = 2, stride = 2)'
+]
+
+def model_module(rng, blocks = 20):
+  '''Returns the source of a module of model definitions that repeat the
+  same layer calls, with a few channel sizes.
+  '''
+  lines = ['import torch', 'import torch.nn as nn']
+  for i in range(blocks):
+    channels = rng.choice([64, 128, 256, 512])
+    layers = ',\n      '.join(layer % {'c': channels} for layer in rng.sample(BLOCK_LAYERS, rng.randint(3, len(BLOCK_LAYERS))))
+    lines.append('class Block%d(nn.Module):\n  def __init__(self):\n    super().__init__()\n    self.layers = nn.Sequential(\n      %s)\n    self.relu = nn.ReLU(inplace = True)\n\n  def forward(self, x):\n    return self.relu(self.layers(x) + x)' % (i, layers))
+  return '\n'.join(lines) + '\n'
+
+def make_corpus(root, files, seed = 0, statements = 30):
+  '''Writes 'files' random modules under 'root', spread over a few levels of
+  packages, and returns the root.
+  '''
+  rng = random.Random(seed)
+  for i in range(files):
+    directory = os.path.join(root, 'pkg%d' % (i % 10), 'sub%d' % (i % 7))
+    os.makedirs(directory, exist_ok = True)
+    with open(os.path.join(directory, 'module%d.py' % i), 'w') as f:
+      f.write(random_module(rng, statements))
+  return root
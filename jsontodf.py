@@ -1,52 +1,34 @@
-import pandas as pd
-import json
-import os
+import argparse
 import sys
-import string
-import shutil
-import re
-
-folder = 'outputs'
-def run_fast_scandir(dir, ext):    # dir: str, ext: list
-    subfolders, files = [], []
-
-    for f in os.scandir(dir):
-        if f.is_dir():
-            subfolders.append(f.path)
-        if f.is_file():
-            if os.path.splitext(f.name)[1].lower() in ext:
-                files.append(f.path)
-
-
-    for dir in list(subfolders):
-        sf, f = run_fast_scandir(dir, ext)
-        subfolders.extend(sf)
-        files.extend(f)
-    return subfolders, files
-
-subfolders, files = run_fast_scandir(folder, [".json"])
-
-bigDf = pd.DataFrame()
-for f in files:
-    projectName = f[8:].split('/')[0]
-    df = pd.read_json(f)
-    df['project_type'] = projectName
-    frames = [bigDf, df]
-    bigDf = pd.concat(frames)
-
-bigDf = bigDf.reset_index()
-bigDf = bigDf[['project_type', 'function', 'keywords']]
-
-for index, row in bigDf.iterrows():
-    newDict = {}
-    if len(row['keywords']) > 0:
-        for i in row['keywords']:
-            nk = i['keyword']
-            nv = i['value']
-            newDict[nk] = nv
-        bigDf.at[index, 'keywords'] = newDict
-    else :
-        bigDf = bigDf.drop(index )
-
-
-#bigDf.to_csv('testProgramAnalysis')
+
+from src.output_gen.callframe import load_calls, pd, pivot_keywords
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder", nargs="?", default="outputs", help="output directory of main.py or repos_to_ast.py, with JSON files, JSON Lines shards or a SQLite database")
+    parser.add_argument("--wide", action="store_true", help="add a column per keyword name to the calls instead of keeping the keywords in a long table")
+    parser.add_argument("--keywords", nargs="+", help="keyword names that get a column with --wide (default: all)")
+    args = parser.parse_args()
+
+    if pd == None:
+        print("Error: pandas is not installed")
+        return 1
+
+    # The records are read into column buffers and the tables are built once,
+    # with a row per call and a row per keyword argument of a call
+    calls, keywords = load_calls(args.folder)
+
+    # Calls without keywords are dropped
+    bigDf = calls.loc[keywords["call"].unique()]
+    if args.wide:
+        bigDf = bigDf.join(pivot_keywords(keywords, args.keywords))
+
+    print("%d calls, %d with keywords, %d keyword arguments" % (len(calls), len(bigDf), len(keywords)))
+
+    #bigDf.to_csv('testProgramAnalysis')
+    #keywords.to_csv('testProgramAnalysisKeywords')
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,78 +1,287 @@
 #!/usr/bin/env python3
 
-from src.ast.astconverter import ASTConverter
-from src.ast.astfilter import ASTFilter
-from src.ast.astreformatter import ASTReformatter
-from src.output_gen.output import create_output_directory
-from src.readers.filecrawler import crawl_directory
+from src.ast.astcache import ConverterCache
+from src.output_gen.dedupstore import DedupStore
+from src.output_gen.manifest import Manifest, config_hash
+from src.output_gen.journal import RunJournal, journal_path
+from src.output_gen.jsonlsink import CompressedJSONLSink, JSONLSink, compressions
+from src.output_gen.output import FileSink
+from src.output_gen.serializer import get_serializer, serializers
+from src.output_gen.sqlitesink import SQLiteSink
+from src.pipeline.budget import SkipReport
+from src.pipeline.pipeline import Pipeline
+from src.pipeline.stages import ConvertStage, FileTask, FilterStage, FusedFilterStage, ParseStage, ReadStage, ReformatStage, StoreStage, WriteStage, skip_failed_task
+from src.pipeline.workers import AnalysisPool, analysis_fingerprint
+from src.readers.filecrawler import stream_directory
+from src.readers.gitreader import GitRepository
+from src.readers.functionmatcher import FunctionMatcher
 from src.readers.ignore import create_ignore_dict
-from src.readers.parser import generate_file_ast
+from src.readers.prefilter import SourcePrefilter
 from src.readers.readfunctionnames import read_function_names
 
-import ast
-import json
+import argparse
 import os
+import signal
 import sys
 import time
 
 def main():
-  if len(sys.argv) < 3:
-    print('Error: Not enough arguments\nUsage: ./main.py <relative/absolute project path> <output directory>')
-    return
-  
-  project_path = os.path.abspath(sys.argv[1])
+  parser = argparse.ArgumentParser(usage = './main.py <relative/absolute project path> <output directory>')
+  parser.add_argument('project_path', help = 'file or directory to analyse')
+  parser.add_argument('output_path', help = 'directory the output files are written to')
+  parser.add_argument('--output-format', choices = ['files', 'jsonl', 'sqlite'], default = 'files', help = "'files' writes an indented JSON file per source file, 'jsonl' appends a compact record per source file to sharded JSON Lines files in the output directory and 'sqlite' inserts the calls into a database in the output directory, which several runs can share")
+  parser.add_argument('--repo', help = "repository name recorded with the records of the 'jsonl' and 'sqlite' output formats (default: the name of the project directory)")
+  parser.add_argument('--shard-size', type = float, default = 256, help = "size in MB after which the 'jsonl' output format starts a new shard")
+  parser.add_argument('--compression', choices = ['none'] + list(compressions), default = 'none', help = "compress the shards of the 'jsonl' output format in independently readable blocks as they are written")
+  parser.add_argument('--compression-level', type = int, help = 'compression level, 0-9 (default: 6)')
+  parser.add_argument('--block-size', type = float, default = 1, help = 'size in MB of the JSON lines compressed in one block')
+  parser.add_argument('--batch-size', type = int, default = 500, help = "number of files whose calls the 'sqlite' output format inserts in one transaction")
+  parser.add_argument('--json-backend', choices = ['auto'] + list(serializers), default = 'stdlib', help = "library that serializes the output, 'stdlib' (the json module) or the faster 'orjson', whose output parses to the same values but is formatted differently; 'auto' uses orjson if it is installed and the json module otherwise")
+  parser.add_argument('--compact', action = 'store_true', help = "write compact instead of indented JSON files with the 'files' output format")
+  parser.add_argument('--incremental', action = 'store_true', help = 'reuse an existing output directory and only re-analyse files that changed since the last run')
+  parser.add_argument('--resume', action = 'store_true', help = 'continue an interrupted run into the same output directory, skipping the files its journal records as done')
+  parser.add_argument('--git', action = 'store_true', help = 'read the files at HEAD from the object database of the git repository at the project path (e.g. a bare clone) instead of the file system')
+  parser.add_argument('--no-prefilter', action = 'store_true', help = 'parse every file, even files that cannot mention any of the specified functions')
+  parser.add_argument('--max-file-size', type = float, default = 16, help = 'files larger than this many MB are skipped')
+  parser.add_argument('--max-nodes', type = int, default = 2000000, help = 'files whose AST has more than this many nodes are skipped')
+  parser.add_argument('--timeout', type = float, help = 'files that take longer than this many seconds to analyse are interrupted and skipped')
+  parser.add_argument('--max-memory', type = float, help = 'files that need more than this many MB of memory to analyse are interrupted and skipped')
+  parser.add_argument('--skip-report', help = 'file the skipped files and the reasons are appended to as JSON lines')
+  parser.add_argument('--workers', type = int, default = 1, help = 'number of processes that parse and analyse files')
+  parser.add_argument('--queue-size', type = int, default = 16, help = 'number of files that can wait between two pipeline stages')
+  parser.add_argument('--converter-cache', help = 'directory of a persistent cache of converter output keyed by file content')
+  parser.add_argument('--converter-cache-size', type = int, default = 1024, help = 'maximum size of the converter cache in MB')
+  parser.add_argument('--dedup-store', help = 'directory of a content-addressed store of results shared between projects')
+  args = parser.parse_args()
+
+  project_path = os.path.abspath(args.project_path)
   if not os.path.exists(project_path):
     print('Error: Invalid path entered -', project_path)
-    return
+    return 1
   else:
     print('Input path entered:', project_path)
-  
-  output_path = os.path.abspath(sys.argv[2])
-  if os.path.exists(output_path):
+
+  func_args = read_function_names('./function_names.json')
+  matcher = FunctionMatcher(func_args)
+  config = config_hash(func_args)
+
+  output_path = os.path.abspath(args.output_path)
+  manifest = None
+  if args.incremental:
+    if args.output_format != 'files':
+      print('Error: --incremental requires --output-format files')
+      return 1
+    if args.resume:
+      print('Error: --resume cannot be combined with --incremental')
+      return 1
+    # Outputs of another configuration or version of the analysis are stale,
+    # so every file is analysed again.
+    manifest = Manifest.load(output_path, config + '-' + analysis_fingerprint())
+  elif os.path.exists(output_path) and args.output_format == 'files' and not args.resume:
     print('Error: Output directory already exists -', output_path)
-    return
+    return 1
 
-  # Retrieve file paths that are not 'ignored' by the .ignore file.
-  file_paths = crawl_directory(project_path, create_ignore_dict())
+  if args.compression != 'none' and args.output_format != 'jsonl':
+    print('Error: --compression requires --output-format jsonl')
+    return 1
 
-  # Generate file AST for each path.
-  file_asts = generate_file_ast(file_paths)
+  indent = None if args.compact or args.output_format == 'jsonl' else 2
+  serializer = get_serializer(args.json_backend, indent)
+  if serializer == None:
+    print('Error: JSON backend is not installed -', args.json_backend)
+    return 1
 
-  func_args = read_function_names('./function_names.json')
+  # JSON Lines shards and the database are appended to, so the output
+  # directory of a corpus run is shared by the runs over each of its
+  # repositories.
+  repo = args.repo if args.repo != None else os.path.basename(project_path)
 
-  # Convert each AST to a JSON string.
-  results = []
-  for [path, gen_ast] in file_asts:
-    ast_converter = ASTConverter()
-    converted_ast = ast_converter.run(gen_ast)
-    ast_filter = ASTFilter(func_args)
-    filtered_ast = ast_filter.run(converted_ast)
-    if filtered_ast != None:
-      ast_reformatter = ASTReformatter(func_args)
-      reformatted_ast = ast_reformatter.run(filtered_ast)
-      results.append([path, reformatted_ast])
-
-  # Create the output directory if there is something to output.
-  if len(results) > 0:
-    os.makedirs(output_path)
-    print('Output path entered:', output_path)
+  # The journal records the files whose output is written, so that a run that
+  # is interrupted, killed or crashes can be resumed. Incremental runs are
+  # resumed by running them again.
+  journal = None
+  if manifest == None:
+    journal = RunJournal(journal_path(output_path, repo if args.output_format != 'files' else None), project_path)
+    if args.resume and journal.is_complete():
+      print('Resume: run is already complete, output path:', output_path)
+      return 0
+
+  if args.output_format == 'sqlite':
+    sink = SQLiteSink(project_path, output_path, repo, args.batch_size, serializer, journal)
+  elif args.output_format == 'jsonl':
+    max_bytes = int(args.shard_size * (1 << 20))
+    if args.compression != 'none':
+      sink = CompressedJSONLSink(project_path, output_path, repo, max_bytes, serializer, args.compression, args.compression_level, int(args.block_size * (1 << 20)), journal)
+    else:
+      sink = JSONLSink(project_path, output_path, repo, max_bytes, serializer, journal)
   else:
-    print('Note: Specified project directory resulted in empty output.')
-    return
+    sink = FileSink(project_path, output_path, serializer, journal)
+
+  # A resumed run checks the outputs of the files in the journal of the
+  # interrupted run and drops the output it wrote after them, unless other
+  # repositories were appended since, then analyses the files that are not
+  # done.
+  completed = None
+  if args.resume:
+    completed = journal.resume(sink)
+    print('Resume: %d files already done' % len(completed))
+
+  dedup_store = None
+  if args.dedup_store != None:
+    # Stored results are partitioned by the configuration and the version of
+    # the analysis, so that results of older code are not reused.
+    dedup_store = DedupStore(args.dedup_store, config + '-' + analysis_fingerprint())
+
+  converter_cache = None
+  if args.converter_cache != None:
+    converter_cache = ConverterCache(args.converter_cache, args.converter_cache_size << 20)
+
+  prefilter = None
+  if not args.no_prefilter:
+    prefilter = SourcePrefilter(func_args)
+
+  # Retrieve file paths that are not 'ignored' by the .ignore file. Paths are
+  # streamed so that parsing starts as soon as the first file is found. In git
+  # mode the file contents are read along with the paths, otherwise the
+  # source is read from disk when needed.
+  git_repository = None
+  if args.git:
+    git_repository = GitRepository(project_path)
+    sources = git_repository.stream_sources(create_ignore_dict())
+  else:
+    sources = ((path, None) for path in stream_directory(project_path, create_ignore_dict()))
 
+  # Each file moves through the stages below, each running on its own thread
+  # with bounded queues in between, so output is written as soon as the first
+  # file is done and memory does not grow with the size of the project.
+  #
+  # In incremental mode, files that are unchanged since the last run are
+  # skipped and the outputs of changed files that no longer produce output are
+  # removed. A resumed run skips the files that are done. With a dedup store,
+  # files whose contents were already analysed (in this or another project)
+  # reuse the stored result. Files that cannot mention any of the specified
+  # functions are skipped by the prefilter before parsing, and with a
+  # converter cache files whose conversion is cached are not parsed or
+  # converted again.
+  #
+  # Files that exceed the size or node budget, or whose analysis fails or
+  # result cannot be serialized, are skipped and recorded in the skip report
+  # and the run continues.
+  #
   # Each file that is found is output under the output directory.
   # The files are output accordining to their name and extension
   # with '_output' attached. Ex: test.py => test_py_output
-  for [path, ast_json] in results:
-    if len(ast_json) > 0:
-      # Create the output directory
-      output_dir = create_output_directory(path, project_path, output_path)
-
-      # Output the JSON file.
-      output_file = open(output_dir, 'w')
-      output_file.write(json.dumps(ast_json, indent = 2))
-      output_file.close()
-start_time = time.time()
-main()
-end_time = time.time()
-print('Execution Time: %s seconds' % (end_time - start_time))
+  # With the 'jsonl' and 'sqlite' output formats, they are appended to the
+  # shards or the database in the output directory instead.
+  skip_report = SkipReport(args.skip_report)
+  read_stage = ReadStage(project_path, manifest, dedup_store, compute_digest = converter_cache != None, max_bytes = int(args.max_file_size * (1 << 20)), skip_report = skip_report, completed = completed)
+  on_error = skip_failed_task(skip_report)
+  write_stage = WriteStage(sink, incremental = manifest != None, journal = journal, on_error = on_error)
+  pipeline = Pipeline(queue_size = args.queue_size, on_error = on_error)
+  pipeline.add_stage('read', read_stage)
+
+  # With several workers, parsing and analysis run in a process pool. Up to
+  # two tasks per worker are in flight between the submit and collect stages.
+  # Time and memory budgets can only be enforced by interrupting the process
+  # that analyses the file, so they always use the pool.
+  memory_bytes = int(args.max_memory * (1 << 20)) if args.max_memory != None else None
+  analysis_pool = None
+  if args.workers > 1 or args.timeout != None or memory_bytes != None:
+    analysis_pool = AnalysisPool(args.workers, func_args, prefilter, converter_cache, args.max_nodes, args.timeout, memory_bytes)
+    pipeline.add_stage('submit', analysis_pool.submit, queue_size = max(args.queue_size, 2 * args.workers))
+    pipeline.add_stage('collect', analysis_pool.collect)
+  else:
+    pipeline.add_stage('parse', ParseStage(prefilter, converter_cache, args.max_nodes))
+    if converter_cache != None:
+      pipeline.add_stage('convert', ConvertStage(converter_cache))
+      pipeline.add_stage('filter', FilterStage(matcher))
+    else:
+      pipeline.add_stage('filter', FusedFilterStage(matcher))
+    pipeline.add_stage('reformat', ReformatStage(matcher))
+
+  # A file whose output cannot be stored or written fails the run instead of
+  # being skipped, unless its result cannot be serialized.
+  if dedup_store != None:
+    pipeline.add_stage('store', StoreStage(dedup_store), handle_errors = False)
+  pipeline.add_stage('write', write_stage, handle_errors = False, on_idle = write_stage.idle)
+
+  # The first Ctrl-C stops reading files and lets the files in flight be
+  # written, a second one drops them. Either way the file being written is
+  # finished and the output is synced to disk before the run ends.
+  interrupts = []
+  def interrupt(signum, frame):
+    interrupts.append(signum)
+    if len(interrupts) == 1:
+      print('Interrupted: writing the files in flight, press Ctrl-C again to stop now')
+      pipeline.drain()
+    else:
+      pipeline.stop()
+
+  previous_handler = signal.signal(signal.SIGINT, interrupt)
+  error = None
+  try:
+    for _ in pipeline.run(FileTask(path, source) for path, source in sources):
+      pass
+  except RuntimeError as e:
+    error = e
+  finally:
+    if analysis_pool != None:
+      analysis_pool.close()
+    if git_repository != None:
+      git_repository.close()
+    sink.close()
+    if journal != None:
+      journal.close()
+    skip_report.close()
+    signal.signal(signal.SIGINT, previous_handler)
+
+  print(skip_report.summary())
+  if prefilter != None:
+    print(prefilter.summary())
+
+  if converter_cache != None and analysis_pool == None:
+    print(converter_cache.summary())
+
+  if dedup_store != None:
+    dedup_store.record_run(project_path)
+    print(dedup_store.summary())
+
+  # The files that were not read are not removed from the output, and an
+  # interrupted or failed run exits with a nonzero status so that
+  # repos_to_ast.py does not record the repository as done. The journal of a
+  # complete run is removed, or marked complete if the output is shared, and
+  # repos_to_ast.py removes it once the repository is recorded as done.
+  if error != None:
+    print('Error:', error)
+    if journal != None:
+      print('Note: Run again with --resume to continue.')
+    return 1
+  if len(interrupts) > 0:
+    print('Run interrupted, output path:', output_path)
+    if journal != None:
+      print('Note: Run again with --resume to continue.')
+    return 128 + signal.SIGINT
+  if journal != None and args.output_format == 'files':
+    journal.remove()
+  elif journal != None:
+    journal.complete()
+
+  if manifest != None:
+    removed = manifest.removed_paths()
+    for rel_path in removed:
+      sink.remove(os.path.join(project_path, rel_path))
+    os.makedirs(output_path, exist_ok = True)
+    manifest.save()
+    print('Incremental: %d unchanged, %d re-analysed, %d removed' % (read_stage.unchanged, len(manifest.seen) - read_stage.unchanged, len(removed)))
+
+  if write_stage.written > 0 or read_stage.resumed > 0:
+    print('Output path entered:', output_path)
+  elif manifest == None:
+    print('Note: Specified project directory resulted in empty output.')
+
+if __name__ == '__main__':
+  start_time = time.time()
+  status = main()
+  end_time = time.time()
+  print('Execution Time: %s seconds' % (end_time - start_time))
+  sys.exit(status)
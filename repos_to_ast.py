@@ -1,6 +1,11 @@
 import os
 import argparse
 import shutil
+import signal
+import time
+
+from src.output_gen.dedupstore import dedup_report
+from src.output_gen.journal import journal_path
 
 
 def main():
@@ -10,6 +15,12 @@ def main():
     parser.add_argument("--intermediate", default="temp")
     parser.add_argument("--outpath", default="output")
     parser.add_argument("--keep", help="keep the intermediate source code from git", type=bool, default=False)
+    parser.add_argument("--git-objects", action="store_true", help="clone bare repos and read the sources from the git object database instead of a checkout")
+    parser.add_argument("--dedup-store", default="dedup_store", help="content-addressed store of results shared by all repos")
+    parser.add_argument("--no-dedup", action="store_true", help="analyse every file even if identical contents were already analysed")
+    parser.add_argument("--output-format", choices=["jsonl", "sqlite", "files"], default="jsonl", help="'jsonl' appends one record per source file of every repo to sharded JSON Lines files in the output directory, 'sqlite' inserts the calls of every repo into a database in the output directory, 'files' writes a directory of JSON files per repo")
+    parser.add_argument("--compression", choices=["none", "gzip", "lzma"], default="none", help="compress the JSON Lines shards in blocks that can be read separately")
+    parser.add_argument("--shard-size", type=float, default=256, help="size in MB after which a new JSON Lines shard is started")
 
     args = parser.parse_args()
 
@@ -17,6 +28,13 @@ def main():
     outpath = args.outpath
     repos_file = args.repos_file
     keep = args.keep
+    dedup_option = "" if args.no_dedup else f" --dedup-store {args.dedup_store}"
+    git_option = " --git" if args.git_objects else ""
+    shared_output = args.output_format != "files"
+    format_options = f" --output-format {args.output_format}"
+    if args.output_format == "jsonl":
+        format_options += f" --shard-size {args.shard_size} --compression {args.compression}"
+    start_time = time.time()
 
     if not os.path.exists(path):
         os.makedirs(path)
@@ -24,25 +42,63 @@ def main():
     if not os.path.exists(outpath):
         os.makedirs(outpath)
 
+    # With JSON Lines or SQLite output all repos share the output directory,
+    # so the repos that were analysed are listed in a file instead.
+    completed_path = os.path.join(outpath, "completed_repos.txt")
+    completed = set()
+    if shared_output and os.path.exists(completed_path):
+        with open(completed_path, "r") as f:
+            completed = set(line.strip() for line in f)
+
     # Download the source code for each repo and run the ast convert on each of the repo
     with open(repos_file, "r") as f:
         for line in f:
             line = line[:-1]
-            repo_path = os.path.join(path, "/".join(line.split("/")[-2:]))
-            output_path = os.path.join(outpath, "/".join(line.split("/")[-2:]))
+            repo = "/".join(line.split("/")[-2:])
+            repo_path = os.path.join(path, repo)
+            output_path = os.path.join(outpath, repo)
 
-            if os.path.exists(output_path):
+            if shared_output and repo in completed:
+                continue
+            # A repo whose output directory has a journal was interrupted
+            # and is resumed.
+            if not shared_output and os.path.exists(output_path) and not os.path.exists(journal_path(output_path)):
                 continue
 
             if not os.path.exists(repo_path):
-                os.system(f'git clone {line + ".git"} {repo_path}')
+                if args.git_objects:
+                    # Only HEAD is read, so neither a working tree nor history is needed
+                    os.system(f'git clone --bare --depth 1 {line + ".git"} {repo_path}')
+                else:
+                    os.system(f'git clone {line + ".git"} {repo_path}')
+            # The repo is not recorded as done if it could not be cloned
+            if not os.path.exists(repo_path):
+                print("Error: Could not clone", line)
+                continue
+
+            if shared_output:
+                # An interrupted run of the repo left a journal, which --resume
+                # continues; otherwise it starts from scratch.
+                status = os.system(f'python main.py {repo_path} {outpath}{format_options} --repo {repo} --resume{git_option}{dedup_option}')
+                if status == 0:
+                    with open(completed_path, "a") as f:
+                        f.write(repo + "\n")
+                    # The journal of the repo is kept until it is recorded as done
+                    os.remove(journal_path(outpath, repo))
+            else:
+                status = os.system(f'python main.py {repo_path} {output_path} --resume{git_option}{dedup_option}')
 
-            os.system(f'python main.py {repo_path} {output_path}')
+            # os.system ignores Ctrl-C, which stops main.py with the status of
+            # SIGINT, so the remaining repos are not started
+            if os.waitstatus_to_exitcode(status) == 128 + signal.SIGINT:
+                print("Interrupted, run again to resume", repo)
+                break
 
             if not keep:
-                # repo_path may no exist git clone was not successful
-                if os.path.exists(repo_path):
-                    shutil.rmtree(repo_path)
+                shutil.rmtree(repo_path)
+
+    if not args.no_dedup:
+        print(dedup_report(args.dedup_store, since=start_time))
 
 
 if __name__ == "__main__":
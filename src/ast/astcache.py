@@ -0,0 +1,154 @@
+import hashlib
+import marshal
+import os
+import sys
+import threading
+import zlib
+
+try:
+  import fcntl
+except ImportError:
+  fcntl = None
+
+from . import astconverter, astdispatch, astnodes
+from .astconverter import ASTConverter
+from .astnodes import from_json, to_json
+
+def code_fingerprint(modules):
+  '''Returns a short hash of the code of the modules and of the Python
+  version, whose ast module they work on.
+  '''
+  fingerprint = hashlib.sha256(('%d.%d' % sys.version_info[:2]).encode())
+  for module in modules:
+    with open(module.__file__, 'rb') as f:
+      fingerprint.update(f.read())
+  return fingerprint.hexdigest()[:12]
+
+def converter_fingerprint():
+  '''Returns the fingerprint of the modules that produce the cached
+  conversions (see code_fingerprint).
+  '''
+  return code_fingerprint((astconverter, astdispatch, astnodes))
+
+class ConverterCache:
+  '''Persistent cache of ASTConverter output keyed by the content hash of the
+  source file, the converter version and the fingerprint of the converter
+  code (see converter_fingerprint), so that conversions cached before a
+  change to the converter or the node layout are not used even if VERSION
+  was not increased.
+
+  Entries hold the result of ASTConverter.run() in its JSON representation
+  (see astnodes.to_json), serialized with marshal and compressed with zlib,
+  so a hit skips both ast.parse and the conversion.
+
+  Layout:
+  └── cache
+      ├── .lock
+      └── ab
+          └── ab12...ef.v1-3f9c0d2e7a41
+
+  The cache is safe for concurrent readers and writers on one machine:
+  entries are written to a temporary file and renamed into place, so a
+  reader sees either a complete entry or none. A hit refreshes the mtime of
+  the entry, and once the cache grows past 'max_bytes' the least recently
+  used entries are evicted by whichever process holds the lock.
+  '''
+
+  def __init__(self, path, max_bytes = 1 << 30, version = ASTConverter.VERSION):
+    self.path = os.path.abspath(path)
+    self.max_bytes = max_bytes
+    self.version = version
+    self.fingerprint = converter_fingerprint()
+    self.hits = 0
+    self.misses = 0
+    self.bytes_since_eviction = 0
+    os.makedirs(self.path, exist_ok = True)
+
+  def entry_path(self, digest):
+    return os.path.join(self.path, digest[:2], '%s.v%d-%s' % (digest, self.version, self.fingerprint))
+
+  def get(self, digest):
+    '''Returns the cached converter output for the content hash or None.'''
+    entry_path = self.entry_path(digest)
+    try:
+      with open(entry_path, 'rb') as f:
+        converted_ast = from_json(marshal.loads(zlib.decompress(f.read())))
+    except FileNotFoundError:
+      self.misses += 1
+      return None
+    except Exception as e:
+      # Corrupt entry, e.g. from a full disk. It is rewritten on the next put.
+      print('ERROR: cannot read converter cache entry', entry_path, '- Exception:', e)
+      self.misses += 1
+      return None
+
+    try:
+      os.utime(entry_path)
+    except OSError:
+      pass
+    self.hits += 1
+    return converted_ast
+
+  def put(self, digest, converted_ast):
+    try:
+      data = zlib.compress(marshal.dumps(to_json(converted_ast)), 1)
+    except ValueError:
+      return
+
+    entry_path = self.entry_path(digest)
+    os.makedirs(os.path.dirname(entry_path), exist_ok = True)
+    temp_path = '%s.%d.%d.tmp' % (entry_path, os.getpid(), threading.get_ident())
+    with open(temp_path, 'wb') as f:
+      f.write(data)
+    os.replace(temp_path, entry_path)
+
+    self.bytes_since_eviction += len(data)
+    if self.bytes_since_eviction > self.max_bytes // 10:
+      self.bytes_since_eviction = 0
+      self.evict()
+
+  def evict(self):
+    '''Removes the least recently used entries until the cache is below 90%
+    of 'max_bytes'. Skipped if another process is already evicting.
+    '''
+    lock_file = open(os.path.join(self.path, '.lock'), 'w')
+    try:
+      if fcntl != None:
+        try:
+          fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+          return
+
+      entries = []
+      total = 0
+      for directory in os.scandir(self.path):
+        if not directory.is_dir():
+          continue
+        for entry in os.scandir(directory.path):
+          if entry.name.endswith('.tmp'):
+            continue
+          try:
+            stat = entry.stat()
+          except FileNotFoundError:
+            continue
+          entries.append((stat.st_mtime, stat.st_size, entry.path))
+          total += stat.st_size
+
+      if total <= self.max_bytes:
+        return
+      entries.sort()
+      for _, size, entry_path in entries:
+        if total <= self.max_bytes * 0.9:
+          break
+        try:
+          os.remove(entry_path)
+        except FileNotFoundError:
+          pass
+        total -= size
+    finally:
+      lock_file.close()
+
+  def summary(self):
+    lookups = self.hits + self.misses
+    percentage = 100.0 * self.hits / lookups if lookups > 0 else 0.0
+    return 'Converter cache: %d of %d lookups hit (%.1f%%)' % (self.hits, lookups, percentage)
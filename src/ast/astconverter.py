@@ -1,82 +1,115 @@
 from collections import deque
 import ast
+import sys
+
+from .astdispatch import DispatchTable, append_child_nodes, evaluate
+from .astnodes import AliasNode, AttributeNode, CallNode, ConstantNode, DictNode, FunctionDefNode, ImportNode, IterableNode, KeywordNode, NameNode, NodeTable, SourceSegment, SourceText, dotted_names
 
 class ASTConverter:
   '''General purpose class for converting an abstract syntax tree (AST) generated
   by the Python ast module
+
+  Nodes are converted without recursion (see evaluate), so deeply nested
+  code such as long method chains does not hit the recursion limit, and
+  every node is converted once, so conversion takes linear time.
+
+  Nodes are converted to the compact node classes of the astnodes module,
+  which the filter and reformatter work on. astnodes.to_json turns them into
+  the JSON representation shown in the examples below. Identical subtrees,
+  e.g. every nn.ReLU(inplace = True) of a file, are converted to a single
+  node (see astnodes.NodeTable).
   '''
 
+  # Identifies the output format of the converter. Must be increased whenever
+  # the output of run() changes so that cached conversions are invalidated.
+  # The converter cache is also keyed by the code of the converter modules
+  # (see astcache.converter_fingerprint).
+  VERSION = 1
+
   def __init__(self):
     # Used for substitutions when aliases are encountered in the conversion
     # process.
     self.aliases = {}
+    # Source the AST was parsed from, if known (see convert_source).
+    self.source = None
+    # Shares the nodes of identical subtrees.
+    self.nodes = NodeTable()
 
-  def run(self, root):
+  def run(self, root, source = None):
     '''We are only interested in Import, ImportFrom, Call, and FunctionDef nodes.
     
     This function returns a simplified JSON representation of an AST,
     segregated by Import, ImportFrom, Call, and FunctionDef nodes.
+
+    If the source that root was parsed from is given, arguments that are
+    converted back to source code are SourceSegments instead of strings.
     '''
+    self.source = SourceText(source) if source != None else None
     return self.walk_ast(root)
 
 
+  def evaluate(self, result):
+    '''Returns the conversion of a node given the result of its handler (see
+    astdispatch.evaluate). Handlers of nodes with child nodes are generators
+    that yield the child nodes they need converted.
+    '''
+    return evaluate(self, result)
+
   def convert_arguments(self, root):
     '''Converts arguments to dictionary structures dependent on the type
-    of the node.'''
-
-    if isinstance(root, ast.Call):
-      return self.convert_call(root)
-    elif isinstance(root, ast.Name):
-      return self.convert_name(root)
-    elif isinstance(root, ast.FunctionDef):
-      return self.convert_function_def(root)
-    elif isinstance(root, (ast.Import, ast.ImportFrom)):
-      return self.convert_import(root)
-    elif isinstance(root, ast.Tuple):
-      tuple_dict = {}
-      tuple_dict['type'] = 'tuple'
-      elts = []
-      for node in root.elts:
-        elts.append(self.convert_arguments(node))
-      tuple_dict['elements'] = elts
-      return tuple_dict
-    elif isinstance(root, ast.List):
-      list_dict = {}
-      list_dict['type'] = 'list'
-      elts = []
-      for node in root.elts:
-        elts.append(self.convert_arguments(node))
-      list_dict['elements'] = elts
-      return list_dict
-    elif isinstance(root, ast.Set):
-      set_dict = {}
-      set_dict['type'] = 'set'
-      elts = []
-      for node in root.elts:
-        elts.append(self.convert_arguments(node))
-      set_dict['elements'] = elts
-      return set_dict
-    elif isinstance(root, ast.Dict):
-      dict_dict = {}
-      dict_dict['type'] = 'dict'
-      keys = []
-      values = []
-
-      for key in root.keys:
-        keys.append(self.convert_arguments(key))
-      
-      for value in root.values:
-        values.append(self.convert_arguments(value))
-      
-      dict_dict['key_values'] = list(zip(keys, values))
-      return dict_dict
-    elif isinstance(root, ast.Constant):
-      constant = {}
-      constant['type'] = 'constant'
-      constant['value'] = root.value
-      return constant
-    else:
+    of the node (see argument_converters). Nodes of other types are converted
+    back to source code.'''
+    return self.evaluate(self.argument_converters[type(root)](self, root))
+
+  def convert_iterable(self, root):
+    '''Converts Tuple, List and Set nodes into an IterableNode with the
+    fields 'type' and 'elements'.
+    '''
+    return self.evaluate(self.generate_iterable(root))
+
+  def generate_iterable(self, root):
+    converters = self.argument_converters
+    elts = []
+    for node in root.elts:
+      elts.append((yield converters[type(node)], node))
+    return self.nodes.node(IterableNode, self.iterable_types[type(root)], tuple(elts))
+
+  def convert_dict(self, root):
+    '''Converts Dict nodes into a DictNode with the field 'key_values'.'''
+    return self.evaluate(self.generate_dict(root))
+
+  def generate_dict(self, root):
+    converters = self.argument_converters
+    keys = []
+    values = []
+
+    for key in root.keys:
+      keys.append((yield converters[type(key)], key))
+    
+    for value in root.values:
+      values.append((yield converters[type(value)], value))
+    
+    return self.nodes.node(DictNode, tuple(zip(keys, values)))
+
+  def convert_constant(self, root):
+    return self.nodes.node(ConstantNode, root.value, type(root.value))
+
+  def convert_source(self, root):
+    '''Converts nodes that are not modeled back to source code. With the
+    source of the AST, the code is a SourceSegment that is only unparsed
+    if it is written out.
+    '''
+    if self.source == None or not hasattr(root, 'end_col_offset'):
       return ast.unparse(root)
+    return SourceSegment(self.source, type(root), root.lineno, root.col_offset, root.end_lineno, root.end_col_offset)
+
+  def convert_parameter(self, root):
+    '''Converts the parameters of function definitions, which are unparsed
+    to their name unless they have an annotation.
+    '''
+    if root.annotation == None:
+      return root.arg
+    return self.convert_source(root)
 
   def get_function_names(self, root):
     '''Returns all the function names of a node as a string.
@@ -87,37 +120,34 @@ class ASTConverter:
     
     return_test.walk.hello_world
     '''
-    if isinstance(root, ast.Name):
-      if root.id in self.aliases:
-        return self.aliases[root.id]
-      return root.id
-    elif isinstance(root, ast.Attribute):
-      root_value = self.get_function_names(root.value)
-      if isinstance(root_value, str):
-        return root_value + '.' + root.attr
-      attribute = {}
-      attribute['instance'] = root_value
-      attribute['attr'] = root.attr
-      return attribute
-    elif isinstance(root, ast.Call):
-      func_name = self.convert_call(root)
-      return func_name
-    else:
-      key = ast.unparse(root)
-      if key in self.aliases:
-        return self.aliases[key]
-      return key
+    return self.evaluate(self.function_name_converters[type(root)](self, root))
+
+  def get_name(self, root):
+    if root.id in self.aliases:
+      return self.aliases[root.id]
+    return root.id
+
+  def get_attribute_name(self, root):
+    return self.evaluate(self.generate_attribute_name(root))
+
+  def generate_attribute_name(self, root):
+    root_value = yield self.function_name_converters[type(root.value)], root.value
+    if isinstance(root_value, str):
+      return dotted_names[root_value, root.attr]
+    return self.nodes.node(AttributeNode, root_value, root.attr)
+
+  def get_source_name(self, root):
+    key = ast.unparse(root)
+    if key in self.aliases:
+      return self.aliases[key]
+    return key
 
   def convert_name(self, root):
-    '''Converts Name nodes into a dictionary with the fields 'type' and 'value'
-    '''
-    name = {}
-    name['type'] = 'name'
-    name['value'] = root.id
-    return name
+    '''Converts Name nodes into a NameNode with the field 'value'.'''
+    return self.nodes.node(NameNode, root.id)
 
   def convert_call(self, root):
-    '''Converts Call nodes into a dictionary with the fields 'function', args',
+    '''Converts Call nodes into a CallNode with the fields 'function', args',
     and 'keywords'.
 
     Example:
@@ -139,27 +169,23 @@ class ASTConverter:
     }
 
     '''
-    call = {}
-    call['type'] = 'call'
-    call['function'] = self.get_function_names(root.func)
+    return self.evaluate(self.generate_call(root))
+
+  def generate_call(self, root):
+    converters = self.argument_converters
+    function = yield self.function_name_converters[type(root.func)], root.func
 
     args = []
     for node in root.args:
-      args.append(self.convert_arguments(node))
+      args.append((yield converters[type(node)], node))
     
     keywords = []
     for node in root.keywords:
-      keyword = {}
-      keyword['keyword'] = node.arg
-      keyword['value'] = self.convert_arguments(node.value)
-      keywords.append(keyword)
-
-    call['args'] = args
-    call['keywords'] = keywords
-    return call
+      keywords.append(self.nodes.node(KeywordNode, node.arg, (yield converters[type(node.value)], node.value)))
+    return self.nodes.node(CallNode, function, tuple(args), tuple(keywords))
 
   def convert_import(self, root):
-    '''Converts ImportFrom nodes into a dictionary with 'module' and 'names'
+    '''Converts ImportFrom nodes into an ImportNode with 'module' and 'names'
     fields.
 
     Example:
@@ -178,22 +204,18 @@ class ASTConverter:
       }
     }
     '''
-    import_res = {}
-    import_res['type'] = 'import'
-    import_res['module'] = None
+    module = None
     if isinstance(root, ast.ImportFrom) and root.module != None:
-      import_res['module'] = root.module
+      module = sys.intern(root.module)
     
     import_aliases = []
     for z in root.names:
-      alias = {}
-      alias['name'] = z.name
-      alias['alias'] = z.asname
+      alias = AliasNode(sys.intern(z.name), z.asname)
 
-      if isinstance(root, ast.ImportFrom) and root.module != None:
-        alias_name = root.module + '.' + z.name
+      if module != None:
+        alias_name = dotted_names[module, z.name]
       else:
-        alias_name = z.name
+        alias_name = alias.name
       
       if z.asname != None:
         self.aliases[z.asname] = alias_name
@@ -201,11 +223,10 @@ class ASTConverter:
         self.aliases[z.name] = alias_name
       import_aliases.append(alias)
     
-    import_res['names'] = import_aliases
-    return import_res
+    return ImportNode(module, import_aliases)
 
   def convert_function_defs(self, root):
-    '''Converts Function nodes into a dictionary with the fields 'names',
+    '''Converts Function nodes into a FunctionDefNode with the fields 'names',
     'args', 'calls', and 'function_defs'.
 
     'calls' and 'function_defs' are used to represent calls and function
@@ -254,21 +275,22 @@ class ASTConverter:
     }
 
     '''
-    function = {}
-    function['type'] = 'function_def'
-    function['name'] = root.name
-    function['args'] = [self.convert_arguments(arg) for arg in root.args.args]
-    
-    calls = []
-    function_defs = []
+    return self.evaluate(self.generate_function_def(root))
+
+  def generate_function_def(self, root):
+    converters = self.argument_converters
+    args = []
+    for arg in root.args.args:
+      args.append((yield converters[type(arg)], arg))
+
+    # The nested nodes of every statement are appended to the same lists.
+    res = {}
+    res['calls'] = []
+    res['function_defs'] = []
     for item in root.body:
-      nested_values = self.walk_function_def((item))
-      calls = calls + nested_values['calls']
-      function_defs = function_defs + nested_values['function_defs']
+      yield self.generate_nested(item, res)
     
-    function['calls'] = calls
-    function['function_defs'] = function_defs
-    return function
+    return FunctionDefNode(root.name, args, res['calls'], res['function_defs'])
 
   def walk_function_def(self, root):
     '''Traverses FunctionDef nodes to find nested call and function definition
@@ -283,20 +305,23 @@ class ASTConverter:
     res = {}
     res['calls'] = []
     res['function_defs'] = []
+    self.evaluate(self.generate_nested(root, res))
+    return res
 
+  def generate_nested(self, root, res):
+    collectors = self.function_def_collectors
     todo = deque([root])
     while todo:
       node = todo.popleft()
 
-      if isinstance(node, ast.Call):
-        res['calls'].append(self.convert_call(node))
-      elif isinstance(node, ast.FunctionDef):
-        res['function_defs'].append(self.convert_function_defs(node))
+      collector = collectors[type(node)]
+      if collector != None:
+        field, convert = collector
+        res[field].append((yield convert, node))
       else:
-        # If-statement guarantees a single visit for Call/FunctionDef
-        # nodes.
-        todo.extend(ast.iter_child_nodes(node))
-    return res
+        # Children are only visited for nodes without a collector, which
+        # guarantees a single visit for Call/FunctionDef nodes.
+        append_child_nodes(todo, node)
 
 
   def walk_ast(self, node):
@@ -315,19 +340,53 @@ class ASTConverter:
     res['calls'] = []
     res['function_defs'] = []
 
+    collectors = self.ast_collectors
     todo = deque([node])
     while todo:
       node = todo.popleft()
 
-      if isinstance(node, (ast.Import, ast.ImportFrom)):
-        res['imports'].append(self.convert_import(node))
-      elif isinstance(node, ast.Call):
-        res['calls'].append(self.convert_call(node))
-      elif isinstance(node, ast.FunctionDef):
-        res['function_defs'].append(self.convert_function_defs(node))
+      collector = collectors[type(node)]
+      if collector != None:
+        field, convert = collector
+        res[field].append(self.evaluate(convert(self, node)))
       else:
-        # If-statement guarantees a single visit for Call/FunctionDef
-        # nodes.
-        todo.extend(ast.iter_child_nodes(node))
+        # Children are only visited for nodes without a collector, which
+        # guarantees a single visit for Call/FunctionDef nodes.
+        append_child_nodes(todo, node)
 
     return res
+
+  # Dispatch tables of the converter, keyed on the class of the ast node.
+  # Handlers are called with the converter as first argument and return the
+  # conversion, or are generators that are run by evaluate.
+  argument_converters = DispatchTable({
+    ast.Call: generate_call,
+    ast.Name: convert_name,
+    ast.FunctionDef: generate_function_def,
+    (ast.Import, ast.ImportFrom): convert_import,
+    (ast.Tuple, ast.List, ast.Set): generate_iterable,
+    ast.Dict: generate_dict,
+    ast.Constant: convert_constant,
+    ast.arg: convert_parameter
+  }, default = convert_source)
+
+  iterable_types = DispatchTable({ast.Tuple: 'tuple', ast.List: 'list', ast.Set: 'set'})
+
+  function_name_converters = DispatchTable({
+    ast.Name: get_name,
+    ast.Attribute: generate_attribute_name,
+    ast.Call: generate_call
+  }, default = get_source_name)
+
+  # Nodes collected by walk_ast and walk_function_def, as the field of the
+  # result they are added to and their handler. Other nodes are traversed.
+  ast_collectors = DispatchTable({
+    (ast.Import, ast.ImportFrom): ('imports', convert_import),
+    ast.Call: ('calls', generate_call),
+    ast.FunctionDef: ('function_defs', generate_function_def)
+  })
+
+  function_def_collectors = DispatchTable({
+    ast.Call: ('calls', generate_call),
+    ast.FunctionDef: ('function_defs', generate_function_def)
+  })
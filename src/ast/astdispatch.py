@@ -0,0 +1,121 @@
+import ast
+from types import GeneratorType
+
+class DispatchTable(dict):
+  '''Maps node kinds to handlers, replacing chains of isinstance or
+  value['type'] comparisons with a single dictionary lookup.
+
+  Keys are either classes, for nodes of the Python ast module, or type tags
+  such as 'call' or 'list', for the dictionaries generated by the converter.
+  Looking up a class that has no handler of its own resolves to the handler
+  of its closest registered base class, and anything else resolves to the
+  default. Resolved lookups are cached in the table itself, so after the
+  first lookup every node kind costs one dictionary access.
+
+  Handlers are plain functions that are called with the converter, filter or
+  reformatter as first argument, so a class defines its table once in its
+  body and subclasses plug in handlers for new node kinds on a copy.
+
+  Example:
+
+  table = DispatchTable({ast.Call: convert_call, (ast.List, ast.Tuple): convert_iterable}, default = convert_source)
+  table[type(node)](self, node)
+
+  class MyConverter(ASTConverter):
+    argument_converters = ASTConverter.argument_converters.copy()
+    argument_converters.register(ast.JoinedStr, convert_f_string)
+  '''
+
+  def __init__(self, handlers = None, default = None):
+    super().__init__()
+    self.handlers = {}
+    self.default = default
+    if handlers != None:
+      for key, handler in handlers.items():
+        self.register(key, handler)
+
+  def register(self, key, handler):
+    '''Sets the handler for a key or a tuple of keys.'''
+    keys = key if isinstance(key, tuple) else (key,)
+    for key in keys:
+      self.handlers[key] = handler
+    # Resolved subclasses may now resolve to the new handler.
+    self.clear()
+    self.update(self.handlers)
+
+  def copy(self):
+    return DispatchTable(self.handlers, self.default)
+
+  def __missing__(self, key):
+    handler = self.default
+    if isinstance(key, type):
+      for base in key.__mro__[1:]:
+        if base in self.handlers:
+          handler = self.handlers[base]
+          break
+    self[key] = handler
+    return handler
+
+def evaluate(owner, result):
+  '''Returns the result of a handler of 'owner' (a converter, filter or
+  reformatter) without recursing into the nodes below it.
+
+  Handlers of nodes without child nodes return their result. Handlers of
+  nodes with child nodes are generators that yield a (handler, child node)
+  pair, or a generator, for each child node they need handled, are sent
+  back its result, and finally return their own result. Instead of calling
+  each other recursively, the generators are run from an explicit stack, so
+  the depth of the tree is not limited by the recursion limit.
+  '''
+  if type(result) is not GeneratorType:
+    return result
+
+  stack = [result]
+  value = None
+  while stack:
+    try:
+      request = stack[-1].send(value)
+    except StopIteration as e:
+      stack.pop()
+      value = e.value
+      continue
+    if type(request) is GeneratorType:
+      value = request
+    else:
+      handler, node = request
+      value = handler(owner, node)
+    if type(value) is GeneratorType:
+      stack.append(value)
+      value = None
+  return value
+
+# Fields of ast nodes that never hold child nodes (identifiers, flags and
+# expression contexts such as Load or Store, which have no children).
+SCALAR_FIELDS = {'id', 'attr', 'name', 'asname', 'arg', 'module', 'level', 'kind', 'type_comment', 'is_async', 'conversion', 'simple', 'tag', 'ctx'}
+
+class ChildFieldTable(dict):
+  '''Maps an ast node class to the names of its fields that can hold child
+  nodes, computed on first lookup.
+  '''
+
+  def __missing__(self, node_class):
+    fields = tuple(name for name in node_class._fields if name not in SCALAR_FIELDS and not (name == 'value' and issubclass(node_class, ast.Constant)))
+    self[node_class] = fields
+    return fields
+
+child_fields = ChildFieldTable()
+
+def append_child_nodes(todo, node):
+  '''Appends the child nodes of node to todo in the order of
+  ast.iter_child_nodes, leaving out expression contexts. Faster than
+  extending todo with ast.iter_child_nodes since only the fields that can
+  hold nodes are read and no generator is created.
+  '''
+  for name in child_fields[type(node)]:
+    value = getattr(node, name, None)
+    if isinstance(value, ast.AST):
+      todo.append(value)
+    elif isinstance(value, list):
+      for item in value:
+        if isinstance(item, ast.AST):
+          todo.append(item)
@@ -1,21 +1,32 @@
+from .astdispatch import DispatchTable, evaluate
+from .astnodes import AttributeNode, CallNode, DictNode, IterableNode, KeywordNode, dotted_names, value_type
+from ..readers.functionmatcher import FunctionMatcher
+
 class ASTFilter():
   '''General purpose class for filtering an abstract syntax tree (AST)
   generated by the astconverter module
 
   Uses 'function_names' and 'args' to filter out nodes that do not contain
   specified function names or argument names.
+
+  The reduce_* functions are generators run by astdispatch.evaluate, so
+  deeply nested values are filtered without recursion. Imports and function
+  definitions are filtered in place. Other nodes may be shared by identical
+  subtrees (see astnodes.NodeTable), so they are never modified: they are
+  reduced to new nodes, and each call is reduced once.
   '''
   def __init__(self, args):
     # Used to initialize the filter with function names and arguments that
-    # it should use to filter the AST.
-    self.func_args = args
-    self.function_names = self.func_args.keys()
+    # it should use to filter the AST (a dictionary or a FunctionMatcher).
+    self.matcher = FunctionMatcher.of(args)
+    # Reductions of the calls already reduced (see reduce_shared_call).
+    self.reductions = {}
 
   def run(self, ast):
     '''Returns a filtered ast. 
 
     Filtered AST entails an AST that contains functions specified by
-    'self.function_names' and argument names specified in 'self.args'.
+    the function names and their argument names in the matcher.
 
     Arguments that call nodes are kept in functions that are not filtered out.
 
@@ -68,7 +79,7 @@ class ASTFilter():
     '''Encapsulating function that filters out imports, import_froms, calls,
     and function_defs fields in the AST and returns the result.
     '''
-    if not self.function_names:
+    if len(self.matcher) == 0:
       return ast_nodes
     
     new_imports = []
@@ -80,13 +91,14 @@ class ASTFilter():
 
     new_calls = []
     for call in ast_nodes['calls']:
-      if self.reduce_call(call) != None:
-        new_calls.append(call)
+      call_name, value = evaluate(self, self.reduce_shared_call(call))
+      if call_name != None:
+        new_calls.append(value)
     ast_nodes['calls'] = new_calls
 
     new_function_defs = []
     for function_def in ast_nodes['function_defs']:
-      if self.reduce_function_def(function_def):
+      if evaluate(self, self.reduce_function_def(function_def)):
         new_function_defs.append(function_def)
 
     ast_nodes['function_defs'] = new_function_defs
@@ -97,175 +109,188 @@ class ASTFilter():
     False otherwise.
     '''
     names = []
-    module = imports_ast['module']
-    for name in imports_ast['names']:
-      func_name = name['name'] if module == None else module + '.' + name['name']
-      if func_name in self.function_names:
+    module = imports_ast.module
+    for name in imports_ast.names:
+      func_name = name.name if module == None else dotted_names[module, name.name]
+      if self.matcher.matches(func_name):
         names.append(name)
-    imports_ast['names'] = names
+    imports_ast.names = names
 
     return imports_ast if len(names) > 0 else None
 
   def filter_call_args(self, call_ast, func_args):
-    '''Filters the 'args' and 'keywords' fields of a 'call' node such that
-    only 'call' arguments are kept and keywords specified in the
-    function argument dictionary are kept.
+    '''Returns the 'args' and 'keywords' of a 'call' node such that only
+    'call' arguments are kept and keywords specified in the function argument
+    dictionary are kept.
     '''
     args = []
-    for arg in call_ast['args']:
-      if isinstance(arg, dict) and 'type' in arg.keys() and arg['type'] == 'call':
-        temp_name = self.reduce_call(arg)
+    for arg in call_ast.args:
+      if isinstance(arg, CallNode):
+        temp_name, value = yield self.value_reducers[value_type(arg)], arg
         if temp_name != None:
-          args.append(arg)
-    call_ast['args'] = args
+          args.append(value)
 
     keywords = []
-    for keyword in call_ast['keywords']:
-      if keyword['keyword'] in func_args or isinstance(keyword['value'], dict) and keyword['value']['type'] == 'call':
-        if isinstance(keyword['value'], dict) and keyword['value']['type'] == 'call':
-          self.reduce_call(keyword['value'])
+    for keyword in call_ast.keywords:
+      if isinstance(keyword.value, CallNode):
+        _, value = yield self.value_reducers[value_type(keyword.value)], keyword.value
+        keywords.append(KeywordNode(keyword.keyword, value))
+      elif keyword.keyword in func_args:
         keywords.append(keyword)
-    call_ast['keywords'] = keywords
+    return args, keywords
 
   def reduce_value(self, value):
     '''Acts as a 'dispatch' function that calls the appropriate reducer
-    function based on value type, returns function name corresponding to
-    the function that it finds in the value.
+    function based on value type (see value_reducers), returns a tuple of the
+    function name corresponding to the function that it finds in the value
+    and the reduced value.
     '''
-    call_name = None
-    if isinstance(value, dict) and 'type' in value.keys():
-      temp_name = None
-      if value['type'] == 'call':
-        temp_name = self.reduce_call(value)
-      elif value['type'] == 'set' or value['type'] == 'list' or value['type'] == 'tuple':
-        temp_name = self.reduce_iterable(value)
-      elif value['type'] == 'dict':
-        temp_name = self.reduce_dict(value)
-      if temp_name != None:
-        call_name = temp_name
-    return call_name
+    return evaluate(self, self.value_reducers[value_type(value)](self, value))
+
+  def reduce_shared_call(self, call_ast):
+    '''Reduces a 'call' node once per filter. Identical calls share a node
+    (see astnodes.NodeTable), so every further occurrence of a call, e.g.
+    nn.ReLU(inplace = True), is reduced by a single lookup.
+    '''
+    reduction = self.reductions.get(call_ast)
+    if reduction != None:
+      return reduction
+    return self.reduce_call(call_ast)
+
+  def reduce_other(self, value):
+    '''Values of other types contain no function names and are kept as
+    they are.
+    '''
+    return None, value
 
   def reduce_dict(self, arg):
     '''Encapsulating function that filters out the key value pairs of 'dict' nodes
     and applies the same reduction to each key and value node in key value pair.
 
-    Returns function name if a function specified in 'self.function_names' is
-    found. None otherwise.
+    Returns function name if a function specified in the function names is
+    found (None otherwise) and the reduced node.
     '''
     call_name = None
     key_values = []
 
-    for key, value in arg['key_values']:
-      key_temp_name = self.reduce_value(key)
+    for key, value in arg.key_values:
+      key_temp_name, key_value = yield self.value_reducers[value_type(key)], key
       if key_temp_name != None:
-        key_values.append([key, value])
+        key_values.append([key_value, value])
         call_name = key_temp_name
         continue
       
-      value_temp_name = self.reduce_value(value)
+      value_temp_name, value_value = yield self.value_reducers[value_type(value)], value
       if value_temp_name != None:
-        key_values.append([key, value])
+        key_values.append([key_value, value_value])
         call_name = value_temp_name
 
-    arg['key_values'] = key_values
-    return call_name
+    return call_name, DictNode(key_values)
 
   def reduce_iterable(self, args):
     '''Encapsulating function that filters out the elements of 'set', 'list'
     and 'tuple' nodes and applies reduction to each element node.
 
-    Returns function name if a function specified in 'self.function_names' is
-    found. None otherwise.
+    Returns function name if a function specified in the function names is
+    found (None otherwise) and the reduced node.
     '''
     call_name = None
     new_elements = []
-    for arg in args['elements']:
-      temp_name = self.reduce_value(arg)
+    for arg in args.elements:
+      temp_name, value = yield self.value_reducers[value_type(arg)], arg
       if temp_name != None:
         call_name = temp_name
-        new_elements.append(arg)
-    args['elements'] = new_elements
-    return call_name
+        new_elements.append(value)
+    return call_name, IterableNode(args.type, new_elements)
 
   def search_function_name(self, instance):
     '''Search functions that are called from other functions for names that are
-    specified in self.function_names
+    specified in the function names. Returns the name and the reduced
+    function.
     
     Example:
     test().x.test()
 
-    returns test if it is specified in self.function_names
+    returns test if it is specified in the function names
     ''' 
-    if isinstance(instance, dict):
-      if 'instance' in instance.keys():
-        call_name = self.search_function_name(instance['instance'])
-        if instance['attr'] in self.function_names:
-          return instance['attr']
-        return call_name
-      else:
-        return self.reduce_value(instance)
-    elif isinstance(instance, str) and instance in self.function_names:
-      return instance
-    return None
+    if isinstance(instance, AttributeNode):
+      call_name, value = yield self.search_function_name(instance.instance)
+      function = AttributeNode(value, instance.attr)
+      if self.matcher.matches(instance.attr):
+        return instance.attr, function
+      return call_name, function
+    elif isinstance(instance, str):
+      return instance if self.matcher.matches(instance) else None, instance
+    return (yield self.value_reducers[value_type(instance)], instance)
 
   def reduce_call(self, call_ast):
     '''Encapsulating function that filters out the arguments and keywords of
     'call' nodes and applies reduction to each argument and keyword value node.
 
-    Returns function name if a function specified in 'self.function_names' is
-    found. None otherwise.
+    Returns function name if a function specified in the function names is
+    found (None otherwise) and the reduced node.
     '''
-    call_name = self.search_function_name(call_ast['function'])
+    call_name, function = yield self.search_function_name(call_ast.function)
     if call_name != None:
-      self.filter_call_args(call_ast, self.func_args[call_name])
-      return call_name
+      args, keywords = yield self.filter_call_args(call_ast, self.matcher.arguments(call_name))
+      reduction = call_name, CallNode(function, args, keywords)
+      self.reductions[call_ast] = reduction
+      return reduction
 
     args = []
-    for arg in call_ast['args']:
-      temp_name = self.reduce_value(arg)
+    for arg in call_ast.args:
+      temp_name, value = yield self.value_reducers[value_type(arg)], arg
       if temp_name != None:
         call_name = temp_name
-        args.append(arg)
+        args.append(value)
 
     keywords = []
-    for keyword in call_ast['keywords']:
-      if call_name != None and keyword['keyword'] in self.func_args[call_name]:
+    for keyword in call_ast.keywords:
+      if call_name != None and keyword.keyword in self.matcher.arguments(call_name):
         keywords.append(keyword)
       else:
-        temp_name = self.reduce_value(keyword['value'])
+        temp_name, value = yield self.value_reducers[value_type(keyword.value)], keyword.value
         if temp_name != None:
-          keywords.append(keyword)
+          keywords.append(KeywordNode(keyword.keyword, value))
           call_name = temp_name
 
-    call_ast['args'] = args
-    call_ast['keywords'] = keywords
-
     # len(args) > 0 or len(keywords) > 0 indicates that a function was found
     # in the arguments/keywords of the function that reduce_call() was
     # initially called with.
-    return call_name if len(args) > 0 or len(keywords) > 0 else None
+    reduction = call_name if len(args) > 0 or len(keywords) > 0 else None, CallNode(function, args, keywords)
+    self.reductions[call_ast] = reduction
+    return reduction
 
   def reduce_function_def(self, function_def_ast):
     '''Encapsulating function that filters out the calls and function_defs of
     'function_def' nodes and applies reductions to nodes in 'calls' and nodes
     in 'function_defs'.
 
-    Returns True if a function specified in 'self.function_names' is found.
+    Returns True if a function specified in the function names is found.
     False otherwise.
     '''
-    if function_def_ast['name'] in self.function_names:
+    if self.matcher.matches(function_def_ast.name):
       return True
     
     calls = []
-    for call in function_def_ast['calls']:
-      if self.reduce_call(call) != None:
-        calls.append(call)
+    for call in function_def_ast.calls:
+      call_name, value = yield self.value_reducers[value_type(call)], call
+      if call_name != None:
+        calls.append(value)
     
     function_defs = []
-    for function_def in function_def_ast['function_defs']:
-      if self.reduce_function_def(function_def):
+    for function_def in function_def_ast.function_defs:
+      if (yield self.reduce_function_def(function_def)):
         function_defs.append(function_def)
     
-    function_def_ast['calls'] = calls
-    function_def_ast['function_defs'] = function_defs
+    function_def_ast.calls = calls
+    function_def_ast.function_defs = function_defs
     return len(calls) > 0 or len(function_defs) > 0
+
+  # Reducers of converted values, keyed on their type tag. Values of other
+  # types are not reduced.
+  value_reducers = DispatchTable({
+    'call': reduce_shared_call,
+    ('set', 'list', 'tuple'): reduce_iterable,
+    'dict': reduce_dict
+  }, default = reduce_other)
@@ -0,0 +1,262 @@
+from collections import deque
+import ast
+
+from .astconverter import ASTConverter
+from .astdispatch import DispatchTable, append_child_nodes
+from .astnodes import AttributeNode, CallNode, DictNode, FunctionDefNode, IterableNode, KeywordNode, SourceText, dotted_names
+from ..readers.functionmatcher import FunctionMatcher
+
+class FusedASTFilter(ASTConverter):
+  '''Converts and filters an AST in a single pass.
+
+  The result is identical to ASTFilter(args).run(ASTConverter().run(root)),
+  but the parts of the tree that the filter would discard are never
+  converted. Each reduce_* function below mirrors the function of the same
+  name in ASTFilter: it walks the original AST node, returns the function
+  name found in it (or None) and builds only the part of the converted node
+  that the filter would keep. Arguments that the filter keeps unreduced are
+  converted in full with convert_arguments.
+
+  The tree is traversed in the same order as ASTConverter.walk_ast so that
+  aliases from import statements are applied to the same calls. Like the
+  converted nodes, reduced nodes other than dicts are shared by identical
+  subtrees (see astnodes.NodeTable).
+
+  Example:
+
+  FusedASTFilter({'torch.nn.Conv2d': ['in_channels']}).run(ast.parse(source))
+  '''
+
+  def __init__(self, args):
+    super().__init__()
+    self.matcher = FunctionMatcher.of(args)
+
+  def run(self, root, source = None):
+    '''Returns the filtered AST, or None if no specified function was found.
+    With the source of the AST, arguments are converted to source code
+    lazily (see ASTConverter.convert_source).
+    '''
+    self.source = SourceText(source) if source != None else None
+    if len(self.matcher) == 0:
+      result = self.walk_ast(root)
+    else:
+      result = self.reduce_ast(root)
+
+    for key in result.keys():
+      if len(result[key]) > 0:
+        return result
+    return None
+
+  def reduce_ast(self, node):
+    '''Traverses the AST like walk_ast and keeps the imports, calls and
+    function definitions that contain a specified function name.
+    '''
+    res = {}
+    res['imports'] = []
+    res['calls'] = []
+    res['function_defs'] = []
+
+    self.evaluate(self.collect(node, self.ast_reducers, res))
+    return res
+
+  def collect(self, root, collectors, res):
+    '''Traverses the node in BFS fashion like walk_ast and adds the reduced
+    conversions of the nodes that have a collector and contain a specified
+    function to their field of res.
+
+    Like the handlers of the converter, the reduce_* functions below are
+    generators run by evaluate: they yield (handler, node), or a generator,
+    for every child node they need reduced or converted and are sent back
+    the result.
+    '''
+    todo = deque([root])
+    while todo:
+      node = todo.popleft()
+
+      collector = collectors[type(node)]
+      if collector != None:
+        field, reduce = collector
+        value = yield reduce, node
+        if value != None:
+          res[field].append(value)
+      else:
+        append_child_nodes(todo, node)
+
+  def reduce_import(self, root):
+    # Aliases are registered for every import, even if it is not kept.
+    import_res = self.convert_import(root)
+    module = import_res.module
+    names = []
+    for name in import_res.names:
+      func_name = name.name if module == None else dotted_names[module, name.name]
+      if self.matcher.matches(func_name):
+        names.append(name)
+    import_res.names = names
+    return import_res if len(names) > 0 else None
+
+  def reduce_collected_call(self, root):
+    call_name, call = yield self.reduce_call(root)
+    return call if call_name != None else None
+
+  def reduce_leaf(self, root):
+    '''Nodes that the filter does not reduce (names, constants and source
+    fallbacks) have no function name and are not converted, so the reduced
+    conversion of a leaf is None.
+    '''
+    return None, None
+
+  def reduce_iterable(self, root):
+    reducers = self.value_reducers
+    call_name = None
+    elts = []
+    for node in root.elts:
+      temp_name, value = yield reducers[type(node)], node
+      if temp_name != None:
+        call_name = temp_name
+        elts.append(value)
+    return call_name, self.nodes.node(IterableNode, self.iterable_types[type(root)], tuple(elts))
+
+  def reduce_dict(self, root):
+    '''A key value pair is kept if its key or value contains a specified
+    function. If the key does, the value is kept unreduced.
+    '''
+    reducers = self.value_reducers
+    converters = self.argument_converters
+    call_name = None
+    key_values = []
+    for key, value in zip(root.keys, root.values):
+      key_temp_name, key_value = yield reducers[type(key)], key
+      if key_temp_name != None:
+        key_values.append([key_value, (yield converters[type(value)], value)])
+        call_name = key_temp_name
+        continue
+
+      value_temp_name, value_value = yield reducers[type(value)], value
+      if value_temp_name != None:
+        if key_value == None:
+          key_value = yield converters[type(key)], key
+        key_values.append([key_value, value_value])
+        call_name = value_temp_name
+    return call_name, DictNode(key_values)
+
+  def reduce_attribute_name(self, root):
+    '''Returns a tuple of the reduced conversion of the function of a call
+    (see get_function_names) and the function name found in it.
+    '''
+    root_value, call_name = yield self.function_name_reducers[type(root.value)], root.value
+    if isinstance(root_value, str):
+      function = dotted_names[root_value, root.attr]
+      return function, function if self.matcher.matches(function) else None
+
+    if self.matcher.matches(root.attr):
+      call_name = root.attr
+    return self.nodes.node(AttributeNode, root_value, root.attr), call_name
+
+  def reduce_call_name(self, root):
+    call_name, call = yield self.reduce_call(root)
+    return call, call_name
+
+  def reduce_other_name(self, root):
+    function = self.get_function_names(root)
+    return function, function if self.matcher.matches(function) else None
+
+  def reduce_call(self, root):
+    '''Returns a tuple of the function name found in the call node (or None)
+    and the reduced conversion of the call.
+    '''
+    reducers = self.value_reducers
+    converters = self.argument_converters
+    function, call_name = yield self.function_name_reducers[type(root.func)], root.func
+    if call_name != None:
+      args, keywords = yield self.filter_call_args(root, self.matcher.arguments(call_name))
+      return call_name, self.nodes.node(CallNode, function, tuple(args), tuple(keywords))
+
+    args = []
+    for node in root.args:
+      temp_name, value = yield reducers[type(node)], node
+      if temp_name != None:
+        call_name = temp_name
+        args.append(value)
+
+    keywords = []
+    for node in root.keywords:
+      if call_name != None and node.arg in self.matcher.arguments(call_name):
+        keywords.append(self.nodes.node(KeywordNode, node.arg, (yield converters[type(node.value)], node.value)))
+      else:
+        temp_name, value = yield reducers[type(node.value)], node.value
+        if temp_name != None:
+          keywords.append(self.nodes.node(KeywordNode, node.arg, value))
+          call_name = temp_name
+
+    call = self.nodes.node(CallNode, function, tuple(args), tuple(keywords))
+    return call_name if len(args) > 0 or len(keywords) > 0 else None, call
+
+  def filter_call_args(self, root, func_args):
+    '''Returns the call arguments that contain a specified function, and the
+    keywords that are specified arguments or calls.
+    '''
+    args = []
+    for node in root.args:
+      if isinstance(node, ast.Call):
+        temp_name, value = yield self.reduce_call(node)
+        if temp_name != None:
+          args.append(value)
+
+    keywords = []
+    for node in root.keywords:
+      if isinstance(node.value, ast.Call):
+        _, value = yield self.reduce_call(node.value)
+        keywords.append(self.nodes.node(KeywordNode, node.arg, value))
+      elif node.arg in func_args:
+        keywords.append(self.nodes.node(KeywordNode, node.arg, (yield self.argument_converters[type(node.value)], node.value)))
+    return args, keywords
+
+  def reduce_function_def(self, root):
+    '''Returns the reduced conversion of a function definition, or None if it
+    does not contain a specified function. Definitions whose name is a
+    specified function are kept in full.
+    '''
+    if self.matcher.matches(root.name):
+      return (yield self.generate_function_def(root))
+
+    res = {}
+    res['calls'] = []
+    res['function_defs'] = []
+    for item in root.body:
+      yield self.collect(item, self.function_def_reducers, res)
+
+    if len(res['calls']) == 0 and len(res['function_defs']) == 0:
+      return None
+
+    converters = self.argument_converters
+    args = []
+    for arg in root.args.args:
+      args.append((yield converters[type(arg)], arg))
+    return FunctionDefNode(root.name, args, res['calls'], res['function_defs'])
+
+  # Reducers of argument nodes, keyed on the class of the ast node. Other
+  # nodes are leaves that are not reduced.
+  value_reducers = DispatchTable({
+    ast.Call: reduce_call,
+    (ast.Tuple, ast.List, ast.Set): reduce_iterable,
+    ast.Dict: reduce_dict
+  }, default = reduce_leaf)
+
+  function_name_reducers = DispatchTable({
+    ast.Attribute: reduce_attribute_name,
+    ast.Call: reduce_call_name
+  }, default = reduce_other_name)
+
+  # Nodes collected by reduce_ast and reduce_function_def, as the field of
+  # the result they are added to and their reducer. Other nodes are
+  # traversed.
+  ast_reducers = DispatchTable({
+    (ast.Import, ast.ImportFrom): ('imports', reduce_import),
+    ast.Call: ('calls', reduce_collected_call),
+    ast.FunctionDef: ('function_defs', reduce_function_def)
+  })
+
+  function_def_reducers = DispatchTable({
+    ast.Call: ('calls', reduce_collected_call),
+    ast.FunctionDef: ('function_defs', reduce_function_def)
+  })
@@ -0,0 +1,375 @@
+import ast
+import importlib.util
+import io
+import sys
+
+from .astdispatch import DispatchTable, evaluate
+
+class Node:
+  '''Base class of the nodes generated by the converter.
+
+  Nodes replace the dictionaries of the JSON representation while the AST is
+  converted, filtered and reformatted: they store their fields in __slots__
+  instead of a dictionary per node, and the type tag of most nodes is a class
+  attribute. They are turned into the JSON representation with to_json once
+  the output is written.
+
+  'fields' lists the arguments of the constructor and 'json_fields' the keys
+  of the JSON representation, in output order.
+
+
+  Nodes whose class is 'shared' are built through a NodeTable and are never
+  modified once built, since a single node stands for every occurrence of
+  its subtree. Imports and function definitions are not shared: the filter
+  removes their names, calls and nested definitions in place.
+
+  Example:
+
+  call = CallNode('torch.nn.Conv2d', [ConstantNode(3)], [KeywordNode('bias', ConstantNode(False))])
+  call.type == 'call'
+  to_json(call) == {'type': 'call', 'function': 'torch.nn.Conv2d', 'args': [...], 'keywords': [...]}
+  '''
+  __slots__ = ()
+  type = None
+  fields = ()
+  json_fields = ()
+  shared = True
+
+class ConstantNode(Node):
+  __slots__ = ('value',)
+  type = 'constant'
+  fields = ('value',)
+  json_fields = ('type', 'value')
+
+  def __init__(self, value):
+    self.value = value
+
+class NameNode(Node):
+  __slots__ = ('value',)
+  type = 'name'
+  fields = ('value',)
+  json_fields = ('type', 'value')
+
+  def __init__(self, value):
+    self.value = value
+
+class IterableNode(Node):
+  '''Tuple, List and Set nodes, whose type is 'tuple', 'list' or 'set'.'''
+  __slots__ = ('type', 'elements')
+  fields = ('type', 'elements')
+  json_fields = ('type', 'elements')
+
+  def __init__(self, type, elements):
+    self.type = type
+    self.elements = elements
+
+class DictNode(Node):
+  __slots__ = ('key_values',)
+  type = 'dict'
+  fields = ('key_values',)
+  json_fields = ('type', 'key_values')
+
+  def __init__(self, key_values):
+    self.key_values = key_values
+
+class AttributeNode(Node):
+  '''The function of a call on the result of another call, e.g. the function
+  of f().g(), which has no type in the JSON representation.
+  '''
+  __slots__ = ('instance', 'attr')
+  fields = ('instance', 'attr')
+  json_fields = ('instance', 'attr')
+
+  def __init__(self, instance, attr):
+    self.instance = instance
+    self.attr = attr
+
+class KeywordNode(Node):
+  __slots__ = ('keyword', 'value')
+  fields = ('keyword', 'value')
+  json_fields = ('keyword', 'value')
+
+  def __init__(self, keyword, value):
+    self.keyword = keyword
+    self.value = value
+
+class CallNode(Node):
+  __slots__ = ('function', 'args', 'keywords')
+  type = 'call'
+  fields = ('function', 'args', 'keywords')
+  json_fields = ('type', 'function', 'args', 'keywords')
+
+  def __init__(self, function, args, keywords):
+    self.function = function
+    self.args = args
+    self.keywords = keywords
+
+class AliasNode(Node):
+  __slots__ = ('name', 'alias')
+  fields = ('name', 'alias')
+  json_fields = ('name', 'alias')
+
+  def __init__(self, name, alias):
+    self.name = name
+    self.alias = alias
+
+class ImportNode(Node):
+  __slots__ = ('module', 'names')
+  type = 'import'
+  fields = ('module', 'names')
+  json_fields = ('type', 'module', 'names')
+  shared = False
+
+  def __init__(self, module, names):
+    self.module = module
+    self.names = names
+
+class FunctionDefNode(Node):
+  __slots__ = ('name', 'args', 'calls', 'function_defs')
+  type = 'function_def'
+  fields = ('name', 'args', 'calls', 'function_defs')
+  json_fields = ('type', 'name', 'args', 'calls', 'function_defs')
+  shared = False
+
+  def __init__(self, name, args, calls, function_defs):
+    self.name = name
+    self.args = args
+    self.calls = calls
+    self.function_defs = function_defs
+
+# Node classes of the type tags of the JSON representation.
+tagged_nodes = {
+  'constant': ConstantNode,
+  'name': NameNode,
+  'tuple': IterableNode,
+  'list': IterableNode,
+  'set': IterableNode,
+  'dict': DictNode,
+  'call': CallNode,
+  'import': ImportNode,
+  'function_def': FunctionDefNode
+}
+
+class NodeTable(dict):
+  '''Hash-conses nodes: maps the class and fields of a node to the single
+  node built for them, so that repeated subtrees such as
+  nn.ReLU(inplace = True) are allocated once per file.
+
+  Child nodes are built before their parent, so they are unique already and
+  a node is keyed on their identity, which takes one dictionary lookup per
+  node whatever the size of its subtree. The filter and reformatter cache
+  their results per call node in the same way (see
+  ASTFilter.reduce_shared_call and ASTReformatter.search_shared_call).
+
+  Fields that are lists are given as tuples, and constants are keyed on the
+  type of their value as well since 1 == 1.0 == True. Nodes with fields
+  that cannot be hashed, such as lists or the dictionaries returned by
+  handlers of subclasses, are built without being shared.
+
+  Example:
+
+  nodes = NodeTable()
+  keyword = nodes.node(KeywordNode, 'inplace', nodes.node(ConstantNode, True, bool))
+  relu = nodes.node(CallNode, 'nn.ReLU', (), (keyword,))
+  relu is nodes.node(CallNode, 'nn.ReLU', (), (keyword,))
+  '''
+
+  def node(self, *key):
+    try:
+      return self[key]
+    except TypeError:
+      return build_node(key)
+
+  def __missing__(self, key):
+    node = build_node(key)
+    self[key] = node
+    return node
+
+def build_node(key):
+  node_class = key[0]
+  if node_class is ConstantNode:
+    return ConstantNode(key[1])
+  return node_class(*[list(field) if type(field) is tuple else field for field in key[1:]])
+
+class SourceText:
+  '''The source of a file that SourceSegments refer to. The source is split
+  into lines the first time a segment is turned into text.
+  '''
+  __slots__ = ('source', 'lines')
+
+  def __init__(self, source):
+    self.source = source
+    self.lines = None
+
+  def segment(self, lineno, col_offset, end_lineno, end_col_offset):
+    '''Returns the source between two positions of the ast module. Column
+    offsets count UTF-8 bytes, whatever the encoding of the file.
+    '''
+    if self.lines == None:
+      if isinstance(self.source, bytes):
+        # Applies the encoding declaration and translates newlines like the
+        # parser does.
+        text = importlib.util.decode_source(self.source)
+      else:
+        text = io.IncrementalNewlineDecoder(None, True).decode(self.source, True)
+      self.lines = text.split('\n')
+
+    if lineno == end_lineno:
+      return self.lines[lineno - 1].encode()[col_offset:end_col_offset].decode()
+    first = self.lines[lineno - 1].encode()[col_offset:].decode()
+    last = self.lines[end_lineno - 1].encode()[:end_col_offset].decode()
+    return '\n'.join([first] + self.lines[lineno:end_lineno - 1] + [last])
+
+class SourceSegment:
+  '''Lazy replacement of ast.unparse for a node that the converter does not
+  model, e.g. a BinOp or a Lambda given as an argument.
+
+  Only the position of the node in the source is kept. Most of these values
+  are discarded by the filter, so the text is produced by text() only for
+  the values that are written out (see to_json), by parsing the segment of
+  the source again and unparsing it. The text is therefore identical to
+  ast.unparse of the node.
+
+  Example:
+
+  segment = SourceSegment(SourceText(b'f(a+b)'), ast.BinOp, 1, 2, 1, 5)
+  segment.text() == 'a + b'
+  '''
+  __slots__ = ('source', 'node_class', 'lineno', 'col_offset', 'end_lineno', 'end_col_offset')
+
+  def __init__(self, source, node_class, lineno, col_offset, end_lineno, end_col_offset):
+    self.source = source
+    self.node_class = node_class
+    self.lineno = lineno
+    self.col_offset = col_offset
+    self.end_lineno = end_lineno
+    self.end_col_offset = end_col_offset
+
+  def text(self):
+    segment = self.source.segment(self.lineno, self.col_offset, self.end_lineno, self.end_col_offset)
+    return ast.unparse(segment_parsers[self.node_class](segment))
+
+def parse_argument(segment):
+  # As an argument of a call, starred expressions and unparenthesized
+  # generator expressions parse like in the original source.
+  return ast.parse('_(%s)' % segment).body[0].value.args[0]
+
+def parse_parenthesized(segment):
+  return ast.parse('_((%s))' % segment).body[0].value.args[0]
+
+def parse_parameter(segment):
+  return ast.parse('def _(%s): pass' % segment).body[0].args.args[0]
+
+# Parsers of the segments of source nodes, keyed on the class of the ast
+# node. Yield expressions are only valid in parentheses.
+segment_parsers = DispatchTable({
+  (ast.Yield, ast.YieldFrom): parse_parenthesized,
+  ast.arg: parse_parameter
+}, default = parse_argument)
+
+CONTAINERS = (Node, dict, list, tuple)
+
+def value_type(value):
+  '''Returns the type tag of a value generated by the converter, or None for
+  values that are not tagged nodes (e.g. source code strings).
+  '''
+  return value.type if isinstance(value, Node) else None
+
+def to_json(value):
+  '''Returns the value with every node replaced by a dictionary of its JSON
+  representation and every source segment by its text. Lists stay lists and
+  tuples stay tuples.
+  '''
+  if isinstance(value, SourceSegment):
+    return value.text()
+  return evaluate(None, generate_json(value)) if isinstance(value, CONTAINERS) else value
+
+def generate_json(value):
+  # Run by evaluate, so that deeply nested nodes are converted without
+  # recursion.
+  if isinstance(value, (Node, dict)):
+    res = {}
+    if isinstance(value, Node):
+      items = ((name, getattr(value, name)) for name in value.json_fields)
+    else:
+      items = value.items()
+    for name, field in items:
+      if isinstance(field, CONTAINERS):
+        field = yield generate_json(field)
+      elif isinstance(field, SourceSegment):
+        field = field.text()
+      res[name] = field
+    return res
+
+  items = []
+  for item in value:
+    if isinstance(item, CONTAINERS):
+      item = yield generate_json(item)
+    elif isinstance(item, SourceSegment):
+      item = item.text()
+    items.append(item)
+  return items if isinstance(value, list) else tuple(items)
+
+def json_node_class(value):
+  '''Returns the node class of a dictionary of the JSON representation, or
+  None if it is not a node (e.g. the result of ASTConverter.run()).
+  '''
+  if 'type' in value:
+    return tagged_nodes.get(value['type'])
+  elif 'instance' in value:
+    return AttributeNode
+  elif 'keyword' in value:
+    return KeywordNode
+  elif 'alias' in value:
+    return AliasNode
+  return None
+
+def from_json(value):
+  '''Inverse of to_json: returns the value with every dictionary of the JSON
+  representation of a node replaced by the node. Identical subtrees are
+  shared like in the output of the converter.
+  '''
+  return evaluate(None, generate_nodes(value, NodeTable())) if isinstance(value, CONTAINERS) else value
+
+def generate_nodes(value, nodes):
+  if isinstance(value, dict):
+    node_class = json_node_class(value)
+    names = value.keys() if node_class == None else node_class.fields
+    fields = []
+    for name in names:
+      field = value[name]
+      fields.append((yield generate_nodes(field, nodes)) if isinstance(field, CONTAINERS) else field)
+    if node_class == None:
+      return dict(zip(names, fields))
+    elif not node_class.shared:
+      return node_class(*fields)
+    elif node_class is ConstantNode:
+      return nodes.node(ConstantNode, fields[0], type(fields[0]))
+    return nodes.node(node_class, *[tuple(field) if type(field) is list else field for field in fields])
+
+  items = []
+  for item in value:
+    items.append((yield generate_nodes(item, nodes)) if isinstance(item, CONTAINERS) else item)
+  return items if isinstance(value, list) else tuple(items)
+
+# Upper bound of the entries of dotted_names, which is cleared when full so
+# that long runs over many repositories do not accumulate every name.
+MAX_DOTTED_NAMES = 1 << 16
+
+class DottedNameTable(dict):
+  '''Maps a (prefix, name) pair to the interned dotted name 'prefix.name'.
+
+  Dotted names such as torch.nn.Conv2d are built once and shared by every
+  call site and file instead of being concatenated into a new string for
+  each call. Identifiers of the ast module are already interned by the
+  parser.
+  '''
+
+  def __missing__(self, key):
+    name = sys.intern(key[0] + '.' + key[1])
+    if len(self) >= MAX_DOTTED_NAMES:
+      self.clear()
+    self[key] = name
+    return name
+
+dotted_names = DottedNameTable()
@@ -1,3 +1,7 @@
+from .astdispatch import DispatchTable, evaluate
+from .astnodes import AttributeNode, CallNode, ConstantNode, KeywordNode, to_json, value_type
+from ..readers.functionmatcher import FunctionMatcher
+
 
 
 class ASTReformatter():
@@ -6,17 +10,26 @@ class ASTReformatter():
 
   Uses 'function_names' to identify nodes that contain specified function
   names and creates a list of all those nodes for pattern mining.
+
+  The search_* functions are generators run by astdispatch.evaluate, so
+  deeply nested values are searched without recursion. The output list is
+  returned in the JSON representation (see astnodes.to_json).
+
+  Nodes may be shared by identical subtrees (see astnodes.NodeTable), so the
+  output nodes are new nodes and each call is searched once: further
+  occurrences add the same output nodes again (see search_shared_call).
   '''
   def __init__(self, args):
-    self.function_names = args.keys()
-    self.func_args = args
+    self.matcher = FunctionMatcher.of(args)
     self.output_structure = []
+    # Output nodes added by the search of each call already searched.
+    self.outputs = {}
     
   def run(self, filtered_ast):
     '''Returns a list of ast nodes. 
 
     Reformatted AST entails a list of nodes that contains functions specified by
-    'self.function_names'.
+    the function names.
 
     Example:
 
@@ -74,7 +87,7 @@ class ASTReformatter():
     '''
 
     self.search_ast(filtered_ast)
-    return self.output_structure
+    return to_json(self.output_structure)
 
   def search_ast(self, filtered_ast):
     '''Encapsulating function that searches out calls and function_defs fields
@@ -82,100 +95,108 @@ class ASTReformatter():
     '''
     calls = filtered_ast['calls']
     for call in calls:
-      self.search_call(call)
+      evaluate(self, self.search_shared_call(call))
 
     function_defs = filtered_ast['function_defs']
     for function_def in function_defs:
-      self.search_function_def(function_def)
+      evaluate(self, self.search_function_def(function_def))
   
   def search_value(self, value):
     '''Acts as a 'dispatch' function that calls the appropriate search
-    function based on value type, searches the value for 'call' nodes that
-    are specified in 'function_names'.
+    function based on value type (see value_searches), searches the value
+    for 'call' nodes that are specified in 'function_names'.
     '''
-    if isinstance(value, dict) and 'type' in value.keys():
-      if value['type'] == 'call':
-        self.search_call(value)
-      elif value['type'] == 'list' or value['type'] == 'set' or value['type'] == 'tuple':
-        self.search_iterable(value)
-      elif value['type'] == 'dict':
-        self.search_dict(value)
+    evaluate(self, self.value_searches[value_type(value)](self, value))
+
+  def search_shared_call(self, call):
+    '''Searches a 'call' node, or adds the output nodes of its previous
+    search again if the call is shared by identical subtrees.
+    '''
+    outputs = self.outputs.get(call)
+    if outputs != None:
+      self.output_structure.extend(outputs)
+      return None
+    return self.search_call(call)
+
+  def search_other(self, value):
+    '''Values of other types contain no calls.'''
+    return None
 
   def search_iterable(self, iterable):
     '''Encapsulating function that searches the elements of 'set', 'list',
     and 'tuple' nodes for 'call' nodes that are specified in 'function_names'.
     '''
-    for element in iterable['elements']:
-      self.search_value(element)
+    for element in iterable.elements:
+      yield self.value_searches[value_type(element)], element
 
   def search_dict(self, dict):
     '''Encapsulating function that searches the key value pairs of 'dict' nodes
     for 'call' nodes that are specified in 'function_names'.
     '''
-    for key, value in dict['key_values']:
-      self.search_value(key)
-      self.search_value(value)
+    for key, value in dict.key_values:
+      yield self.value_searches[value_type(key)], key
+      yield self.value_searches[value_type(value)], value
 
   def search_function_name(self, instance):
-    if isinstance(instance, dict):
-      if 'instance' in instance.keys():
-        call_name = self.search_function_name(instance['instance'])
-        if instance['attr'] in self.function_names:
-          return instance['attr']
-        return call_name
-      else:
-        return self.search_value(instance)
-    elif isinstance(instance, str) and instance in self.function_names:
-      return instance
-    return None
+    if isinstance(instance, AttributeNode):
+      call_name = yield self.search_function_name(instance.instance)
+      if self.matcher.matches(instance.attr):
+        return instance.attr
+      return call_name
+    elif isinstance(instance, str):
+      return instance if self.matcher.matches(instance) else None
+    return (yield self.value_searches[value_type(instance)], instance)
 
   def search_call(self, call):
     '''Encapsulating function that checks if the call is specified in
     'function_names' and searches the arguments and keywords of 'call'
     nodes for functions specified in 'function_names'.
     '''
-    def search_args_keywords(call):
-      for arg in call['args']:
-        self.search_value(arg)
-      for keyword in call['keywords']:
-        self.search_value(keyword['value'])
-
-    call_name = self.search_function_name(call['function'])
+    start = len(self.output_structure)
+    call_name = yield self.search_function_name(call.function)
     if call_name != None:
       args = []
-      for arg in call['args']:
-        is_valid_arg = isinstance(arg, dict) and 'type' in arg.keys() and arg['type'] == 'constant'
+      for arg in call.args:
+        is_valid_arg = isinstance(arg, ConstantNode)
         if not is_valid_arg:
           continue
         else:
-          arg['value'] = arg['value']['value']
-          args.append(arg)
+          args.append(ConstantNode(arg.value.value))
       keywords = []
       keyword_keys = []
-      for keyword in call['keywords']:
-        is_valid_keyword = isinstance(keyword['value'], dict) and 'type' in keyword['value'].keys() and keyword['value']['type'] == 'constant'
+      for keyword in call.keywords:
+        is_valid_keyword = isinstance(keyword.value, ConstantNode)
         if not is_valid_keyword:
           continue
         else:
-          keyword_keys.append(keyword['keyword'])
-          keyword['value'] = keyword['value']['value']
-          keywords.append(keyword)
+          keyword_keys.append(keyword.keyword)
+          keywords.append(KeywordNode(keyword.keyword, keyword.value.value))
       
-      search_args_keywords(call)
+      yield self.search_args_keywords(call)
 
-      if len(set(keyword_keys)) != len(set(self.func_args[call_name])):
-        return
-
-      call['args'] = args
-      call['keywords'] = keywords
-      call['function'] = call_name
-      self.output_structure.append(call)
+      if len(set(keyword_keys)) == len(self.matcher.arguments(call_name)):
+        self.output_structure.append(CallNode(call_name, args, keywords))
     else:
-      search_args_keywords(call)
+      yield self.search_args_keywords(call)
+    self.outputs[call] = self.output_structure[start:]
+
+  def search_args_keywords(self, call):
+    for arg in call.args:
+      yield self.value_searches[value_type(arg)], arg
+    for keyword in call.keywords:
+      yield self.value_searches[value_type(keyword.value)], keyword.value
 
   def search_function_def(self, func_def):
     '''Encapsulating function that searches the calls field of 'function_def'
     nodes for functions specified in 'function_names'.
     '''
-    for call in func_def['calls']:
-      self.search_call(call)
+    for call in func_def.calls:
+      yield self.value_searches[value_type(call)], call
+
+  # Search functions of converted values, keyed on their type tag. Values of
+  # other types are not searched.
+  value_searches = DispatchTable({
+    'call': search_shared_call,
+    ('list', 'set', 'tuple'): search_iterable,
+    'dict': search_dict
+  }, default = search_other)
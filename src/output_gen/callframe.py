@@ -0,0 +1,164 @@
+import array
+import json
+import os
+
+from .jsonlsink import list_shards, read_records
+from .sqlitesink import DATABASE_NAME
+from .sqlitesink import read_records as read_database_records
+
+try:
+  import numpy as np
+  import pandas as pd
+except ImportError:
+  np = None
+  pd = None
+
+class CallColumns:
+  '''Column buffers that the calls of the output records are appended to, so
+  that the tables of calls and of keyword arguments are built in one step
+  once every record is read (see load_calls).
+
+  Project types, functions and keyword names repeat across calls and are
+  stored as codes into a list of categories, in arrays of machine integers.
+  String keyword values are shared between the calls that have the same
+  value. The records themselves are not kept, so the memory used grows with
+  the number of calls by a few dozen bytes per call and keyword.
+
+  Example:
+
+  columns = CallColumns()
+  columns.append('pytorch', [{'type': 'call', 'function': 'torch.nn.Conv2d', 'args': [], 'keywords': [...]}])
+  calls, keywords = columns.frames()
+  '''
+
+  def __init__(self):
+    self.projects = {}
+    self.functions = {}
+    self.keyword_names = {}
+    self.strings = {}
+    self.call_projects = array.array('i')
+    self.call_functions = array.array('i')
+    self.keyword_calls = array.array('q')
+    self.keyword_codes = array.array('i')
+    self.keyword_values = []
+
+  def append(self, project_type, calls):
+    functions = self.functions
+    keyword_names = self.keyword_names
+    strings = self.strings
+    keyword_calls = self.keyword_calls
+    keyword_codes = self.keyword_codes
+    keyword_values = self.keyword_values
+
+    project_code = self.projects.setdefault(project_type, len(self.projects))
+    call_id = len(self.call_functions)
+    for call in calls:
+      self.call_projects.append(project_code)
+      function = call['function']
+      code = functions.get(function)
+      if code == None:
+        code = functions[function] = len(functions)
+      self.call_functions.append(code)
+
+      for keyword in call['keywords']:
+        name = keyword['keyword']
+        code = keyword_names.get(name)
+        if code == None:
+          # Keyword names that are missing have no category.
+          code = -1 if name == None else keyword_names.setdefault(name, len(keyword_names))
+        value = keyword['value']
+        if type(value) is str:
+          value = strings.setdefault(value, value)
+        keyword_calls.append(call_id)
+        keyword_codes.append(code)
+        keyword_values.append(value)
+      call_id += 1
+
+  def frames(self):
+    '''Returns the table of calls, with a row per call indexed by call id,
+    and the long table of keyword arguments, with a row per keyword argument
+    of a call in the order they were appended.
+    '''
+    calls = pd.DataFrame({
+      'project_type': categorical(self.call_projects, self.projects),
+      'function': categorical(self.call_functions, self.functions)
+    })
+    calls.index.name = 'call'
+    keywords = pd.DataFrame({
+      'call': np.frombuffer(self.keyword_calls, dtype = self.keyword_calls.typecode),
+      'keyword': categorical(self.keyword_codes, self.keyword_names),
+      'value': pd.Series(self.keyword_values, dtype = object)
+    })
+    return calls, keywords
+
+def categorical(codes, categories):
+  # Codes are assigned in insertion order.
+  return pd.Categorical.from_codes(np.frombuffer(codes, dtype = codes.typecode), categories = list(categories))
+
+def iter_output_calls(output_path):
+  '''Yields the project type and the calls of every output record under the
+  output directory: the JSON files of the 'files' output format, whose
+  project type is the first directory under the output directory, and the
+  records of the JSON Lines shards and of the SQLite database, whose
+  project type is the owner of their repository.
+  '''
+  for directory, subdirectories, names in os.walk(output_path):
+    subdirectories.sort()
+    if len(list_shards(directory)) > 0:
+      for record in read_records(directory):
+        yield record['repo'].split('/')[0], record['calls']
+    if DATABASE_NAME in names:
+      for record in read_database_records(os.path.join(directory, DATABASE_NAME)):
+        yield record['repo'].split('/')[0], record['calls']
+    for name in sorted(names):
+      if name.endswith('.json'):
+        path = os.path.join(directory, name)
+        with open(path, 'rb') as f:
+          calls = json.load(f)
+        yield os.path.relpath(path, output_path).split(os.sep)[0], calls
+
+def load_calls(output_path):
+  '''Reads the output records under the output directory (see
+  iter_output_calls) into a table of calls and a long table of their
+  keyword arguments, which refer to the calls by call id:
+
+  calls:                                 keywords:
+  call  project_type  function           call  keyword  value
+  0     pytorch       torch.nn.Conv2d    0     stride   2
+  1     pytorch       torch.nn.ReLU      0     bias     False
+                                         1     inplace  True
+
+  The project types, functions and keyword names are categorical columns.
+  See pivot_keywords for a column per keyword name.
+
+  Example:
+
+  calls, keywords = load_calls('outputs')
+  keywords[keywords['keyword'] == 'stride'].join(calls, on = 'call')
+  '''
+  columns = CallColumns()
+  for project_type, calls in iter_output_calls(output_path):
+    columns.append(project_type, calls)
+  return columns.frames()
+
+def pivot_keywords(keywords, names = None):
+  '''Returns the long table of keyword arguments (see load_calls) as a wide
+  table with a row per call that has keyword arguments, indexed by call id,
+  and a column per keyword name, or per name in 'names'. The values of the
+  keywords a call does not have are NaN. A keyword given twice in a call
+  keeps its last value, and keyword arguments without a name are left out.
+
+  Example:
+
+  calls.join(pivot_keywords(keywords, ['stride', 'padding']), how = 'inner')
+  '''
+  if names != None:
+    keywords = keywords[keywords['keyword'].isin(names)]
+  else:
+    keywords = keywords[keywords['keyword'].notna()]
+  keywords = keywords.drop_duplicates(['call', 'keyword'], keep = 'last')
+  # Only the keyword names that occur get a column.
+  keywords = keywords.assign(keyword = keywords['keyword'].cat.remove_unused_categories())
+  wide = keywords.pivot(index = 'call', columns = 'keyword', values = 'value')
+  wide.columns = list(wide.columns)
+  return wide
@@ -0,0 +1,101 @@
+import json
+import os
+import time
+
+MISSING = object()
+
+class DedupStore:
+  '''Content-addressed store of reformatted results shared between projects.
+
+  Results are keyed by the content hash of the source file, so a file whose
+  bytes were already analysed (e.g. a vendored 'resnet.py' copied into many
+  repositories) reuses the stored result instead of being parsed again. The
+  store is partitioned by the hash of the function names configuration since
+  results depend on it.
+
+  Layout:
+  └── store
+      ├── stats.jsonl
+      └── <config hash>-<analysis fingerprint>
+          └── ab
+              └── ab12...ef.json
+
+  Each entry holds the reformatted result as JSON ('null' for files that
+  produced no output). Entries are written atomically so several main.py
+  processes can share one store. Results also depend on the analysis code
+  and the Python version, so main.py partitions the store by those too (see
+  workers.analysis_fingerprint).
+  '''
+
+  def __init__(self, path, config):
+    self.path = os.path.abspath(path)
+    self.entries_path = os.path.join(self.path, config)
+    self.files = 0
+    self.hits = 0
+    self.bytes_reused = 0
+
+  def entry_path(self, digest):
+    return os.path.join(self.entries_path, digest[:2], digest + '.json')
+
+  def get(self, digest, size = 0):
+    '''Returns the stored result for the content hash, or MISSING.'''
+    self.files += 1
+    try:
+      with open(self.entry_path(digest), 'r') as f:
+        result = json.load(f)
+    except FileNotFoundError:
+      return MISSING
+    except Exception as e:
+      print('ERROR: cannot read dedup entry', digest, '- Exception:', e)
+      return MISSING
+    self.hits += 1
+    self.bytes_reused += size
+    return result
+
+  def put(self, digest, result):
+    '''Stores the result for the content hash. Results that cannot be
+    represented as JSON are not stored.
+    '''
+    try:
+      data = json.dumps(result)
+    except (TypeError, ValueError):
+      return
+
+    entry_path = self.entry_path(digest)
+    os.makedirs(os.path.dirname(entry_path), exist_ok = True)
+    temp_path = '%s.%d.tmp' % (entry_path, os.getpid())
+    with open(temp_path, 'w') as f:
+      f.write(data)
+    os.replace(temp_path, entry_path)
+
+  def summary(self):
+    percentage = 100.0 * self.hits / self.files if self.files > 0 else 0.0
+    return 'Dedup: %d of %d files reused from the store (%.1f%%, %d bytes not re-analysed)' % (self.hits, self.files, percentage, self.bytes_reused)
+
+  def record_run(self, project_path):
+    '''Appends the counters of this run to 'stats.jsonl' in the store.'''
+    os.makedirs(self.path, exist_ok = True)
+    record = {'project': project_path, 'time': time.time(), 'files': self.files, 'hits': self.hits, 'bytes_reused': self.bytes_reused}
+    with open(os.path.join(self.path, 'stats.jsonl'), 'a') as f:
+      f.write(json.dumps(record) + '\n')
+
+def dedup_report(path, since = 0):
+  '''Returns a report of the work saved by the store at 'path' for runs that
+  were recorded after the timestamp 'since'.
+  '''
+  files = hits = bytes_reused = projects = 0
+  try:
+    with open(os.path.join(path, 'stats.jsonl'), 'r') as f:
+      for line in f:
+        record = json.loads(line)
+        if record['time'] < since:
+          continue
+        projects += 1
+        files += record['files']
+        hits += record['hits']
+        bytes_reused += record['bytes_reused']
+  except FileNotFoundError:
+    pass
+
+  percentage = 100.0 * hits / files if files > 0 else 0.0
+  return 'Dedup report: %d projects, %d files, %d reused from the store (%.1f%%), %.1f MB not re-analysed' % (projects, files, hits, percentage, bytes_reused / 1e6)
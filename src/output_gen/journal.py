@@ -0,0 +1,157 @@
+import json
+import os
+import urllib.parse
+
+from .output import get_relative_path, sync_file
+
+JOURNAL_NAME = '.journal'
+
+# The last line of the journal of a complete run.
+COMPLETE_LINE = b'{"complete":true}\n'
+
+def journal_path(output_path, repo = None):
+  '''Returns the path of the journal of a run. Runs that share the output
+  directory (the 'jsonl' and 'sqlite' output formats) keep a journal per
+  repository.
+  '''
+  if repo == None:
+    return os.path.join(output_path, JOURNAL_NAME)
+  return os.path.join(output_path, '%s-%s' % (JOURNAL_NAME, urllib.parse.quote(repo, safe = '')))
+
+class RunJournal:
+  '''Record of the input files a run has finished, so that an interrupted run
+  can be resumed without analysing them again (see main.py --resume).
+
+  The journal is a JSON Lines file in the output directory with a line per
+  finished file: its path relative to the project and where the sink put
+  its output, or null if the file produced no output. The position is
+  specific to the sink, e.g. the size of the output file of a FileSink or
+  the shard and offset after the record of a JSONLSink. Sinks that append to
+  shared output also record where the run started writing:
+
+  {"start":[3,1048576]}
+  {"path":"mnist/main.py","output":[3,1050112]}
+  {"path":"mnist/__init__.py","output":null}
+
+  Sinks record a file once its output is written, so the journal never
+  lists a file whose output was lost when the process was killed. On
+  resume, the sink checks the recorded outputs against what is on disk
+  (which may be behind after a power loss) and drops any output written
+  after the last file it can vouch for (see resume). The journal is removed
+  once the run is complete. The journal of a run into shared output is
+  marked complete instead, until the run is recorded as done elsewhere (see
+  repos_to_ast.py), so that resuming it again does not add its output twice:
+
+  {"complete":true}
+
+  Example:
+
+  journal = RunJournal(journal_path('output'), project_path)
+  sink = FileSink(project_path, 'output', journal = journal)
+  completed = journal.resume(sink) -> {'mnist/main.py', ...}
+  '''
+
+  def __init__(self, path, project_path):
+    self.path = path
+    self.project_path = project_path
+    self.journal_file = None
+    self.start_position = None
+
+  def resume(self, sink):
+    '''Loads the journal of an interrupted run and returns the relative paths
+    of the files that are done. The sink drops the entries whose output is
+    missing or incomplete, and any output it wrote after them, and the
+    journal is rewritten with the remaining entries.
+    '''
+    start, entries = read_journal(self.path)
+    entries = sink.recover(start, entries)
+    self.start_position = start
+    lines = []
+    if start != None:
+      lines.append({'start': start})
+    lines.extend({'path': rel_path, 'output': position} for rel_path, position in entries)
+
+    os.makedirs(os.path.dirname(self.path), exist_ok = True)
+    temp_path = self.path + '.tmp'
+    with open(temp_path, 'wb') as f:
+      write_lines(f, lines)
+      sync_file(f)
+    os.replace(temp_path, self.path)
+    self.journal_file = open(self.path, 'ab')
+    return set(rel_path for rel_path, _ in entries)
+
+  def start(self, position):
+    '''Records where the sink starts writing, unless this run resumes one
+    that already started.
+    '''
+    if self.start_position == None:
+      self.start_position = position
+      self.write([{'start': position}])
+
+  def record(self, path, position = None):
+    '''Records the input file at 'path' as done.'''
+    self.record_all([(path, position)])
+
+  def record_all(self, entries):
+    '''Records the input files of a list of (path, position) as done.'''
+    self.write([{'path': get_relative_path(path, self.project_path), 'output': position} for path, position in entries])
+
+  def write(self, lines):
+    if self.journal_file == None:
+      os.makedirs(os.path.dirname(self.path), exist_ok = True)
+      self.journal_file = open(self.path, 'wb')
+    write_lines(self.journal_file, lines)
+    self.journal_file.flush()
+
+  def close(self):
+    if self.journal_file != None:
+      sync_file(self.journal_file)
+      self.journal_file.close()
+      self.journal_file = None
+
+  def complete(self):
+    '''Marks the journal of a run that is complete.'''
+    self.write([{'complete': True}])
+    self.close()
+
+  def is_complete(self):
+    '''Returns True if the journal is marked complete.'''
+    if not os.path.exists(self.path):
+      return False
+    with open(self.path, 'rb') as f:
+      f.seek(max(0, f.seek(0, os.SEEK_END) - len(COMPLETE_LINE)))
+      return f.read() == COMPLETE_LINE
+
+  def remove(self):
+    '''Removes the journal of a run that is complete, and the output
+    directory if the run had no output.
+    '''
+    self.close()
+    if os.path.exists(self.path):
+      os.remove(self.path)
+      output_path = os.path.dirname(self.path)
+      if len(os.listdir(output_path)) == 0:
+        os.rmdir(output_path)
+
+def write_lines(f, lines):
+  f.write(b''.join(json.dumps(line, separators = (',', ':')).encode() + b'\n' for line in lines))
+
+def read_journal(path):
+  '''Returns the start position and the list of (relative path, position) of
+  the journal at 'path', which are None and empty if there is none.
+  '''
+  start = None
+  entries = []
+  if not os.path.exists(path):
+    return start, entries
+  with open(path, 'r') as f:
+    for line in f:
+      # The last line may have been cut off by a crash.
+      if not line.endswith('\n'):
+        break
+      entry = json.loads(line)
+      if 'start' in entry:
+        start = entry['start']
+      elif 'path' in entry:
+        entries.append((entry['path'], entry['output']))
+  return start, entries
@@ -0,0 +1,506 @@
+import gzip
+import json
+import lzma
+import os
+import time
+import zlib
+
+from .output import get_relative_path, sync_file
+from .serializer import StdlibSerializer
+
+# Shards are rotated once they reach this size.
+DEFAULT_SHARD_BYTES = 256 << 20
+
+# Compressed blocks are finished once they hold this many uncompressed bytes.
+DEFAULT_BLOCK_BYTES = 1 << 20
+
+# Records are buffered up to this size, so that they are written to disk in
+# large writes, or for this many seconds, so that a run that is killed loses
+# little of its output.
+WRITE_BUFFER_BYTES = 1 << 20
+WRITE_BUFFER_SECONDS = 1
+
+# Compressed blocks are also finished after this many seconds.
+BLOCK_SECONDS = 10
+
+SHARD_PREFIX = 'calls-'
+SHARD_EXTENSION = '.jsonl'
+INDEX_EXTENSION = '.idx'
+
+class JSONLSink:
+  '''Output sink that appends one compact JSON line per input file to sharded
+  JSON Lines files, instead of writing a file per input file (see FileSink).
+
+  Each line holds the repository, the path of the file relative to the
+  project and the reformatted calls, e.g.
+
+  {"repo":"pytorch/examples","path":"mnist/main.py","calls":[{"type":"call",...}]}
+
+  Layout:
+  └── output
+      ├── calls-00000.jsonl
+      ├── calls-00001.jsonl
+      └── ...
+
+  A new shard is started once the current one would grow past 'max_bytes'.
+  Runs over several projects can share the output directory: a sink appends
+  to the last shard left by the previous run. Only one sink may write to a
+  directory at a time. Records are written once they add up to
+  WRITE_BUFFER_BYTES or WRITE_BUFFER_SECONDS after the previous write, which
+  poll() also checks while no records arrive, and shards are synced to disk
+  when they are rotated and when the sink is closed.
+
+  With a journal (see journal.RunJournal), the files whose records were
+  written are recorded with the shard and the offset after their record
+  each time the buffered records are written. An interrupted run is resumed
+  with recover(), even after runs over other repositories appended to the
+  directory.
+
+  Records are serialized compactly by the serializer (see
+  serializer.get_serializer).
+  '''
+  extension = SHARD_EXTENSION
+
+  def __init__(self, project_path, output_path, repo, max_bytes = DEFAULT_SHARD_BYTES, serializer = None, journal = None):
+    self.project_path = project_path
+    self.output_path = output_path
+    self.repo = repo
+    self.max_bytes = max_bytes
+    self.serializer = serializer if serializer != None else StdlibSerializer()
+    self.journal = journal
+    self.shard_file = None
+    self.size = 0
+    self.buffer = []
+    self.buffer_bytes = 0
+    self.flush_time = time.monotonic()
+    # Files whose records are not written yet, with their position.
+    self.pending = []
+    shards = list_shards(output_path)
+    self.index = 0
+    if len(shards) > 0:
+      # A shard of another kind, e.g. compressed, is not appended to.
+      self.index = shard_index(shards[-1]) + (not shards[-1].endswith(self.extension))
+
+  def shard_path(self, index):
+    return os.path.join(self.output_path, '%s%05d%s' % (SHARD_PREFIX, index, self.extension))
+
+  def encode(self, path, result):
+    '''Returns the JSON line of the result (see output.FileSink).'''
+    record = {'repo': self.repo, 'path': get_relative_path(path, self.project_path), 'calls': result}
+    return self.serializer.dumps(record) + b'\n'
+
+  def write(self, path, result):
+    self.write_encoded(path, self.encode(path, result))
+
+  def write_encoded(self, path, line):
+    if self.shard_file == None:
+      self.open_output()
+    if self.size > 0 and self.size + len(line) > self.max_bytes:
+      self.close_shard()
+      self.index += 1
+      self.open_shard()
+    self.buffer.append(line)
+    self.buffer_bytes += len(line)
+    self.size += len(line)
+    self.pending.append((path, [self.index, self.size]))
+    if self.buffer_bytes >= WRITE_BUFFER_BYTES or time.monotonic() - self.flush_time >= WRITE_BUFFER_SECONDS:
+      self.flush()
+
+  def poll(self):
+    '''Writes the buffered records if the previous write was
+    WRITE_BUFFER_SECONDS ago. Called by the write stage while it waits for
+    records, so that records are not held back by a slow analysis.
+    '''
+    if len(self.buffer) > 0 and time.monotonic() - self.flush_time >= WRITE_BUFFER_SECONDS:
+      self.flush()
+
+  def flush(self):
+    self.shard_file.write(b''.join(self.buffer))
+    self.shard_file.flush()
+    self.buffer = []
+    self.buffer_bytes = 0
+    self.flush_time = time.monotonic()
+    # The records are written before their files are recorded as done.
+    if self.journal != None and len(self.pending) > 0:
+      self.journal.record_all(self.pending)
+    self.pending = []
+
+  def open_output(self):
+    os.makedirs(self.output_path, exist_ok = True)
+    self.open_shard()
+    if self.journal != None:
+      self.journal.start([self.index, self.size])
+
+  def open_shard(self):
+    self.shard_file = open(self.shard_path(self.index), 'ab+')
+    # Drops a line that was cut off by a crash, so that the first record
+    # starts on a line of its own.
+    self.size = line_end(self.shard_file)
+    self.shard_file.truncate(self.size)
+
+  def close_shard(self):
+    self.flush()
+    sync_file(self.shard_file)
+    self.shard_file.close()
+    self.shard_file = None
+
+  def close(self):
+    if self.shard_file != None:
+      self.close_shard()
+
+  def recover(self, start, entries):
+    '''Returns the journal entries of an interrupted run whose records are in
+    their shard, up to the first record that is missing, e.g. after a power
+    loss. If the output after the last of these records was written by the
+    interrupted run only, it is removed, so that the files it belongs to are
+    not stored twice when they are analysed again. If runs over other
+    repositories appended to the directory since, the output is kept and the
+    files whose records the interrupted run wrote in it are done too.
+    '''
+    if start == None:
+      return entries
+    ends = {}
+    last = start
+    lost = False
+    recovered = []
+    for rel_path, position in entries:
+      if position != None:
+        index, end = position
+        if index not in ends:
+          ends[index] = self.shard_end(index)
+        if lost or end > ends[index]:
+          lost = True
+          continue
+        last = position
+      recovered.append((rel_path, position))
+
+    tail = []
+    shared = False
+    for repo, rel_path, position in self.tail_records(last):
+      if repo == self.repo:
+        tail.append((rel_path, position))
+      else:
+        shared = True
+    if shared:
+      return recovered + tail
+
+    for shard in list_shards(self.output_path):
+      if shard_index(shard) > last[0]:
+        os.remove(shard)
+        if os.path.exists(shard + INDEX_EXTENSION):
+          os.remove(shard + INDEX_EXTENSION)
+    self.truncate_shard(last[0], last[1])
+    self.index = last[0]
+    return recovered
+
+  def tail_records(self, position):
+    '''Yields the repository, the path and the position of the records
+    after 'position' in the shards. Lines that were cut off or cannot be
+    read are left out, and shards of another kind have no repository.
+    '''
+    for shard in list_shards(self.output_path):
+      index = shard_index(shard)
+      if index < position[0]:
+        continue
+      if not shard.endswith(self.extension):
+        yield None, None, None
+        continue
+      offset = position[1] if index == position[0] else 0
+      with open(shard, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+          offset += len(line)
+          if not line.endswith(b'\n'):
+            continue
+          try:
+            record = json.loads(line)
+          except ValueError:
+            continue
+          yield record['repo'], record['path'], [index, offset]
+
+  def shard_end(self, index):
+    '''Returns the size of the data in a shard, or -1 if it does not exist.'''
+    shard_path = self.shard_path(index)
+    return os.path.getsize(shard_path) if os.path.exists(shard_path) else -1
+
+  def truncate_shard(self, index, end):
+    shard_path = self.shard_path(index)
+    if os.path.exists(shard_path):
+      with open(shard_path, 'r+b') as f:
+        f.truncate(end)
+
+class GzipBlock:
+  extension = '.gz'
+
+  def __init__(self, level):
+    # A window size of 16 + 15 bits writes a gzip member.
+    self.compressor = zlib.compressobj(level if level != None else 6, zlib.DEFLATED, 31)
+
+  def compress(self, data):
+    return self.compressor.compress(data)
+
+  def flush(self):
+    return self.compressor.flush()
+
+  @staticmethod
+  def decompress(data):
+    return gzip.decompress(data)
+
+class LZMABlock(GzipBlock):
+  extension = '.xz'
+
+  def __init__(self, level):
+    self.compressor = lzma.LZMACompressor(lzma.FORMAT_XZ, preset = level)
+
+  @staticmethod
+  def decompress(data):
+    return lzma.decompress(data)
+
+# Block codecs by compression name.
+compressions = {
+  'gzip': GzipBlock,
+  'lzma': LZMABlock
+}
+
+class CompressedJSONLSink(JSONLSink):
+  '''JSON Lines sink that compresses the records with gzip or lzma as they
+  are written.
+
+  The records are compressed in blocks of about 'block_bytes' of JSON lines.
+  Each block is a complete gzip member or xz stream, so a shard is a valid
+  .gz or .xz file that zcat or xzcat decompress in full, and each block can
+  also be decompressed on its own. The blocks of a shard are listed in its
+  index, one JSON line per block with the offset and size of the block in
+  the shard, its number of records and its repository:
+
+  {"offset":0,"size":48213,"records":112,"repo":"pytorch/examples"}
+
+  Layout:
+  └── output
+      ├── calls-00000.jsonl.gz
+      ├── calls-00000.jsonl.gz.idx
+      └── ...
+
+  Every sink starts a new block, so the records of a repository start at a
+  block and a reader seeks straight to them (see read_records). Shards are
+  rotated once a block takes them past 'max_bytes' of compressed data.
+
+  A block is only listed in the index once it is complete. A block that was
+  cut off by a crash is not read and is overwritten by the next sink. With
+  a journal, the files of a block are recorded with the shard and the end of
+  the block once it is listed in the index. Blocks are also finished
+  BLOCK_SECONDS after they were started, which poll() also checks while no
+  records arrive, so that a run that is killed loses little of its output.
+
+  Example:
+
+  sink = CompressedJSONLSink(project_path, output_path, 'pytorch/examples', compression = 'lzma')
+  '''
+
+  def __init__(self, project_path, output_path, repo, max_bytes = DEFAULT_SHARD_BYTES, serializer = None, compression = 'gzip', level = None, block_bytes = DEFAULT_BLOCK_BYTES, journal = None):
+    self.codec = compressions[compression]
+    self.extension = SHARD_EXTENSION + self.codec.extension
+    super().__init__(project_path, output_path, repo, max_bytes, serializer, journal)
+    self.level = level
+    self.block_bytes = block_bytes
+    self.index_file = None
+    self.block = None
+
+  def write_encoded(self, path, line):
+    if self.shard_file == None:
+      self.open_output()
+    if self.block == None:
+      self.block = self.codec(self.level)
+      self.block_offset = self.size
+      self.block_bytes_written = 0
+      self.block_records = 0
+      self.block_time = time.monotonic()
+    self.write_data(self.block.compress(line))
+    self.block_bytes_written += len(line)
+    self.block_records += 1
+    self.pending.append(path)
+    if self.block_bytes_written >= self.block_bytes or time.monotonic() - self.block_time >= BLOCK_SECONDS:
+      self.finish_block()
+
+  def poll(self):
+    if self.block != None and time.monotonic() - self.block_time >= BLOCK_SECONDS:
+      self.finish_block()
+
+  def write_data(self, data):
+    self.shard_file.write(data)
+    self.size += len(data)
+
+  def finish_block(self):
+    self.write_data(self.block.flush())
+    self.block = None
+    # The block is written before it is listed in the index.
+    self.shard_file.flush()
+    entry = {'offset': self.block_offset, 'size': self.size - self.block_offset, 'records': self.block_records, 'repo': self.repo}
+    self.index_file.write((json.dumps(entry, separators = (',', ':')) + '\n').encode())
+    self.index_file.flush()
+    if self.journal != None:
+      position = [self.index, self.size]
+      self.journal.record_all([(path, position) for path in self.pending])
+    self.pending = []
+
+    if self.size >= self.max_bytes:
+      self.close_shard()
+      self.index += 1
+      self.open_shard()
+
+  def open_shard(self):
+    shard_path = self.shard_path(self.index)
+    blocks = read_index(shard_path)
+    end = blocks[-1]['offset'] + blocks[-1]['size'] if len(blocks) > 0 else 0
+    self.shard_file = open(shard_path, 'ab', buffering = WRITE_BUFFER_BYTES)
+    # Drops a block that was not finished.
+    self.shard_file.truncate(end)
+    self.size = end
+    self.index_file = open(shard_path + INDEX_EXTENSION, 'ab+')
+    # Drops a line of the index that was cut off.
+    self.index_file.seek(0)
+    self.index_file.truncate(self.index_file.read().rfind(b'\n') + 1)
+
+  def close_shard(self):
+    sync_file(self.shard_file)
+    self.shard_file.close()
+    self.shard_file = None
+    sync_file(self.index_file)
+    self.index_file.close()
+    self.index_file = None
+
+  def close(self):
+    if self.shard_file != None:
+      if self.block != None:
+        self.finish_block()
+      self.close_shard()
+
+  def tail_records(self, position):
+    # Only the blocks of the repository are decompressed.
+    for shard in list_shards(self.output_path):
+      index = shard_index(shard)
+      if index < position[0]:
+        continue
+      if not shard.endswith(self.extension):
+        yield None, None, None
+        continue
+      with open(shard, 'rb') as f:
+        for block in read_index(shard):
+          end = block['offset'] + block['size']
+          if index == position[0] and block['offset'] < position[1]:
+            continue
+          if block['repo'] != self.repo:
+            yield block['repo'], None, [index, end]
+            continue
+          f.seek(block['offset'])
+          try:
+            lines = self.codec.decompress(f.read(block['size'])).splitlines()
+          except (OSError, EOFError, lzma.LZMAError):
+            continue
+          for line in lines:
+            yield self.repo, json.loads(line)['path'], [index, end]
+
+  def shard_end(self, index):
+    # The blocks listed in the index may be missing from the shard after a
+    # power loss.
+    shard_path = self.shard_path(index)
+    if not os.path.exists(shard_path):
+      return -1
+    blocks = read_index(shard_path)
+    end = blocks[-1]['offset'] + blocks[-1]['size'] if len(blocks) > 0 else 0
+    return min(end, os.path.getsize(shard_path))
+
+  def truncate_shard(self, index, end):
+    shard_path = self.shard_path(index)
+    if not os.path.exists(shard_path):
+      return
+    blocks = [block for block in read_index(shard_path) if block['offset'] + block['size'] <= end]
+    temp_path = shard_path + INDEX_EXTENSION + '.tmp'
+    with open(temp_path, 'wb') as f:
+      f.write(b''.join((json.dumps(block, separators = (',', ':')) + '\n').encode() for block in blocks))
+    os.replace(temp_path, shard_path + INDEX_EXTENSION)
+    with open(shard_path, 'r+b') as f:
+      f.truncate(end)
+
+def line_end(f):
+  '''Returns the offset after the last complete line of a file opened for
+  reading.
+  '''
+  end = f.seek(0, os.SEEK_END)
+  while end > 0:
+    start = max(0, end - (1 << 16))
+    f.seek(start)
+    newline = f.read(end - start).rfind(b'\n')
+    if newline >= 0:
+      return start + newline + 1
+    end = start
+  return 0
+
+def shard_compression(name):
+  '''Returns the block codec of a shard, or None if it is not compressed.'''
+  for codec in compressions.values():
+    if name.endswith(SHARD_EXTENSION + codec.extension):
+      return codec
+  return None
+
+def list_shards(output_path):
+  '''Returns the paths of the shards in the output directory, in order.'''
+  if not os.path.isdir(output_path):
+    return []
+  extensions = [SHARD_EXTENSION] + [SHARD_EXTENSION + codec.extension for codec in compressions.values()]
+  names = []
+  for name in os.listdir(output_path):
+    for extension in extensions:
+      if name.startswith(SHARD_PREFIX) and name.endswith(extension) and name[len(SHARD_PREFIX):-len(extension)].isdigit():
+        names.append(name)
+  return [os.path.join(output_path, name) for name in sorted(names, key = shard_index)]
+
+def shard_index(name):
+  name = os.path.basename(name)
+  return int(name[len(SHARD_PREFIX):name.index('.')])
+
+def read_index(shard_path):
+  '''Returns the blocks listed in the index of a compressed shard.'''
+  index_path = shard_path + INDEX_EXTENSION
+  if not os.path.exists(index_path):
+    return []
+  blocks = []
+  with open(index_path, 'r') as f:
+    for line in f:
+      # The last line may have been cut off by a crash.
+      if line.endswith('\n'):
+        blocks.append(json.loads(line))
+  return blocks
+
+def read_records(output_path, repo = None):
+  '''Yields the records of all the shards in the output directory, in the
+  order they were written, or only the records of one repository.
+
+  Only the blocks of compressed shards that hold records of the repository
+  are read and decompressed. A record that was cut off by a crash is left
+  out.
+
+  Example:
+
+  for record in read_records('output', repo = 'pytorch/examples'):
+    print(record['path'], len(record['calls']))
+  '''
+  for shard in list_shards(output_path):
+    codec = shard_compression(shard)
+    with open(shard, 'rb') as f:
+      if codec == None:
+        for line in f:
+          # The last line may have been cut off by a crash.
+          if not line.endswith(b'\n'):
+            continue
+          record = json.loads(line)
+          if repo == None or record['repo'] == repo:
+            yield record
+        continue
+
+      for block in read_index(shard):
+        if repo != None and block['repo'] != repo:
+          continue
+        f.seek(block['offset'])
+        for line in codec.decompress(f.read(block['size'])).splitlines():
+          yield json.loads(line)
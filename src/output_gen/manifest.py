@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = '.manifest'
+MANIFEST_VERSION = 1
+
+def content_hash(source):
+  '''Returns a hex digest identifying the contents of a file.'''
+  return hashlib.blake2b(source, digest_size = 16).hexdigest()
+
+def config_hash(func_args):
+  '''Returns a hex digest identifying the function names configuration.
+  Outputs that were produced with a different configuration are stale.
+  '''
+  return content_hash(json.dumps(func_args, sort_keys = True).encode('utf-8'))
+
+class Manifest:
+  '''Record of the files that were analysed into an output directory.
+
+  For each input file (relative to the project path) the manifest stores its
+  modification time, size and content hash. On a re-run, files whose mtime
+  and size are unchanged are skipped without being read; files whose mtime
+  changed but whose content hash did not are skipped after hashing. The
+  manifest is only used by runs with the same 'config', which main.py
+  derives from the function names configuration, the analysis code and the
+  Python version (see workers.analysis_fingerprint).
+
+  The manifest is stored as JSON in '<output directory>/.manifest':
+
+  {
+    "version": 1,
+    "config": "<hash of function_names.json>-<analysis fingerprint>",
+    "files": {
+      "Test/test.py": [<mtime_ns>, <size>, "<content hash>"]
+    }
+  }
+  '''
+
+  def __init__(self, output_path, config = None):
+    self.path = os.path.join(output_path, MANIFEST_NAME)
+    self.config = config
+    self.files = {}
+    self.seen = set()
+
+  @classmethod
+  def load(cls, output_path, config = None):
+    '''Loads the manifest of an output directory. An empty manifest is
+    returned if there is none or if it was written with a different
+    configuration, in which case every file is treated as changed.
+    '''
+    manifest = cls(output_path, config)
+    try:
+      with open(manifest.path, 'r') as f:
+        data = json.load(f)
+    except FileNotFoundError:
+      return manifest
+    except Exception as e:
+      print('Error occurred while reading manifest:', manifest.path)
+      print('Exception:', e)
+      return manifest
+
+    if data.get('version') == MANIFEST_VERSION and data.get('config') == config:
+      manifest.files = data['files']
+    return manifest
+
+  def is_unchanged(self, rel_path, stat):
+    '''Returns True if the file has the same mtime and size as recorded.'''
+    self.seen.add(rel_path)
+    entry = self.files.get(rel_path)
+    return entry != None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size
+
+  def has_hash(self, rel_path, digest):
+    '''Returns True if the recorded content hash of the file is 'digest'.'''
+    entry = self.files.get(rel_path)
+    return entry != None and entry[2] == digest
+
+  def update(self, rel_path, stat, digest):
+    '''Records the file. 'stat' is None for files that were not read from the
+    file system (e.g. git blobs), which are then only compared by hash.
+    '''
+    self.seen.add(rel_path)
+    if stat == None:
+      self.files[rel_path] = [None, None, digest]
+    else:
+      self.files[rel_path] = [stat.st_mtime_ns, stat.st_size, digest]
+
+  def removed_paths(self):
+    '''Returns the recorded paths that were not seen in this run, i.e. files
+    that were deleted or are now ignored. They are dropped from the manifest.
+    '''
+    removed = sorted(set(self.files.keys()) - self.seen)
+    for rel_path in removed:
+      del self.files[rel_path]
+    return removed
+
+  def save(self):
+    '''Writes the manifest, replacing the previous one atomically.'''
+    data = {'version': MANIFEST_VERSION, 'config': self.config, 'files': self.files}
+    temp_path = self.path + '.tmp'
+    with open(temp_path, 'w') as f:
+      json.dump(data, f)
+    os.replace(temp_path, self.path)
@@ -1,5 +1,10 @@
 import os
 
+from .serializer import StdlibSerializer
+
+# Output files are written under this extension and renamed once complete.
+TEMP_EXTENSION = '.tmp'
+
 def create_output_directory(path, project_path, output_path):
   '''Creates the file structure of the output folder such that the output files
   match the structure of the input files.
@@ -33,11 +38,21 @@ def create_output_directory(path, project_path, output_path):
 
   '''
 
+  output_dir = get_output_file(path, project_path, output_path)
+
+  # Create the directories for the output file to exist.
+  os.makedirs(os.path.dirname(output_dir), exist_ok = True)
+
+  return output_dir
+
+def get_output_file(path, project_path, output_path):
+  '''Returns the path of the output file for the input file at 'path'
+  without creating any directories. See create_output_directory.
+  '''
+
   # Create file output structure that matches project structure in
   # output folder.
-  rel_path = os.path.relpath(path, project_path)
-  if rel_path == '.':
-    rel_path = os.path.basename(project_path)
+  rel_path = get_relative_path(path, project_path)
   filename_extension = os.path.splitext(rel_path)
 
   # Given an example python file: test.py, the corresponding output file is
@@ -46,9 +61,140 @@ def create_output_directory(path, project_path, output_path):
   if filename_extension[1][1:] != '':
     output_file = output_file + '_' + filename_extension[1][1:]
   output_file = output_file + '_output.json'
-  output_dir = os.path.join(output_path, output_file)
+  return os.path.join(output_path, output_file)
 
-  # Create the directories for the output file to exist.
-  os.makedirs(os.path.dirname(output_dir), exist_ok = True)
+def get_relative_path(path, project_path):
+  '''Returns the path of the input file relative to the project, or the name
+  of the file if the project is a single file.
+  '''
+  rel_path = os.path.relpath(path, project_path)
+  if rel_path == '.':
+    rel_path = os.path.basename(project_path)
+  return rel_path
 
-  return output_dir
+def sync_file(output_file):
+  '''Flushes a file opened for writing and waits until its contents are on
+  disk.
+  '''
+  output_file.flush()
+  os.fsync(output_file.fileno())
+
+def sync_path(path):
+  '''Waits until the contents of the file, or the entries of the directory,
+  at 'path' are on disk.
+  '''
+  fd = os.open(path, os.O_RDONLY)
+  try:
+    os.fsync(fd)
+  finally:
+    os.close(fd)
+
+def remove_output_file(path, project_path, output_path):
+  '''Removes the output file of the input file at 'path' if it exists, along
+  with any output directories that become empty.
+  '''
+  output_file = get_output_file(path, project_path, output_path)
+  if not os.path.exists(output_file):
+    return
+  os.remove(output_file)
+
+  output_dir = os.path.dirname(output_file)
+  while output_dir != output_path and len(os.listdir(output_dir)) == 0:
+    os.rmdir(output_dir)
+    output_dir = os.path.dirname(output_dir)
+
+class FileSink:
+  '''Output sink that writes the result of each input file to its own JSON
+  file under the output directory (see create_output_directory), indented
+  unless the serializer is compact (see serializer.get_serializer).
+
+  Sinks are used by the write stage of the pipeline, which runs on its own
+  thread: encode() serializes the result of every input file that produced
+  output, without writing anything, and write_encoded() writes it, so that
+  a result the serializer rejects can be told apart from a failed write.
+  write() does both. remove() is called with the path of every file whose
+  output is gone in incremental mode. close() waits until the output is on
+  disk.
+
+  Each output file is written to a temporary file that is then renamed, so
+  an output file is either complete or missing, even if the run is killed.
+  With a journal (see journal.RunJournal), each file is recorded with the
+  size of its output once it is renamed. Each output directory is created
+  once, when its first file is written.
+  '''
+
+  def __init__(self, project_path, output_path, serializer = None, journal = None):
+    self.project_path = project_path
+    self.output_path = output_path
+    self.serializer = serializer if serializer != None else StdlibSerializer(indent = 2)
+    self.journal = journal
+    self.directories = set()
+    self.unsynced = set()
+
+  def encode(self, path, result):
+    return self.serializer.dumps(result)
+
+  def write(self, path, result):
+    self.write_encoded(path, self.encode(path, result))
+
+  def write_encoded(self, path, data):
+    output_file_path = get_output_file(path, self.project_path, self.output_path)
+    directory = os.path.dirname(output_file_path)
+    if directory not in self.directories:
+      os.makedirs(directory, exist_ok = True)
+      self.directories.add(directory)
+    temp_path = output_file_path + TEMP_EXTENSION
+    try:
+      with open(temp_path, 'wb') as output_file:
+        output_file.write(data)
+        size = output_file.tell()
+      os.replace(temp_path, output_file_path)
+    except BaseException:
+      if os.path.exists(temp_path):
+        os.remove(temp_path)
+      raise
+    self.unsynced.add(output_file_path)
+    if self.journal != None:
+      self.journal.record(path, size)
+
+  def remove(self, path):
+    remove_output_file(path, self.project_path, self.output_path)
+    self.unsynced.discard(get_output_file(path, self.project_path, self.output_path))
+    # Directories that became empty are removed.
+    self.directories.clear()
+
+  def recover(self, start, entries):
+    '''Returns the journal entries of an interrupted run whose output file
+    has the recorded size. The other files are analysed again and their
+    output files overwritten. Temporary files left by a run that was killed
+    while writing are removed.
+    '''
+    for directory, _, names in os.walk(self.output_path):
+      for name in names:
+        if name.endswith('_output.json' + TEMP_EXTENSION):
+          os.remove(os.path.join(directory, name))
+
+    recovered = []
+    for rel_path, size in entries:
+      if size != None:
+        output_file_path = get_output_file(os.path.join(self.project_path, rel_path), self.project_path, self.output_path)
+        if not os.path.exists(output_file_path) or os.path.getsize(output_file_path) != size:
+          continue
+      recovered.append((rel_path, size))
+    return recovered
+
+  def close(self):
+    # The output files are synced at once instead of after each write, then
+    # the directories their names are in, including the directories that
+    # were created for them. Directories cannot be opened on Windows.
+    directories = set()
+    for output_file_path in self.unsynced:
+      sync_path(output_file_path)
+      directory = os.path.dirname(output_file_path)
+      while directory not in directories and directory != os.path.dirname(self.output_path):
+        directories.add(directory)
+        directory = os.path.dirname(directory)
+    if os.name != 'nt':
+      for directory in directories:
+        sync_path(directory)
+    self.unsynced = set()
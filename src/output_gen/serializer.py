@@ -0,0 +1,102 @@
+import json
+import math
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+class StdlibSerializer:
+  '''Serializes output records to JSON bytes with the json module.
+
+  Compact output is encoded by the C encoder of the json module in one
+  call. JSONEncoder.iterencode would stream the output in chunks instead of
+  building the string first, but it only runs the pure Python encoder and
+  the records of a file are small, which makes it several times slower (see
+  benchmarks/bench_serializer.py).
+
+  Example:
+
+  StdlibSerializer().dumps({'type': 'constant', 'value': 3}) == b'{"type":"constant","value":3}'
+  '''
+  name = 'stdlib'
+
+  def __init__(self, indent = None):
+    separators = (',', ':') if indent == None else (',', ': ')
+    self.encoder = json.JSONEncoder(indent = indent, separators = separators)
+
+  def dumps(self, value):
+    return self.encoder.encode(value).encode()
+
+  def dump(self, value, output_file):
+    '''Writes the value to a file opened in binary mode.'''
+    output_file.write(self.dumps(value))
+
+class ORJSONSerializer(StdlibSerializer):
+  '''Serializes output records with orjson, which is several times faster
+  than the json module. Only an indent of 2 is supported.
+
+  The output parses to the same value as that of StdlibSerializer, but is
+  not byte for byte the same: strings are written as UTF-8 instead of
+  escaped and some floats are formatted differently (e.g. 1e20 instead of
+  1e+20). Values that orjson rejects (integers beyond 64 bits, strings with
+  lone surrogates) are serialized by the json module instead, and so are
+  values with non-finite floats, which orjson would write as null instead of
+  the Infinity and NaN of the json module.
+  '''
+  name = 'orjson'
+
+  def __init__(self, indent = None):
+    if indent not in (None, 2):
+      raise ValueError('orjson only supports an indent of 2')
+    super().__init__(indent)
+    self.option = orjson.OPT_INDENT_2 if indent == 2 else 0
+
+  def dumps(self, value):
+    try:
+      data = orjson.dumps(value, option = self.option)
+    except orjson.JSONEncodeError:
+      return super().dumps(value)
+    # Most values have no null at all, so they are not searched for floats.
+    if b'null' in data and has_non_finite_float(value):
+      return super().dumps(value)
+    return data
+
+def has_non_finite_float(value):
+  '''Returns True if the value holds an infinite or NaN float.'''
+  stack = [value]
+  while len(stack) > 0:
+    value = stack.pop()
+    if isinstance(value, float):
+      if not math.isfinite(value):
+        return True
+    elif isinstance(value, dict):
+      stack.extend(value.values())
+    elif isinstance(value, (list, tuple)):
+      stack.extend(value)
+  return False
+
+# Serializers by backend name. 'auto' picks the fastest one that is
+# installed, so the exact bytes of its output depend on the installed
+# packages.
+serializers = {
+  'stdlib': StdlibSerializer,
+  'orjson': ORJSONSerializer
+}
+
+def available_backends():
+  return [name for name in serializers if name != 'orjson' or orjson != None]
+
+def get_serializer(backend = 'stdlib', indent = None):
+  '''Returns a serializer of the backend, or None if the backend is not
+  installed.
+
+  Example:
+
+  get_serializer('auto', indent = 2).dump(result, output_file)
+  '''
+  if backend == 'auto':
+    backend = 'orjson' if orjson != None else 'stdlib'
+  if backend not in available_backends():
+    return None
+  return serializers[backend](indent)
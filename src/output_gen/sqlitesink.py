@@ -0,0 +1,262 @@
+import json
+import os
+import sqlite3
+
+from .output import get_relative_path
+from .serializer import StdlibSerializer
+
+DATABASE_NAME = 'calls.sqlite'
+
+# Files whose records are inserted in one transaction.
+DEFAULT_BATCH_SIZE = 500
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS repos (
+  id INTEGER PRIMARY KEY,
+  name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS files (
+  id INTEGER PRIMARY KEY,
+  repo_id INTEGER NOT NULL REFERENCES repos (id),
+  path TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS calls (
+  id INTEGER PRIMARY KEY,
+  file_id INTEGER NOT NULL REFERENCES files (id),
+  function TEXT NOT NULL,
+  args TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS keywords (
+  call_id INTEGER NOT NULL REFERENCES calls (id),
+  keyword TEXT NOT NULL,
+  value,
+  json INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_repo ON files (repo_id);
+CREATE INDEX IF NOT EXISTS calls_file ON calls (file_id);
+CREATE INDEX IF NOT EXISTS calls_function ON calls (function);
+CREATE INDEX IF NOT EXISTS keywords_call ON keywords (call_id);
+CREATE INDEX IF NOT EXISTS keywords_keyword ON keywords (keyword, value);
+'''
+
+# Range of the integers SQLite stores.
+MIN_INTEGER = -(1 << 63)
+MAX_INTEGER = (1 << 63) - 1
+
+class SQLiteSink:
+  '''Output sink that inserts the reformatted calls of each input file into
+  a SQLite database, so that the calls of a corpus can be queried without
+  loading every output file (see find_repos).
+
+  The database has a table of repositories, of files, of calls with their
+  function name and their arguments as JSON, and of the keyword arguments
+  of the calls. Keyword values that are strings, numbers or None are stored
+  as SQL values, so that they can be compared in queries, and other values
+  (booleans, lists, ...) as JSON text with 'json' set.
+
+  Layout:
+  └── output
+      ├── calls.sqlite
+      ├── calls.sqlite-wal
+      └── calls.sqlite-shm
+
+  The records of 'batch_size' files are inserted in one transaction, in
+  write-ahead logging mode. Runs over several projects can share the
+  database. The first record a run writes replaces the records a previous
+  run stored for its repository. Only one sink may write to a database at
+  a time.
+
+  With a journal (see journal.RunJournal), the files of a batch are
+  recorded with their row id once the transaction is committed. A run that
+  is resumed with recover() keeps the records of the files in the journal
+  instead of replacing the records of its repository.
+
+  Example:
+
+  sink = SQLiteSink(project_path, 'output', 'pytorch/examples')
+  '''
+
+  def __init__(self, project_path, output_path, repo, batch_size = DEFAULT_BATCH_SIZE, serializer = None, journal = None):
+    self.project_path = project_path
+    self.output_path = output_path
+    self.repo = repo
+    self.batch_size = batch_size
+    self.serializer = serializer if serializer != None else StdlibSerializer()
+    self.journal = journal
+    self.connection = None
+    self.files = []
+    self.calls = []
+    self.keywords = []
+    self.paths = []
+
+  def open_database(self, replace = True):
+    os.makedirs(self.output_path, exist_ok = True)
+    self.connection = connect(os.path.join(self.output_path, DATABASE_NAME))
+    self.connection.execute('PRAGMA synchronous = NORMAL')
+    with self.connection:
+      self.connection.execute('INSERT OR IGNORE INTO repos (name) VALUES (?)', (self.repo,))
+      self.repo_id = self.connection.execute('SELECT id FROM repos WHERE name = ?', (self.repo,)).fetchone()[0]
+      if replace:
+        delete_files(self.connection, 'SELECT id FROM files WHERE repo_id = ?', (self.repo_id,))
+    # Row ids are assigned here so that the rows of a batch are inserted with
+    # one executemany per table.
+    self.file_id = self.connection.execute('SELECT coalesce(max(id), 0) FROM files').fetchone()[0]
+    self.call_id = self.connection.execute('SELECT coalesce(max(id), 0) FROM calls').fetchone()[0]
+
+  def encode(self, path, result):
+    '''Returns the function, the arguments as JSON and the keyword rows of
+    each call of the result (see output.FileSink).
+    '''
+    dumps = self.serializer.dumps
+    calls = []
+    for call in result:
+      keywords = []
+      for keyword in call['keywords']:
+        value = keyword['value']
+        if is_sql_value(value):
+          keywords.append((keyword['keyword'], value, 0))
+        else:
+          keywords.append((keyword['keyword'], dumps(value).decode(), 1))
+      calls.append((call['function'], dumps(call['args']).decode(), keywords))
+    return calls
+
+  def write(self, path, result):
+    self.write_encoded(path, self.encode(path, result))
+
+  def write_encoded(self, path, calls):
+    if self.connection == None:
+      self.open_database()
+    self.file_id += 1
+    self.files.append((self.file_id, self.repo_id, get_relative_path(path, self.project_path)))
+    self.paths.append(path)
+    for function, args, keywords in calls:
+      self.call_id += 1
+      self.calls.append((self.call_id, self.file_id, function, args))
+      self.keywords.extend((self.call_id, keyword, value, is_json) for keyword, value, is_json in keywords)
+    if len(self.files) >= self.batch_size:
+      self.flush()
+
+  def flush(self):
+    # A batch whose transaction fails is rolled back and dropped, so that it
+    # does not fail the later batches too. Its files are not in the journal.
+    try:
+      with self.connection:
+        self.connection.executemany('INSERT INTO files (id, repo_id, path) VALUES (?, ?, ?)', self.files)
+        self.connection.executemany('INSERT INTO calls (id, file_id, function, args) VALUES (?, ?, ?, ?)', self.calls)
+        self.connection.executemany('INSERT INTO keywords (call_id, keyword, value, json) VALUES (?, ?, ?, ?)', self.keywords)
+      if self.journal != None:
+        self.journal.record_all([(path, row[0]) for path, row in zip(self.paths, self.files)])
+    finally:
+      self.files = []
+      self.calls = []
+      self.keywords = []
+      self.paths = []
+
+  def recover(self, start, entries):
+    '''Returns the journal entries of an interrupted run whose records are in
+    the database. The records of the repository that are not in the journal
+    are deleted, so that their files are not stored twice when they are
+    analysed again.
+    '''
+    self.open_database(replace = False)
+    stored = dict(self.connection.execute('SELECT id, path FROM files WHERE repo_id = ?', (self.repo_id,)))
+    recovered = [(rel_path, file_id) for rel_path, file_id in entries if file_id == None or stored.get(file_id) == rel_path]
+    for _, file_id in recovered:
+      stored.pop(file_id, None)
+    with self.connection:
+      for file_id in stored:
+        delete_files(self.connection, 'SELECT ?', (file_id,))
+    return recovered
+
+  def close(self):
+    if self.connection != None:
+      try:
+        self.flush()
+      finally:
+        self.connection.close()
+        self.connection = None
+
+def connect(database_path):
+  '''Opens the database in write-ahead logging mode, creating the tables and
+  indexes if they do not exist.
+  '''
+  # The write stage of the pipeline runs on its own thread and the sink is
+  # closed by the main thread once the pipeline is done.
+  connection = sqlite3.connect(database_path, check_same_thread = False)
+  connection.execute('PRAGMA journal_mode = WAL')
+  connection.executescript(SCHEMA)
+  return connection
+
+def is_sql_value(value):
+  # Booleans are ints in Python but have no SQL type of their own.
+  value_type = type(value)
+  if value_type is int:
+    return MIN_INTEGER <= value <= MAX_INTEGER
+  elif value_type is float:
+    # SQLite stores NaN as NULL.
+    return value == value
+  elif value_type is str:
+    # Strings with lone surrogates cannot be encoded.
+    try:
+      value.encode()
+    except UnicodeEncodeError:
+      return False
+    return True
+  return value == None
+
+def delete_files(connection, file_ids, params):
+  '''Deletes the files whose ids the query 'file_ids' selects, with their
+  calls and keywords.
+  '''
+  call_ids = 'SELECT id FROM calls WHERE file_id IN (%s)' % file_ids
+  connection.execute('DELETE FROM keywords WHERE call_id IN (%s)' % call_ids, params)
+  connection.execute('DELETE FROM calls WHERE file_id IN (%s)' % file_ids, params)
+  connection.execute('DELETE FROM files WHERE id IN (%s)' % file_ids, params)
+
+def find_repos(connection, function, keyword = None, value = None):
+  '''Returns the names of the repositories that call the function, with the
+  keyword argument if given, set to the value if given.
+
+  Example:
+
+  connection = connect('output/calls.sqlite')
+  find_repos(connection, 'torch.nn.Conv2d', 'stride', 2) -> ['pytorch/examples', ...]
+  '''
+  query = 'SELECT DISTINCT repos.name FROM calls JOIN files ON files.id = calls.file_id JOIN repos ON repos.id = files.repo_id'
+  params = [function]
+  conditions = ['calls.function = ?']
+  if keyword != None:
+    query += ' JOIN keywords ON keywords.call_id = calls.id'
+    conditions.append('keywords.keyword = ?')
+    params.append(keyword)
+    if value != None:
+      if is_sql_value(value):
+        conditions.append('keywords.value = ? AND NOT keywords.json')
+      else:
+        conditions.append('keywords.value = ? AND keywords.json')
+        value = json.dumps(value, separators = (',', ':'))
+      params.append(value)
+  query += ' WHERE ' + ' AND '.join(conditions) + ' ORDER BY repos.name'
+  return [row[0] for row in connection.execute(query, params)]
+
+def read_records(database_path, repo = None):
+  '''Yields the records of the database in the format of the JSON Lines
+  output (see jsonlsink.JSONLSink), or only the records of one repository.
+  '''
+  connection = sqlite3.connect(database_path)
+  try:
+    query = 'SELECT files.id, repos.name, files.path FROM files JOIN repos ON repos.id = files.repo_id'
+    params = ()
+    if repo != None:
+      query += ' WHERE repos.name = ?'
+      params = (repo,)
+    for file_id, repo_name, path in connection.execute(query + ' ORDER BY files.id', params).fetchall():
+      calls = []
+      for call_id, function, args in connection.execute('SELECT id, function, args FROM calls WHERE file_id = ? ORDER BY id', (file_id,)).fetchall():
+        keywords = []
+        for keyword, value, is_json in connection.execute('SELECT keyword, value, json FROM keywords WHERE call_id = ? ORDER BY rowid', (call_id,)):
+          keywords.append({'keyword': keyword, 'value': json.loads(value) if is_json else value})
+        calls.append({'type': 'call', 'function': function, 'args': json.loads(args), 'keywords': keywords})
+      yield {'repo': repo_name, 'path': path, 'calls': calls}
+  finally:
+    connection.close()
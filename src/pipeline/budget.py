@@ -0,0 +1,63 @@
+import ast
+import json
+import threading
+
+# Upper bound on the number of AST nodes per byte of source (e.g. '-' adds a
+# UnaryOp and a USub node). Files small enough to stay under the node budget
+# at this density are not counted.
+MAX_NODES_PER_BYTE = 4
+
+class FileSkipped(Exception):
+  '''Raised when a file is not analysed, e.g. because it exceeds one of the
+  per-file budgets. 'reason' is a short keyword used in the skip report.
+  '''
+
+  def __init__(self, reason, detail = ''):
+    super().__init__(reason + (': ' + detail if detail else ''))
+    self.reason = reason
+    self.detail = detail
+
+def check_node_budget(tree, source_size, max_nodes):
+  '''Raises FileSkipped if the AST has more than 'max_nodes' nodes. The walk
+  stops as soon as the budget is exceeded.
+  '''
+  if max_nodes == None or source_size * MAX_NODES_PER_BYTE + 16 <= max_nodes:
+    return
+  count = 0
+  for _ in ast.walk(tree):
+    count += 1
+    if count > max_nodes:
+      raise FileSkipped('nodes', 'more than %d AST nodes' % max_nodes)
+
+class SkipReport:
+  '''Collects the files that were skipped during a run along with the reason.
+
+  If a path is given, every skipped file is also appended to it as a JSON
+  line, e.g.
+
+  {"path": "/project/weights.py", "reason": "time", "detail": "over 30 s"}
+  '''
+
+  def __init__(self, path = None):
+    self.path = path
+    self.counts = {}
+    self.lock = threading.Lock()
+    self.report_file = open(path, 'a') if path != None else None
+
+  def record(self, path, reason, detail = ''):
+    with self.lock:
+      self.counts[reason] = self.counts.get(reason, 0) + 1
+      if self.report_file != None:
+        self.report_file.write(json.dumps({'path': path, 'reason': reason, 'detail': detail}) + '\n')
+        self.report_file.flush()
+
+  def close(self):
+    if self.report_file != None:
+      self.report_file.close()
+      self.report_file = None
+
+  def summary(self):
+    if len(self.counts) == 0:
+      return 'Skipped: none'
+    counts = ', '.join('%d %s' % (count, reason) for reason, count in sorted(self.counts.items()))
+    return 'Skipped: ' + counts + (' (see %s)' % self.path if self.path != None else '')
@@ -0,0 +1,148 @@
+import queue
+import threading
+
+END = object()
+
+class Pipeline:
+  '''Runs a chain of stages, each on its own thread, connected by bounded
+  queues.
+
+  Every stage is a function that takes an item and returns the item for the
+  next stage, or None to drop it. Since the queues between stages hold at
+  most 'queue_size' items, a slow stage blocks the stages before it
+  (backpressure) and the number of items in flight, and therefore memory,
+  does not depend on how many items the source produces.
+
+  Example:
+
+  pipeline = Pipeline(queue_size = 8)
+  pipeline.add_stage('read', read_file)
+  pipeline.add_stage('parse', parse_file)
+  for item in pipeline.run(paths):
+    ...
+
+  drain() stops reading the source and lets the items in flight through the
+  stages, stop() drops them. Either way, each stage finishes the item it is
+  working on. Both can be called from a signal handler, e.g. on Ctrl-C.
+
+  If a stage raises an exception, the pipeline is stopped and the exception
+  is re-raised by run(). With an 'on_error' function, on_error(name, item,
+  exception) is called instead and its return value is passed on in place of
+  the result of the stage, so that a single bad item does not stop the run.
+  An exception that on_error raises stops the pipeline.
+  Stages added with handle_errors = False always stop the pipeline, e.g.
+  stages that write output, whose failure would otherwise go unnoticed.
+
+  A stage added with an 'on_idle' function calls it about every 0.1 s while
+  no item is waiting for it, e.g. to write output it buffered.
+  '''
+
+  def __init__(self, queue_size = 16, on_error = None):
+    self.queue_size = queue_size
+    self.on_error = on_error
+    self.stages = []
+    self.stopped = threading.Event()
+    self.draining = threading.Event()
+    self.error = None
+
+  def add_stage(self, name, func, queue_size = None, handle_errors = True, on_idle = None):
+    '''Adds a stage at the end of the pipeline. 'queue_size' overrides the
+    capacity of the queue the stage writes to. The exceptions of a stage with
+    'handle_errors' False are not passed to on_error. 'on_idle' is called
+    while the stage waits for an item.
+    '''
+    self.stages.append((name, func, queue_size if queue_size != None else self.queue_size, handle_errors, on_idle))
+    return self
+
+  def put(self, output_queue, item):
+    '''Blocks until the item is queued. Returns False if the pipeline was
+    stopped in the meantime.
+    '''
+    while not self.stopped.is_set():
+      try:
+        output_queue.put(item, timeout = 0.1)
+        return True
+      except queue.Full:
+        pass
+    return False
+
+  def get(self, input_queue, on_idle = None):
+    '''Blocks until an item is available, calling on_idle() while there is
+    none. Returns END if the pipeline was stopped in the meantime.
+    '''
+    while not self.stopped.is_set():
+      try:
+        return input_queue.get(timeout = 0.1)
+      except queue.Empty:
+        if on_idle != None:
+          on_idle()
+    return END
+
+  def drain(self):
+    '''Stops taking items from the source. run() returns once the items in
+    flight are through the pipeline.
+    '''
+    self.draining.set()
+
+  def stop(self):
+    '''Stops the pipeline without waiting for the items in flight.'''
+    self.stopped.set()
+
+  def fail(self, name, exception):
+    if self.error == None:
+      self.error = (name, exception)
+    self.stopped.set()
+
+  def feed(self, source, output_queue):
+    try:
+      for item in source:
+        if self.draining.is_set() or not self.put(output_queue, item):
+          break
+      self.put(output_queue, END)
+    except BaseException as e:
+      self.fail('source', e)
+    finally:
+      if hasattr(source, 'close'):
+        source.close()
+
+  def work(self, name, func, input_queue, output_queue, handle_errors, on_idle):
+    try:
+      while True:
+        item = self.get(input_queue, on_idle)
+        if item is END:
+          self.put(output_queue, END)
+          return
+        try:
+          result = func(item)
+        except Exception as e:
+          if self.on_error == None or not handle_errors:
+            raise
+          result = self.on_error(name, item, e)
+        if result != None and not self.put(output_queue, result):
+          return
+    except BaseException as e:
+      self.fail(name, e)
+
+  def run(self, source):
+    '''Yields the items that come out of the last stage.'''
+    queues = [queue.Queue(self.queue_size)] + [queue.Queue(stage[2]) for stage in self.stages]
+    threads = [threading.Thread(target = self.feed, args = (source, queues[0]), daemon = True)]
+    for i, (name, func, _, handle_errors, on_idle) in enumerate(self.stages):
+      threads.append(threading.Thread(target = self.work, args = (name, func, queues[i], queues[i + 1], handle_errors, on_idle), name = name, daemon = True))
+
+    for thread in threads:
+      thread.start()
+    try:
+      while True:
+        item = self.get(queues[-1])
+        if item is END:
+          break
+        yield item
+    finally:
+      self.stopped.set()
+      for thread in threads:
+        thread.join()
+
+    if self.error != None:
+      name, exception = self.error
+      raise RuntimeError('pipeline stage \'%s\' failed: %s' % (name, exception)) from exception
@@ -0,0 +1,272 @@
+from concurrent.futures.process import BrokenProcessPool
+import os
+
+from ..ast.astconverter import ASTConverter
+from ..ast.astfilter import ASTFilter
+from ..ast.astfusedfilter import FusedASTFilter
+from ..ast.astreformatter import ASTReformatter
+from ..output_gen.dedupstore import MISSING
+from ..output_gen.manifest import content_hash
+from ..output_gen.output import get_relative_path
+from ..readers.parser import check_source, parse_source, read_source
+from .budget import FileSkipped, check_node_budget
+
+class FileTask:
+  '''A single source file as it moves through the pipeline stages. Fields are
+  released once the next stage no longer needs them.
+  '''
+
+  def __init__(self, path, source = None):
+    self.path = path
+    self.source = source
+    self.digest = None
+    self.tree = None
+    self.converted = None
+    self.filtered = None
+    self.result = MISSING
+    self.reused = False
+    self.skipped = False
+    self.future = None
+
+  def skip(self):
+    '''Drops the intermediate results of a file that is not analysed.'''
+    self.source = None
+    self.tree = None
+    self.converted = None
+    self.filtered = None
+    self.future = None
+    self.result = None
+    self.skipped = True
+
+def skip_failed_task(skip_report):
+  '''Returns an on_error function for the pipeline that records files whose
+  analysis failed or exceeded a budget in the skip report and lets the run
+  continue without them.
+
+  A process pool that is broken, e.g. because a worker was killed by the
+  OOM killer, fails every file after it, so it fails the run instead and
+  the files that were not written are left to a resumed run.
+  '''
+  def on_error(name, task, exception):
+    if isinstance(exception, BrokenProcessPool):
+      raise exception
+    if isinstance(exception, FileSkipped):
+      reason, detail = exception.reason, exception.detail
+    else:
+      reason, detail = 'error', '%s stage: %r' % (name, exception)
+    print('WARNING: skipping file', task.path, '-', reason, detail)
+    skip_report.record(task.path, reason, detail)
+    task.skip()
+    return task
+  return on_error
+
+class ReadStage:
+  '''Reads the source of the file, unless it is already known (e.g. from a
+  git blob). Oversized and binary files are skipped without being decoded or
+  parsed and are recorded in the skip report. In incremental mode, files that
+  are unchanged since the last run are dropped, and so are the 'completed'
+  files of a resumed run (see journal.RunJournal). With a dedup store, the
+  stored result is looked up by content hash.
+  '''
+
+  def __init__(self, project_path, manifest = None, dedup_store = None, compute_digest = False, max_bytes = None, skip_report = None, completed = None):
+    self.project_path = project_path
+    self.completed = completed
+    self.manifest = manifest
+    self.dedup_store = dedup_store
+    self.compute_digest = compute_digest
+    self.max_bytes = max_bytes
+    self.skip_report = skip_report
+    self.unchanged = 0
+    self.resumed = 0
+
+  def __call__(self, task):
+    if self.completed and get_relative_path(task.path, self.project_path) in self.completed:
+      self.resumed += 1
+      return None
+
+    stat = None
+    if self.manifest != None:
+      rel_path = os.path.relpath(task.path, self.project_path)
+      if task.source == None:
+        stat = os.stat(task.path)
+        if self.manifest.is_unchanged(rel_path, stat):
+          self.unchanged += 1
+          return None
+
+    if task.source == None:
+      task.source, reason = read_source(task.path, self.max_bytes)
+    else:
+      reason = check_source(task.source, self.max_bytes)
+
+    if reason != None:
+      if self.skip_report != None:
+        self.skip_report.record(task.path, reason)
+      task.skip()
+      if self.manifest != None:
+        self.manifest.update(rel_path, stat, None)
+      return task
+
+    if self.manifest != None:
+      task.digest = content_hash(task.source)
+      if self.manifest.has_hash(rel_path, task.digest):
+        self.manifest.update(rel_path, stat, task.digest)
+        self.unchanged += 1
+        return None
+      self.manifest.update(rel_path, stat, task.digest)
+
+    if task.digest == None and (self.compute_digest or self.dedup_store != None):
+      task.digest = content_hash(task.source)
+    if self.dedup_store != None:
+      task.result = self.dedup_store.get(task.digest, len(task.source))
+      task.reused = task.result is not MISSING
+    return task
+
+class ParseStage:
+  '''Parses the source into an AST. Files rejected by the prefilter or that
+  cannot be parsed have no result. With a converter cache, files whose
+  conversion is cached are not parsed. Files with more than 'max_nodes' AST
+  nodes raise FileSkipped. The source of parsed files is kept for the fused
+  filter stage.
+  '''
+
+  def __init__(self, prefilter = None, converter_cache = None, max_nodes = None):
+    self.prefilter = prefilter
+    self.converter_cache = converter_cache
+    self.max_nodes = max_nodes
+
+  def __call__(self, task):
+    if task.result is MISSING:
+      if self.prefilter == None or self.prefilter.accepts(task.source):
+        if self.converter_cache != None:
+          task.converted = self.converter_cache.get(task.digest)
+        if task.converted == None:
+          task.tree = parse_source(task.path, task.source)
+          if task.tree != None:
+            check_node_budget(task.tree, len(task.source), self.max_nodes)
+      if task.tree == None and task.converted == None:
+        task.result = None
+    if task.tree == None:
+      task.source = None
+    return task
+
+class ConvertStage:
+  '''Converts the AST and stores the conversion in the converter cache. The
+  conversion is cached before the filter modifies it. Since the whole
+  conversion is cached, it is converted without the source, which would only
+  defer unparsing arguments.
+  '''
+
+  def __init__(self, converter_cache = None):
+    self.converter_cache = converter_cache
+
+  def __call__(self, task):
+    if task.result is MISSING and task.converted == None:
+      task.converted = ASTConverter().run(task.tree)
+      if self.converter_cache != None:
+        self.converter_cache.put(task.digest, task.converted)
+    task.tree = None
+    task.source = None
+    return task
+
+class FilterStage:
+  def __init__(self, matcher):
+    self.matcher = matcher
+
+  def __call__(self, task):
+    if task.result is MISSING:
+      task.filtered = ASTFilter(self.matcher).run(task.converted)
+      if task.filtered == None:
+        task.result = None
+    task.converted = None
+    return task
+
+class FusedFilterStage:
+  '''Converts and filters the AST in a single pass, without converting the
+  parts that the filter would discard. Used instead of the convert and filter
+  stages when there is no converter cache to store the full conversion in.
+  Arguments are converted to source code lazily, from the source of the file.
+  '''
+
+  def __init__(self, matcher):
+    self.matcher = matcher
+
+  def __call__(self, task):
+    if task.result is MISSING:
+      task.filtered = FusedASTFilter(self.matcher).run(task.tree, task.source)
+      if task.filtered == None:
+        task.result = None
+    task.tree = None
+    task.source = None
+    return task
+
+class StoreStage:
+  '''Stores results that were not reused in the dedup store. Skipped files
+  are not stored since a budget may not be exceeded on the next run.
+  '''
+
+  def __init__(self, dedup_store):
+    self.dedup_store = dedup_store
+
+  def __call__(self, task):
+    if not task.reused and not task.skipped and task.digest != None:
+      self.dedup_store.put(task.digest, task.result)
+    return task
+
+class ReformatStage:
+  '''Reformats the filtered AST into the output list.'''
+
+  def __init__(self, matcher):
+    self.matcher = matcher
+
+  def __call__(self, task):
+    if task.result is MISSING:
+      task.result = ASTReformatter(self.matcher).run(task.filtered)
+    task.filtered = None
+    return task
+
+class WriteStage:
+  '''Writes the result of each file to the output sink (see
+  output.FileSink and jsonlsink.JSONLSink) as soon as it is available. In
+  incremental mode the outputs of files that no longer produce output are
+  removed. With a journal, files without output are recorded as done here
+  and the sink records the others once their output is written.
+
+  Errors of the sink fail the run, except for results that cannot be
+  serialized (e.g. a keyword value of '...'), which the serializer rejects
+  with TypeError or ValueError when the sink encodes them, before anything
+  is written. With an 'on_error' function (see skip_failed_task), these
+  files are skipped and recorded as files without output instead.
+  '''
+
+  def __init__(self, sink, incremental = False, journal = None, on_error = None):
+    self.sink = sink
+    self.incremental = incremental
+    self.journal = journal
+    self.on_error = on_error
+    self.written = 0
+
+  def __call__(self, task):
+    if task.result:
+      try:
+        encoded = self.sink.encode(task.path, task.result)
+      except (TypeError, ValueError) as e:
+        if self.on_error == None:
+          raise
+        task = self.on_error('write', task, e)
+      else:
+        self.sink.write_encoded(task.path, encoded)
+        self.written += 1
+        return task
+    if self.incremental:
+      self.sink.remove(task.path)
+    elif self.journal != None:
+      self.journal.record(task.path)
+    return task
+
+  def idle(self):
+    '''Lets the sink write the output it buffered for too long while no file
+    is waiting to be written (see Pipeline.add_stage).
+    '''
+    if hasattr(self.sink, 'poll'):
+      self.sink.poll()
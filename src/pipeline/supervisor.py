@@ -0,0 +1,180 @@
+from concurrent.futures import Future
+import multiprocessing
+import os
+import queue
+import threading
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+from .budget import FileSkipped
+
+def get_context():
+  '''Returns a multiprocessing context that is safe to start processes from
+  the pipeline threads. Forking a multi-threaded process can copy locks that
+  are held by other threads.
+  '''
+  methods = multiprocessing.get_all_start_methods()
+  return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+def current_address_space():
+  try:
+    with open('/proc/self/statm') as f:
+      return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+  except (OSError, ValueError, AttributeError):
+    return 0
+
+def supervised_worker_main(conn, initializer, initargs, memory_bytes):
+  '''Entry point of a supervised worker process. Sends 'ready' over 'conn'
+  once it is initialized, then runs the functions sent over 'conn' one at a
+  time. The address space of the process is limited to its size after
+  initialization plus 'memory_bytes', so a file that needs more memory
+  raises MemoryError instead of exhausting the machine.
+  '''
+  if initializer != None:
+    initializer(*initargs)
+  if memory_bytes != None and resource != None:
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = current_address_space() + memory_bytes
+    if hard != resource.RLIM_INFINITY:
+      limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+  conn.send('ready')
+
+  while True:
+    try:
+      message = conn.recv()
+    except EOFError:
+      return
+    if message == None:
+      return
+
+    fn, args = message
+    try:
+      reply = ('ok', fn(*args))
+    except MemoryError:
+      reply = ('skip', ('memory', 'over %d MB' % (memory_bytes >> 20)))
+    except FileSkipped as e:
+      reply = ('skip', (e.reason, e.detail))
+    except Exception as e:
+      reply = ('skip', ('error', repr(e)))
+    conn.send(reply)
+
+class SupervisedWorker:
+  '''A worker process that can be killed and replaced if a task exceeds its
+  time budget or the process dies.
+  '''
+
+  def __init__(self, context, initializer, initargs, memory_bytes):
+    self.context = context
+    self.initializer = initializer
+    self.initargs = initargs
+    self.memory_bytes = memory_bytes
+    self.process = None
+    self.conn = None
+
+  def start(self):
+    '''Starts the worker process and waits until it is initialized. Raises
+    EOFError if it dies first.
+    '''
+    self.conn, child_conn = self.context.Pipe()
+    self.process = self.context.Process(target = supervised_worker_main, args = (child_conn, self.initializer, self.initargs, self.memory_bytes), daemon = True)
+    self.process.start()
+    child_conn.close()
+    self.conn.recv()
+
+  def kill(self):
+    if self.process != None:
+      self.process.kill()
+      self.process.join()
+      self.conn.close()
+      self.process = None
+
+  def call(self, fn, args, timeout):
+    '''Runs fn(*args) in the worker process. Raises FileSkipped if it takes
+    longer than 'timeout' seconds, runs out of memory or the process dies.
+    Only the task is timed: a worker that was not started yet, or was killed
+    by the previous task, is started and initialized first.
+    '''
+    try:
+      if self.process == None:
+        self.start()
+      self.conn.send((fn, args))
+      if not self.conn.poll(timeout):
+        self.kill()
+        raise FileSkipped('time', 'over %g s' % timeout)
+      status, value = self.conn.recv()
+    except (EOFError, OSError):
+      exitcode = self.process.exitcode if self.process != None else None
+      self.kill()
+      raise FileSkipped('crashed', 'worker exited with code %s' % exitcode)
+
+    if status == 'skip':
+      raise FileSkipped(*value)
+    return value
+
+  def stop(self):
+    if self.process != None:
+      try:
+        self.conn.send(None)
+      except OSError:
+        pass
+      self.process.join(1)
+      self.kill()
+
+class SupervisedExecutor:
+  '''Executor with the submit/shutdown interface of ProcessPoolExecutor whose
+  tasks can be interrupted.
+
+  Each of the 'workers' threads owns one SupervisedWorker process and runs
+  one task at a time in it. A task that exceeds 'timeout' seconds is
+  interrupted by killing its process, which is then replaced; a task that
+  exceeds 'memory_bytes' fails with MemoryError in the worker. In both cases
+  the future raises FileSkipped and the other tasks are not affected.
+  '''
+
+  def __init__(self, workers, initializer = None, initargs = (), timeout = None, memory_bytes = None):
+    self.timeout = timeout
+    self.tasks = queue.Queue()
+    context = get_context()
+    self.workers = [SupervisedWorker(context, initializer, initargs, memory_bytes) for _ in range(workers)]
+    self.threads = [threading.Thread(target = self.run_worker, args = (worker,), daemon = True) for worker in self.workers]
+    for thread in self.threads:
+      thread.start()
+
+  def run_worker(self, worker):
+    try:
+      while True:
+        item = self.tasks.get()
+        if item == None:
+          return
+        future, fn, args = item
+        if not future.set_running_or_notify_cancel():
+          continue
+        try:
+          future.set_result(worker.call(fn, args, self.timeout))
+        except BaseException as e:
+          future.set_exception(e)
+    finally:
+      worker.stop()
+
+  def submit(self, fn, *args):
+    future = Future()
+    self.tasks.put((future, fn, args))
+    return future
+
+  def shutdown(self, cancel_futures = False):
+    if cancel_futures:
+      while True:
+        try:
+          item = self.tasks.get_nowait()
+        except queue.Empty:
+          break
+        if item != None:
+          item[0].cancel()
+    for _ in self.threads:
+      self.tasks.put(None)
+    for thread in self.threads:
+      thread.join()
@@ -0,0 +1,122 @@
+from concurrent.futures import ProcessPoolExecutor
+import signal
+
+from ..ast import astconverter, astdispatch, astfilter, astfusedfilter, astnodes, astreformatter
+from ..ast.astcache import ConverterCache, code_fingerprint
+from ..ast.astconverter import ASTConverter
+from ..ast.astfilter import ASTFilter
+from ..ast.astfusedfilter import FusedASTFilter
+from ..ast.astreformatter import ASTReformatter
+from ..output_gen.dedupstore import MISSING
+from ..readers.functionmatcher import FunctionMatcher
+from ..readers import parser
+from ..readers.parser import parse_source
+from .budget import check_node_budget
+from .supervisor import SupervisedExecutor, get_context
+
+# Function matcher, converter cache and node budget of the worker process.
+# Set once by init_worker so that the configuration is not sent with every
+# task and the matcher is built once per worker.
+worker_matcher = None
+worker_converter_cache = None
+worker_max_nodes = None
+
+def init_worker(func_args, converter_cache_path = None, converter_cache_size = None, max_nodes = None):
+  global worker_matcher, worker_converter_cache, worker_max_nodes
+  # Ctrl-C reaches every process of the terminal. The main process stops the
+  # run and shuts the workers down once the files in flight are analysed.
+  signal.signal(signal.SIGINT, signal.SIG_IGN)
+  worker_matcher = FunctionMatcher(func_args)
+  worker_max_nodes = max_nodes
+  if converter_cache_path != None:
+    worker_converter_cache = ConverterCache(converter_cache_path, converter_cache_size)
+
+def analyze_source(path, source, matcher, digest = None, converter_cache = None, max_nodes = None):
+  '''Parses the source of a file and runs the converter, filter and
+  reformatter on it (the converter and filter in a single pass when there is
+  no converter cache). Returns None if the file cannot be parsed or does not
+  contain any of the specified functions. Raises FileSkipped if the AST has
+  more than 'max_nodes' nodes.
+
+  With a converter cache, the conversion is looked up by the content hash
+  'digest' and parsing and conversion are skipped on a hit.
+  '''
+  converted_ast = None
+  if converter_cache != None:
+    converted_ast = converter_cache.get(digest)
+
+  if converted_ast == None:
+    tree = parse_source(path, source)
+    if tree == None:
+      return None
+    check_node_budget(tree, len(source), max_nodes)
+    if converter_cache == None:
+      filtered_ast = FusedASTFilter(matcher).run(tree, source)
+    else:
+      converted_ast = ASTConverter().run(tree)
+      converter_cache.put(digest, converted_ast)
+
+  if converted_ast != None:
+    filtered_ast = ASTFilter(matcher).run(converted_ast)
+  if filtered_ast == None:
+    return None
+  return ASTReformatter(matcher).run(filtered_ast)
+
+def analysis_fingerprint():
+  '''Returns a short hash of the code of the modules analyze_source runs
+  and of the Python version (see astcache.code_fingerprint). Results stored
+  by another version of the analysis are stale.
+  '''
+  return code_fingerprint((parser, astconverter, astdispatch, astnodes, astfilter, astfusedfilter, astreformatter))
+
+def analyze_in_worker(path, source, digest):
+  return analyze_source(path, source, worker_matcher, digest, worker_converter_cache, worker_max_nodes)
+
+class AnalysisPool:
+  '''Runs analyze_source for each file on a pool of worker processes.
+
+  The pool is used through two pipeline stages: 'submit' sends the source of
+  a file to the pool and 'collect' waits for its result. Since tasks are
+  collected in the order they were submitted, results come out in the same
+  deterministic order as in serial mode, while up to the capacity of the
+  queue between the two stages are analysed concurrently.
+
+  Files that already have a result (e.g. from the dedup store) or that were
+  rejected by the prefilter are not sent to the pool.
+
+  With a 'timeout' (in seconds) or 'memory_bytes' budget per file, the pool
+  is made of supervised processes (see SupervisedExecutor): a file that
+  exceeds a budget is interrupted and collect() raises FileSkipped for it.
+  Otherwise a worker that dies breaks the pool and submit() and collect()
+  raise BrokenProcessPool for every file after it, which fails the run (see
+  stages.skip_failed_task).
+  '''
+
+  def __init__(self, workers, func_args, prefilter = None, converter_cache = None, max_nodes = None, timeout = None, memory_bytes = None):
+    self.workers = workers
+    self.prefilter = prefilter
+    initargs = (func_args, None, None, max_nodes)
+    if converter_cache != None:
+      initargs = (func_args, converter_cache.path, converter_cache.max_bytes, max_nodes)
+    if timeout != None or memory_bytes != None:
+      self.executor = SupervisedExecutor(workers, init_worker, initargs, timeout, memory_bytes)
+    else:
+      self.executor = ProcessPoolExecutor(max_workers = workers, mp_context = get_context(), initializer = init_worker, initargs = initargs)
+
+  def submit(self, task):
+    if task.result is MISSING:
+      if self.prefilter == None or self.prefilter.accepts(task.source):
+        task.future = self.executor.submit(analyze_in_worker, task.path, task.source, task.digest)
+      else:
+        task.result = None
+    task.source = None
+    return task
+
+  def collect(self, task):
+    if task.future != None:
+      task.result = task.future.result()
+      task.future = None
+    return task
+
+  def close(self):
+    self.executor.shutdown(cancel_futures = True)
@@ -1,6 +1,10 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import os
 import re
 
+from .ignorematcher import IgnoreMatcher
+
 def is_pattern_match(path, patterns):
   for pattern in patterns:
     if re.search(pattern, path) != None:
@@ -48,28 +52,98 @@ def crawl_directory(path, ignore_list):
   '''
   path = os.path.abspath(path)
   paths = []
+  matcher = IgnoreMatcher(ignore_list)
 
-  if os.path.isfile(path) and is_valid_file(path, ignore_list):
+  if os.path.isfile(path) and matcher.is_valid_file(path):
     paths.append(path)
 
   for root, dirs, files in os.walk(path, topdown = True):
-    new_dirs = []
-    for dir_path in dirs:
-    
-      in_include_list = (len(ignore_list['include_patterns']) > 0 or len(ignore_list['include_directories']) > 0) and (is_pattern_match(dir_path, ignore_list['include_patterns']) or is_pattern_match(dir_path + '/', ignore_list['include_directories']))
-      in_ignore_list = (len(ignore_list['name_patterns']) > 0 or len(ignore_list['directories']) > 0) and (is_pattern_match(dir_path, ignore_list['name_patterns']) or is_pattern_match(dir_path + '/', ignore_list['paths']))
-
-      dir = os.path.join(root, dir_path)
-      if not in_include_list and not in_ignore_list:
-        new_dirs.append(dir)
-      elif in_include_list and not in_ignore_list:
-        new_dirs.append(dir)
-      elif in_include_list and in_ignore_list:
-        new_dirs.append(dir)
-
-    dirs[:] = new_dirs
+    dirs[:] = [dir_path for dir_path in dirs if matcher.is_valid_directory(dir_path)]
     for file_name in files:
-      if is_valid_file(file_name, ignore_list, root = root):
+      if matcher.is_valid_file(file_name):
         paths.append(os.path.join(root, file_name))
 
   return paths
+
+def scan_directory(path, matcher, follow_links):
+  '''Lists a single directory with os.scandir and returns a tuple of
+  (directory key, valid file paths, valid subdirectory paths).
+
+  The file type information cached on each DirEntry is reused so that
+  no extra stat calls are made for regular files and directories. Like
+  os.walk, symlinks to directories are only traversed if 'follow_links' is
+  set. The directory key is the (device, inode) pair of the directory when
+  following links and None otherwise.
+  '''
+  files = []
+  subdirectories = []
+  key = None
+  try:
+    if follow_links:
+      stat = os.stat(path)
+      key = (stat.st_dev, stat.st_ino)
+
+    with os.scandir(path) as entries:
+      for entry in entries:
+        try:
+          is_dir = entry.is_dir()
+        except OSError:
+          is_dir = False
+
+        if is_dir:
+          if (follow_links or not entry.is_symlink()) and matcher.is_valid_directory(entry.name):
+            subdirectories.append(entry.path)
+        elif matcher.is_valid_file(entry.name):
+          files.append(entry.path)
+  except OSError as e:
+    print('ERROR: cannot read directory', path, '- Exception:', e)
+
+  files.sort()
+  subdirectories.sort()
+  return key, files, subdirectories
+
+def stream_directory(path, ignore_list, workers = 8, follow_links = False):
+  '''Yields valid file paths under 'path' as they are found.
+
+  Same file set as crawl_directory, but directories are listed with
+  os.scandir on a thread pool of 'workers' threads and results are yielded
+  as soon as each directory has been listed, so callers can start parsing
+  before the walk is finished. Directories are yielded in BFS order with
+  sorted entries regardless of which thread finishes first, so the output
+  order is deterministic.
+
+  When 'follow_links' is set, symlinked directories are traversed and
+  directories are identified by (device, inode) so that symlink loops are
+  only visited once.
+
+  Example:
+  for file_path in stream_directory(my_project, create_ignore_dict()):
+    ...
+  '''
+  path = os.path.abspath(path)
+  matcher = ignore_list if isinstance(ignore_list, IgnoreMatcher) else IgnoreMatcher(ignore_list)
+
+  if os.path.isfile(path):
+    if matcher.is_valid_file(path):
+      yield path
+    return
+
+  visited = set()
+  executor = ThreadPoolExecutor(max_workers = max(1, workers))
+  try:
+    pending = deque([executor.submit(scan_directory, path, matcher, follow_links)])
+    while pending:
+      key, files, subdirectories = pending.popleft().result()
+      if key != None:
+        if key in visited:
+          continue
+        visited.add(key)
+
+      for subdirectory in subdirectories:
+        pending.append(executor.submit(scan_directory, subdirectory, matcher, follow_links))
+
+      for file_path in files:
+        yield file_path
+  finally:
+    # Stops scanning if the caller stops consuming paths early.
+    executor.shutdown(wait = False, cancel_futures = True)
@@ -0,0 +1,94 @@
+import sys
+
+WILDCARD = '*'
+
+# Upper bound of the names whose match against the wildcard patterns is
+# cached. The cache is cleared when full.
+MAX_CACHED_NAMES = 1 << 16
+
+class FunctionMatcher:
+  '''Matches resolved function names against the function names read by
+  read_function_names and returns the argument names of the matching entry.
+
+  Names without wildcards are looked up in a single dictionary. Names with
+  a '*' segment, which matches any one segment (e.g. 'torch.nn.*' matches
+  'torch.nn.Conv2d' but not 'torch.nn.functional.relu'), are stored in a
+  trie over their dotted segments. A name is matched against the trie
+  segment by segment, preferring literal segments over wildcards so that the
+  most specific pattern wins, and the result is cached per name. Exact
+  entries take precedence over patterns. Either way a lookup does not depend
+  on the number of entries.
+
+  Argument names are frozensets. A matcher is built once per run (and per
+  worker process) and shared by the filters and reformatters of every file.
+
+  Example:
+
+  matcher = FunctionMatcher({'torch.nn.Conv2d': ['in_channels'], 'torch.nn.*': ['inplace']})
+  matcher.arguments('torch.nn.Conv2d') -> frozenset({'in_channels'})
+  matcher.arguments('torch.nn.ReLU') -> frozenset({'inplace'})
+  matcher.matches('torch.relu') -> False
+  '''
+
+  def __init__(self, func_args):
+    self.exact = {}
+    self.patterns = {}
+    self.size = 0
+    self.cache = {}
+    for function_name, args in func_args.items():
+      args = frozenset(args)
+      segments = function_name.split('.')
+      if WILDCARD in segments:
+        node = self.patterns
+        for segment in segments:
+          node = node.setdefault(segment, {})
+        # None marks the end of a pattern since it is never a segment.
+        node[None] = args
+      else:
+        self.exact[sys.intern(function_name)] = args
+      self.size += 1
+
+  @classmethod
+  def of(cls, func_args):
+    '''Returns func_args if it is a matcher already, else a matcher built
+    from the dictionary of function names and arguments.
+    '''
+    return func_args if isinstance(func_args, cls) else cls(func_args)
+
+  def __len__(self):
+    return self.size
+
+  def matches(self, name):
+    return self.arguments(name) != None
+
+  def arguments(self, name):
+    '''Returns the argument names of the entry that matches the function
+    name, or None if no entry matches.
+    '''
+    args = self.exact.get(name)
+    if args != None or len(self.patterns) == 0:
+      return args
+
+    if name in self.cache:
+      return self.cache[name]
+    args = self.match_pattern(name.split('.'))
+    if len(self.cache) >= MAX_CACHED_NAMES:
+      self.cache.clear()
+    self.cache[name] = args
+    return args
+
+  def match_pattern(self, segments):
+    # Depth first, trying the literal segment before the wildcard at each
+    # level (the last pushed is tried first).
+    todo = [(self.patterns, 0)]
+    while todo:
+      node, index = todo.pop()
+      if index == len(segments):
+        if None in node:
+          return node[None]
+        continue
+      if WILDCARD in node:
+        todo.append((node[WILDCARD], index + 1))
+      if segments[index] in node:
+        todo.append((node[segments[index]], index + 1))
+    return None
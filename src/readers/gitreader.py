@@ -0,0 +1,110 @@
+import os
+import subprocess
+
+from .ignorematcher import IgnoreMatcher
+
+# Regular and executable files. Symlinks (120000) and submodules (160000) are
+# skipped since their blobs do not hold source code.
+FILE_MODES = {b'100644', b'100755'}
+
+class GitRepository:
+  '''Reads source files directly from the object database of a git
+  repository (bare or not) without checking out a working tree.
+
+  Files are enumerated with a single 'git ls-tree' call and blob contents are
+  read through one long-lived 'git cat-file --batch' process, so no files are
+  written to disk.
+
+  Example:
+
+  with GitRepository('my_project.git') as repo:
+    for path, source in repo.stream_sources(create_ignore_dict()):
+      ...
+
+  yields ('my_project.git/Test/test.py', b'...') for every file at HEAD that
+  is not ignored by the .ignore rules.
+  '''
+
+  def __init__(self, repo_path, revision = 'HEAD'):
+    self.repo_path = os.path.abspath(repo_path)
+    self.revision = revision
+    self.cat_file = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def git(self, *args):
+    return ['git', '--git-dir', self.git_dir()] + list(args)
+
+  def git_dir(self):
+    dot_git = os.path.join(self.repo_path, '.git')
+    return dot_git if os.path.isdir(dot_git) else self.repo_path
+
+  def list_files(self):
+    '''Returns a list of (path, blob id) pairs for all files at the revision.
+    Paths are relative to the repository root and use '/' separators.
+    '''
+    output = subprocess.run(self.git('ls-tree', '-r', '-z', '--full-tree', self.revision), check = True, stdout = subprocess.PIPE).stdout
+
+    files = []
+    for entry in output.split(b'\0'):
+      if len(entry) == 0:
+        continue
+      # Format: <mode> SP <type> SP <object> TAB <path>
+      info, path = entry.split(b'\t', 1)
+      mode, object_type, object_id = info.split(b' ')
+      if object_type == b'blob' and mode in FILE_MODES:
+        files.append((os.fsdecode(path), object_id))
+    return files
+
+  def read_blob(self, object_id):
+    '''Returns the contents of the blob through the 'git cat-file --batch'
+    process, which is started on first use.
+    '''
+    if self.cat_file == None:
+      self.cat_file = subprocess.Popen(self.git('cat-file', '--batch'), stdin = subprocess.PIPE, stdout = subprocess.PIPE)
+
+    self.cat_file.stdin.write(object_id + b'\n')
+    self.cat_file.stdin.flush()
+
+    # Format: <object> SP <type> SP <size> LF <contents> LF
+    header = self.cat_file.stdout.readline().split()
+    if len(header) != 3:
+      raise ValueError('cannot read object ' + object_id.decode() + ': ' + b' '.join(header).decode())
+    contents = self.cat_file.stdout.read(int(header[2]))
+    self.cat_file.stdout.read(1)
+    return contents
+
+  def stream_sources(self, ignore_list):
+    '''Yields (path, contents) pairs for the files at the revision that are
+    not ignored. Paths are joined to the repository path so that they map to
+    the same output files as a checkout at that location would.
+
+    The .ignore rules are applied the same way as in crawl_directory: a file
+    is kept if its name is valid and every directory above it is valid.
+    '''
+    matcher = ignore_list if isinstance(ignore_list, IgnoreMatcher) else IgnoreMatcher(ignore_list)
+    valid_directories = {'': True}
+
+    def is_valid_directory(directory):
+      valid = valid_directories.get(directory)
+      if valid == None:
+        parent, _, name = directory.rpartition('/')
+        valid = is_valid_directory(parent) and matcher.is_valid_directory(name)
+        valid_directories[directory] = valid
+      return valid
+
+    for rel_path, object_id in self.list_files():
+      directory, _, name = rel_path.rpartition('/')
+      if is_valid_directory(directory) and matcher.is_valid_file(name):
+        yield os.path.join(self.repo_path, rel_path), self.read_blob(object_id)
+
+  def close(self):
+    if self.cat_file != None:
+      self.cat_file.stdin.close()
+      self.cat_file.wait()
+      self.cat_file.stdout.close()
+      self.cat_file = None
@@ -0,0 +1,137 @@
+import re
+
+# Patterns produced by handle_pattern() for '*.ext' style lines look like
+# '^.*\.ext$'. The literal tail can be checked with str.endswith instead of
+# the regex engine.
+SUFFIX_PATTERN = re.compile(r'^\^\.\*((?:\\\.|[A-Za-z0-9_\-/ ])*)\$$')
+LITERAL_PATTERN = re.compile(r'^\^((?:\\\.|[A-Za-z0-9_\-/ ])*)\$$')
+BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+class PatternSet:
+  '''A group of ignore patterns compiled for repeated matching.
+
+  Matching a name against a PatternSet gives the same result as
+  filecrawler.is_pattern_match(name, patterns), but instead of running
+  re.search once per pattern the patterns are split into:
+
+  - 'match_all': the pattern '^.*$' (from a bare '*' line).
+  - 'literals': exact names, e.g. '^configs\.py$', checked with a set lookup.
+  - 'suffixes': names ending in a literal, e.g. '^.*\.py$', checked with a
+    single str.endswith call.
+  - 'regex': every remaining pattern merged into one alternation.
+
+  The fast paths are skipped for names containing a newline since '.' and
+  '$' treat newlines specially.
+  '''
+
+  def __init__(self, patterns):
+    self.patterns = list(patterns)
+    self.match_all = False
+    self.literals = set()
+    suffixes = []
+    others = []
+
+    for pattern in self.patterns:
+      literal = LITERAL_PATTERN.match(pattern)
+      suffix = SUFFIX_PATTERN.match(pattern)
+      if pattern == '^.*$':
+        self.match_all = True
+      elif literal != None:
+        self.literals.add(literal.group(1).replace('\\.', '.'))
+      elif suffix != None:
+        suffixes.append(suffix.group(1).replace('\\.', '.'))
+      else:
+        others.append(pattern)
+
+    self.suffixes = tuple(suffixes)
+    self.regex = self.compile_patterns(others)
+    self.full_regex = self.compile_patterns(self.patterns)
+
+  def compile_patterns(self, patterns):
+    '''Returns an object with a 'search' method that matches if any of the
+    patterns match. Patterns are merged into a single regex unless one of them
+    uses backreferences, which would be renumbered by the merge.
+    '''
+    if len(patterns) == 0:
+      return None
+    if any(BACKREFERENCE.search(pattern) != None for pattern in patterns):
+      return RegexList(patterns)
+    return re.compile('|'.join('(?:' + pattern + ')' for pattern in patterns))
+
+  def __len__(self):
+    return len(self.patterns)
+
+  def match(self, name):
+    '''Returns True if any pattern matches the name.'''
+    if '\n' in name:
+      return self.full_regex != None and self.full_regex.search(name) != None
+    if self.match_all or name in self.literals:
+      return True
+    if len(self.suffixes) > 0 and name.endswith(self.suffixes):
+      return True
+    return self.regex != None and self.regex.search(name) != None
+
+class RegexList:
+  '''Fallback for patterns that cannot be merged into one regex.'''
+
+  def __init__(self, patterns):
+    self.regexes = [re.compile(pattern) for pattern in patterns]
+
+  def search(self, name):
+    for regex in self.regexes:
+      match = regex.search(name)
+      if match != None:
+        return match
+    return None
+
+class IgnoreMatcher:
+  '''Compiled form of the dictionary returned by ignore.create_ignore_dict().
+
+  The matcher is built once per crawl and answers whether a file or directory
+  name should be kept. Decisions are memoized per name since the same names
+  (e.g. '__init__.py', 'tests', 'utils.py') repeat throughout large trees.
+
+  Example:
+
+  matcher = IgnoreMatcher(create_ignore_dict())
+  matcher.is_valid_file('test.py') -> True
+  matcher.is_valid_file('README.md') -> False
+  matcher.is_valid_directory('src') -> True
+  '''
+
+  def __init__(self, ignore_list, cache_size = 65536):
+    self.include_patterns = PatternSet(ignore_list['include_patterns'])
+    self.name_patterns = PatternSet(ignore_list['name_patterns'])
+    self.include_directories = PatternSet(ignore_list['include_directories'])
+    self.directories = PatternSet(ignore_list['directories'])
+    self.cache_size = cache_size
+    self.file_cache = {}
+    self.directory_cache = {}
+
+  def is_valid_file(self, file_name):
+    '''Returns True if the file is not ignored. Same result as
+    filecrawler.is_valid_file(file_name, ignore_list).
+    '''
+    valid = self.file_cache.get(file_name)
+    if valid == None:
+      in_include_list = self.include_patterns.match(file_name)
+      valid = in_include_list or not self.name_patterns.match(file_name)
+      if len(self.file_cache) >= self.cache_size:
+        self.file_cache.clear()
+      self.file_cache[file_name] = valid
+    return valid
+
+  def is_valid_directory(self, dir_name):
+    '''Returns True if the directory should be traversed. A directory is
+    matched against the name patterns by its name and against the directory
+    patterns by its name with a trailing '/'.
+    '''
+    valid = self.directory_cache.get(dir_name)
+    if valid == None:
+      in_include_list = self.include_patterns.match(dir_name) or self.include_directories.match(dir_name + '/')
+      in_ignore_list = self.name_patterns.match(dir_name) or self.directories.match(dir_name + '/')
+      valid = in_include_list or not in_ignore_list
+      if len(self.directory_cache) >= self.cache_size:
+        self.directory_cache.clear()
+      self.directory_cache[dir_name] = valid
+    return valid
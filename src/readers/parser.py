@@ -1,14 +1,78 @@
 import ast
+import os
 
-def generate_file_ast(file_paths):
+# Number of leading bytes that are checked for NUL bytes to detect binary
+# files. Python source cannot contain NUL bytes.
+SNIFF_BYTES = 8192
+
+def check_source(source, max_bytes = None):
+  '''
+  Returns the reason a file should not be parsed ('oversized' or 'binary'),
+  or None if it should be parsed. Only the first bytes are inspected.
+  '''
+  if max_bytes != None and len(source) > max_bytes:
+    return 'oversized'
+  if source.find(b'\0', 0, SNIFF_BYTES) != -1:
+    return 'binary'
+  return None
+
+def read_source(path, max_bytes = None):
+  '''
+  Reads the file at path as bytes and returns a tuple of (source, reason).
+
+  The file is read with a single unbuffered copy into a buffer of the size of
+  the file. Files larger than max_bytes are skipped before reading and binary
+  files are skipped after reading the first SNIFF_BYTES bytes. For skipped
+  files source is None and reason is 'oversized' or 'binary'.
+
+  The contents are not decoded: ast.parse accepts bytes and applies the
+  encoding declaration (PEP 263) or BOM of the file itself.
+  '''
+  with open(path, 'rb', buffering = 0) as f:
+    size = os.fstat(f.fileno()).st_size
+    if max_bytes != None and size > max_bytes:
+      return None, 'oversized'
+
+    source = bytearray(size)
+    with memoryview(source) as view:
+      read = f.readinto(view[:SNIFF_BYTES]) or 0
+      if source.find(b'\0', 0, read) != -1:
+        return None, 'binary'
+      while read < size:
+        count = f.readinto(view[read:])
+        if not count:
+          break
+        read += count
+
+    # The file shrank while it was being read.
+    if read < size:
+      del source[read:]
+  return source, None
+
+def parse_source(path, source):
+  '''
+  Generates an AST for the source of the file at path. Returns None if the
+  file cannot be parsed. MemoryError is raised so that a memory budget can
+  tell it apart from invalid source.
+  '''
+  try:
+    return ast.parse(source)
+  except MemoryError:
+    raise
+  except Exception as e:
+    print('ERROR: cannot read file', path, '- Exception:', e)
+    return None
+
+def generate_file_ast(file_paths, max_bytes = None):
   '''
   Generates an AST for each file specified in file_paths.
   '''
   content = []
   for path in file_paths:
-    with open(path, 'r') as f:
-      try:
-        content.append([path, ast.parse(f.read())])
-      except Exception as e:
-        print('ERROR: cannot read file', path, '- Exception:', e)
+    source, _ = read_source(path, max_bytes)
+    if source == None:
+      continue
+    file_ast = parse_source(path, source)
+    if file_ast != None:
+      content.append([path, file_ast])
   return content
@@ -0,0 +1,121 @@
+import re
+import unicodedata
+
+from .functionmatcher import WILDCARD
+
+def build_trie_pattern(tokens):
+  '''Returns a regex alternation (as bytes) matching any of the tokens, with
+  common prefixes factored out so that the regex engine walks the tokens as a
+  trie instead of trying every alternative at each position.
+
+  Example:
+  ['Conv1d', 'Conv2d', 'Linear'] -> '(?:Conv(?:1d|2d)|Linear)'
+  '''
+  trie = {}
+  for token in tokens:
+    node = trie
+    for char in token:
+      node = node.setdefault(char, {})
+    node[''] = {}
+
+  def to_pattern(node):
+    alternatives = []
+    optional = False
+    for char in sorted(node.keys()):
+      if char == '':
+        optional = True
+      else:
+        alternatives.append(re.escape(char) + to_pattern(node[char]))
+    if len(alternatives) == 0:
+      return ''
+    pattern = alternatives[0] if len(alternatives) == 1 and not optional else '(?:' + '|'.join(alternatives) + ')'
+    if optional:
+      pattern = pattern + '?'
+    return pattern
+
+  return to_pattern(trie).encode('ascii')
+
+class SourcePrefilter:
+  '''Decides from the raw bytes of a file whether it can produce any output,
+  so that files that cannot are skipped before ast.parse.
+
+  A call is only output if its resolved function name is one of the
+  configured names. The resolved name is built from identifiers that appear
+  in the source (names, attributes and the names in import statements), so
+  for a configured name such as 'torch.nn.Conv2d' both its first segment
+  ('torch') and its last segment ('Conv2d') must appear in the file as whole
+  identifiers. A file is rejected only if no configured name has both. For
+  a pattern whose last segment is a wildcard (e.g. 'torch.nn.*'), the first
+  segment is enough.
+
+  The identifiers are found in a single pass with a trie-shaped regex over
+  the bytes. Files with non-ASCII bytes that do not match are rescanned after
+  NFKC normalization since Python normalizes identifiers that way. If any
+  configured name is not a dotted identifier or starts with a wildcard,
+  nothing is rejected.
+
+  Example:
+
+  prefilter = SourcePrefilter({'torch.nn.Conv2d': ['in_channels']})
+  prefilter.accepts(b'from torch import nn\nnn.Conv2d(3, 8)') -> True
+  prefilter.accepts(b'import numpy as np\nnp.zeros(3)') -> False
+  '''
+
+  def __init__(self, func_args):
+    self.files = 0
+    self.rejected = 0
+    self.enabled = True
+
+    # Maps each token to the tokens that complete a (first, last) segment
+    # pair with it.
+    self.partners = {}
+    for function_name in func_args.keys():
+      segments = function_name.split('.')
+      if segments[0] == WILDCARD or not all(segment == WILDCARD or segment.isidentifier() and segment.isascii() for segment in segments):
+        self.enabled = False
+        return
+      first, last = segments[0], segments[-1]
+      self.partners.setdefault(first.encode(), set()).add(last.encode())
+      if last != WILDCARD:
+        self.partners.setdefault(last.encode(), set()).add(first.encode())
+
+    self.regex = None
+    if len(self.partners) > 0:
+      self.regex = re.compile(rb'\b' + build_trie_pattern(sorted(token.decode() for token in self.partners)) + rb'\b')
+
+  def has_match(self, source):
+    # The wildcard is always found, so that the first segment of a pattern
+    # ending with a wildcard matches on its own.
+    found = {WILDCARD.encode()}
+    for match in self.regex.finditer(source):
+      token = match.group()
+      if token in found:
+        continue
+      found.add(token)
+      if not self.partners[token].isdisjoint(found):
+        return True
+    return False
+
+  def accepts(self, source):
+    '''Returns False if the file cannot produce any output. Rejections are
+    counted for the report.
+    '''
+    self.files += 1
+    if not self.enabled:
+      return True
+    if self.regex != None:
+      if self.has_match(source):
+        return True
+      if not source.isascii():
+        try:
+          normalized = unicodedata.normalize('NFKC', source.decode('utf-8'))
+        except UnicodeDecodeError:
+          return True
+        if self.has_match(normalized.encode('utf-8')):
+          return True
+    self.rejected += 1
+    return False
+
+  def summary(self):
+    percentage = 100.0 * self.rejected / self.files if self.files > 0 else 0.0
+    return 'Prefilter: %d of %d files skipped before parsing (%.1f%%)' % (self.rejected, self.files, percentage)
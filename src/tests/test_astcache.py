@@ -0,0 +1,73 @@
+import ast
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..ast.astcache import ConverterCache
+from ..ast.astconverter import ASTConverter
+from ..ast.astnodes import to_json
+from ..output_gen.manifest import content_hash
+
+SOURCE = b"""
+import torch.nn as nn
+layers = {'conv': nn.Conv2d(3, 64, (3, 3)), 'act': nn.ReLU(inplace = True)}
+def build(x, *args):
+  return nn.Sequential(nn.Linear(x, 1j), b'\\x00', ..., [None, 1.5])
+"""
+
+class ConverterCacheTestClass(unittest.TestCase):
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def test_round_trip(self):
+    cache = ConverterCache(self.root)
+    digest = content_hash(SOURCE)
+    expected = ASTConverter().run(ast.parse(SOURCE))
+
+    self.assertIsNone(cache.get(digest))
+    cache.put(digest, expected)
+    self.assertEqual(repr(to_json(cache.get(digest))), repr(to_json(expected)))
+    self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    # Entries of another converter version are not used.
+    self.assertIsNone(ConverterCache(self.root, version = ASTConverter.VERSION + 1).get(digest))
+
+    # Nor are entries written by other converter code.
+    cache = ConverterCache(self.root)
+    cache.fingerprint = 'other'
+    self.assertIsNone(cache.get(digest))
+    self.assertIsNotNone(ConverterCache(self.root).get(digest))
+
+  def test_corrupt_entry(self):
+    cache = ConverterCache(self.root)
+    digest = content_hash(b'x = 1')
+    os.makedirs(os.path.dirname(cache.entry_path(digest)))
+    with open(cache.entry_path(digest), 'wb') as f:
+      f.write(b'not a cache entry')
+    self.assertIsNone(cache.get(digest))
+
+  def test_lru_eviction(self):
+    cache = ConverterCache(self.root, max_bytes = 10 ** 9)
+    digests = [content_hash(str(i).encode()) for i in range(20)]
+    for i, digest in enumerate(digests):
+      cache.put(digest, {'calls': ['x' * 1000 + str(i)]})
+      os.utime(cache.entry_path(digest), (i, i))
+
+    # A hit marks the oldest entry as recently used.
+    self.assertIsNotNone(cache.get(digests[0]))
+    size = os.path.getsize(cache.entry_path(digests[1]))
+    cache.max_bytes = size * 10
+    cache.evict()
+
+    remaining = [i for i, digest in enumerate(digests) if os.path.exists(cache.entry_path(digest))]
+    self.assertIn(0, remaining)
+    self.assertNotIn(1, remaining)
+    self.assertLessEqual(len(remaining), 10)
+    self.assertIn(19, remaining)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,7 +1,9 @@
 import ast
+import sys
 import unittest
 
 from ..ast.astconverter import ASTConverter
+from ..ast.astnodes import to_json
 
 class AstConverterTestClass(unittest.TestCase):
   def test_run_imports(self):
@@ -56,7 +58,7 @@ r()"""
     }
 
     astconverter = ASTConverter()
-    actual = astconverter.run(ast.parse(source))
+    actual = to_json(astconverter.run(ast.parse(source)))
     self.assertDictEqual(actual, expected)
   
   def test_run_call(self):
@@ -83,7 +85,7 @@ r()"""
     }
 
     astconverter = ASTConverter()
-    actual = astconverter.run(ast.parse(source))
+    actual = to_json(astconverter.run(ast.parse(source)))
     self.assertDictEqual(actual, expected)
   
   def test_run_call_arg(self):
@@ -121,7 +123,7 @@ r()"""
     }
 
     astconverter = ASTConverter()
-    actual = astconverter.run(ast.parse(source))
+    actual = to_json(astconverter.run(ast.parse(source)))
     self.assertDictEqual(actual, expected)
   
   def test_run_call_keyword(self):
@@ -162,7 +164,7 @@ r()"""
     }
 
     astconverter = ASTConverter()
-    actual = astconverter.run(ast.parse(source))
+    actual = to_json(astconverter.run(ast.parse(source)))
     self.assertDictEqual(actual, expected)
 
   def test_run_function_def(self):
@@ -223,7 +225,7 @@ def func_def(x, y, z):
     }
 
     astconverter = ASTConverter()
-    actual = astconverter.run(ast.parse(source))
+    actual = to_json(astconverter.run(ast.parse(source)))
     self.assertDictEqual(actual, expected)
 
   def test_all_nodes_with_import_substitution(self):
@@ -323,8 +325,34 @@ def func_def(x, y, z):
     }
 
     astconverter = ASTConverter()
-    actual = astconverter.run(ast.parse(source))
+    actual = to_json(astconverter.run(ast.parse(source)))
     self.assertDictEqual(actual, expected)
 
+  def test_deep_nesting(self):
+    # Each link of the chain nests the previous calls one level deeper. The
+    # conversion must not recurse along the nesting.
+    source = 'model = Sequential()' + '.add(Linear(in_features=2))' * 500
+    tree = ast.parse(source)
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(200)
+    try:
+      actual = ASTConverter().run(tree)
+    finally:
+      sys.setrecursionlimit(limit)
+
+    self.assertEqual(len(actual['calls']), 1)
+    call = actual['calls'][0]
+    for _ in range(500):
+      self.assertEqual(call.function.attr, 'add')
+      self.assertEqual(call.args[0].function, 'Linear')
+      call = call.function.instance
+    self.assertEqual(call.function, 'Sequential')
+
+  def test_wide_function_body(self):
+    source = 'def build():\n' + ''.join('  Linear(%d)\n' % i for i in range(2000))
+    actual = ASTConverter().run(ast.parse(source))
+    calls = actual['function_defs'][0].calls
+    self.assertEqual([call.args[0].value for call in calls], list(range(2000)))
+
 if __name__ == '__main__':
   unittest.main()
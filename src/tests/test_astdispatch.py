@@ -0,0 +1,56 @@
+import ast
+import unittest
+
+from ..ast.astconverter import ASTConverter
+from ..ast.astdispatch import DispatchTable
+from ..ast.astnodes import to_json
+
+class DispatchTableTestClass(unittest.TestCase):
+  def test_lookup(self):
+    table = DispatchTable({ast.Call: 'call', (ast.List, ast.Tuple): 'iterable', 'dict': 'dict'}, default = 'other')
+    self.assertEqual(table[ast.Call], 'call')
+    self.assertEqual(table[ast.Tuple], 'iterable')
+    self.assertEqual(table['dict'], 'dict')
+    self.assertEqual(table[ast.Name], 'other')
+    self.assertEqual(table['set'], 'other')
+    self.assertEqual(table[None], 'other')
+
+  def test_subclass_lookup(self):
+    class MyCall(ast.Call):
+      pass
+
+    table = DispatchTable({ast.expr: 'expression', ast.Call: 'call'})
+    self.assertEqual(table[MyCall], 'call')
+    self.assertEqual(table[ast.Name], 'expression')
+    self.assertIsNone(table[ast.Module])
+
+  def test_register(self):
+    table = DispatchTable({ast.expr: 'expression'})
+    self.assertEqual(table[ast.Call], 'expression')
+    # Lookups that were resolved before are resolved again.
+    table.register(ast.Call, 'call')
+    self.assertEqual(table[ast.Call], 'call')
+
+  def test_copy(self):
+    table = DispatchTable({ast.Call: 'call'}, default = 'other')
+    copy = table.copy()
+    copy.register(ast.Name, 'name')
+    self.assertEqual(copy[ast.Name], 'name')
+    self.assertEqual(copy[ast.Call], 'call')
+    self.assertEqual(table[ast.Name], 'other')
+
+  def test_plug_in_handler(self):
+    def convert_f_string(self, root):
+      return {'type': 'f_string', 'value': ast.unparse(root)}
+
+    class FStringConverter(ASTConverter):
+      argument_converters = ASTConverter.argument_converters.copy()
+      argument_converters.register(ast.JoinedStr, convert_f_string)
+
+    source = 'f(f"{x}", "y")'
+    result = FStringConverter().run(ast.parse(source))
+    self.assertListEqual(to_json(result['calls'][0].args), [{'type': 'f_string', 'value': "f'{x}'"}, {'type': 'constant', 'value': 'y'}])
+    self.assertEqual(ASTConverter().run(ast.parse(source))['calls'][0].args[0], "f'{x}'")
+
+if __name__ == '__main__':
+  unittest.main()
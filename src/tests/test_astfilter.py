@@ -3,6 +3,7 @@ import unittest
 
 from ..ast.astconverter import ASTConverter
 from ..ast.astfilter import ASTFilter
+from ..ast.astnodes import to_json
 
 class AstFilterTestClass(unittest.TestCase):
   def test_run_imports(self):
@@ -48,7 +49,7 @@ from math import random as r"""
     astfilter = ASTFilter(args)
     
     converted_ast = astconverter.run(ast.parse(source))
-    actual = astfilter.run(converted_ast)
+    actual = to_json(astfilter.run(converted_ast))
     self.assertDictEqual(actual, expected)
   
   def test_run_call(self):
@@ -78,7 +79,7 @@ from math import random as r"""
     astfilter = ASTFilter(args)
     
     converted_ast = astconverter.run(ast.parse(source))
-    actual = astfilter.run(converted_ast)
+    actual = to_json(astfilter.run(converted_ast))
     self.assertDictEqual(actual, expected)
   
   def test_run_call_arg(self):
@@ -114,7 +115,7 @@ from math import random as r"""
     astfilter = ASTFilter(args)
     
     converted_ast = astconverter.run(ast.parse(source))
-    actual = astfilter.run(converted_ast)
+    actual = to_json(astfilter.run(converted_ast))
     self.assertDictEqual(actual, expected)
   
   def test_run_call_keyword(self):
@@ -159,7 +160,7 @@ from math import random as r"""
     astfilter = ASTFilter(args)
     
     converted_ast = astconverter.run(ast.parse(source))
-    actual = astfilter.run(converted_ast)
+    actual = to_json(astfilter.run(converted_ast))
     self.assertDictEqual(actual, expected)
 
   def test_run_function_def(self):
@@ -213,7 +214,7 @@ def func_def(x, y, z):
     astfilter = ASTFilter(args)
     
     converted_ast = astconverter.run(ast.parse(source))
-    actual = astfilter.run(converted_ast)
+    actual = to_json(astfilter.run(converted_ast))
     self.assertDictEqual(actual, expected)
 
   def test_all_nodes_with_import_substitution(self):
@@ -276,8 +277,61 @@ def func_def(x, y, z):
     astconverter = ASTConverter()
     astfilter = ASTFilter(args)
     converted_ast = astconverter.run(ast.parse(source))
-    actual = astfilter.run(converted_ast)
+    actual = to_json(astfilter.run(converted_ast))
     self.assertDictEqual(actual, expected)
 
+  def test_shared_subtrees(self):
+    # wrap(nn.Conv2d(3), 5) is converted to a single node, which is kept
+    # whole as a specified argument of the first call and reduced in the
+    # second.
+    source ="""
+outer(nn.Conv2d(3), padding = wrap(nn.Conv2d(3), 5))
+wrap(nn.Conv2d(3), 5)"""
+
+    reduced_conv = {'type': 'call', 'function': 'nn.Conv2d', 'args': [], 'keywords': []}
+    wrap = {
+      'type': 'call',
+      'function': 'wrap',
+      'args': [{
+        'type': 'call',
+        'function': 'nn.Conv2d',
+        'args': [{'type': 'constant', 'value': 3}],
+        'keywords': []
+      }, {
+        'type': 'constant',
+        'value': 5
+      }],
+      'keywords': []
+    }
+    expected = {
+      'imports': [],
+      'calls': [{
+        'type': 'call',
+        'function': 'outer',
+        'args': [reduced_conv],
+        'keywords': [{
+          'keyword': 'padding',
+          'value': wrap
+        }]
+      }, {
+        'type': 'call',
+        'function': 'wrap',
+        'args': [reduced_conv],
+        'keywords': []
+      }],
+      'function_defs': []
+    }
+
+    args = {
+      'nn.Conv2d': ['padding']
+    }
+    astconverter = ASTConverter()
+    astfilter = ASTFilter(args)
+    converted_ast = astconverter.run(ast.parse(source))
+    self.assertIs(converted_ast['calls'][0].keywords[0].value, converted_ast['calls'][1])
+    actual = to_json(astfilter.run(converted_ast))
+    self.assertDictEqual(actual, expected)
+    self.assertDictEqual(to_json(converted_ast['calls'][1]), wrap)
+
 if __name__ == '__main__':
   unittest.main()
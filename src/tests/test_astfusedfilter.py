@@ -0,0 +1,82 @@
+import ast
+import sys
+import unittest
+
+from ..ast.astconverter import ASTConverter
+from ..ast.astfilter import ASTFilter
+from ..ast.astfusedfilter import FusedASTFilter
+from ..ast.astnodes import to_json
+from ..ast.astreformatter import ASTReformatter
+
+ARGS = {
+  'torch.nn.Conv2d': ['in_channels', 'out_channels'],
+  'torch.nn.Linear': ['in_features'],
+  'Sequential': ['modules'],
+  'helper': []
+}
+
+SOURCES = [
+  # Imports and aliases.
+  'import torch\nfrom torch import nn as n\nimport os\nn.Conv2d(3, in_channels = 1, other = 2)',
+  'from torch import nn\nnn.Linear(1, in_features = [1, 2], out = nn.Conv2d(in_channels = 3))',
+  # Aliases only apply to calls found after the import.
+  'nn.Conv2d(in_channels = 1)\nfrom torch import nn\nnn.Conv2d(in_channels = 2)',
+  # Calls nested in arguments, iterables and dictionaries.
+  'from torch import nn\nf(1, [2, nn.Conv2d(in_channels = 3)], (x, y), {4})',
+  'from torch import nn\nf({nn.Linear(in_features = 1): [1, 2], "a": nn.Conv2d(3), 5: 6})',
+  'from torch import nn\nf({(1, 2): {"b": nn.Linear(2)}}, k = [nn.Conv2d(1)])',
+  # Keywords of a call without a specified name are kept unreduced once a
+  # name was found in an earlier argument.
+  'from torch import nn\nf(nn.Conv2d(1), in_channels = g(1), k = [1, nn.Linear(2)])',
+  'from torch import nn\nnn.Conv2d(g(1), h(nn.Linear(1)), in_channels = {1: nn.Linear(2)}, k = g(2))',
+  # Names found in the function of a call.
+  'from torch import nn\nnn.Conv2d(in_channels = 1).to(x)(y)\nhelper().attr.Sequential(modules = 1)',
+  'x[0].helper(1)\n(a + b).Sequential(modules = [helper()])\nSequential()(helper())',
+  # Function definitions.
+  'def helper(a, b = 2):\n  print(a)\n\ndef g():\n  def h():\n    helper(1)\n  return f(1)\n\ndef unused():\n  f(2)',
+  'class A:\n  from torch import nn\n  def forward(self, x):\n    return self.nn.Conv2d(x)\n  layer = nn.Conv2d(in_channels = 2)',
+  'print(1)\nlambda: helper(2)\nasync def a():\n  await helper(3)',
+]
+
+class FusedASTFilterTestClass(unittest.TestCase):
+  def assertSameAsTwoPasses(self, source, args):
+    expected = ASTFilter(args).run(ASTConverter().run(ast.parse(source)))
+    result = FusedASTFilter(args).run(ast.parse(source))
+    # repr also tells lists from tuples.
+    self.assertEqual(repr(to_json(result)), repr(to_json(expected)), source)
+
+  def test_run(self):
+    for source in SOURCES:
+      self.assertSameAsTwoPasses(source, ARGS)
+
+  def test_run_without_function_names(self):
+    for source in SOURCES:
+      self.assertSameAsTwoPasses(source, {})
+
+  def test_run_no_match(self):
+    self.assertIsNone(FusedASTFilter(ARGS).run(ast.parse('import os\nos.path.join(1, 2)')))
+
+  def test_pruned_arguments_not_converted(self):
+    # Dictionary unpacking cannot be converted, but the argument is never
+    # converted since it cannot contain a specified function.
+    result = FusedASTFilter(ARGS).run(ast.parse('helper(1)\nf({**a}, helper(2))'))
+    self.assertEqual(len(result['calls']), 2)
+
+  def test_deep_nesting(self):
+    # Neither pass, nor the reformatter, may recurse along the nesting.
+    source = 'import torch.nn as nn\nmodel = nn.Sequential()' + '.add(nn.Linear(in_features=2))' * 500
+    tree = ast.parse(source)
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(200)
+    try:
+      expected = ASTReformatter(ARGS).run(ASTFilter(ARGS).run(ASTConverter().run(tree)))
+      actual = ASTReformatter(ARGS).run(FusedASTFilter(ARGS).run(tree))
+    finally:
+      sys.setrecursionlimit(limit)
+    # The filtered trees are too deep to compare, so their reformatted
+    # results are compared instead.
+    self.assertEqual(actual, expected)
+    self.assertEqual(len(actual), 500)
+
+if __name__ == '__main__':
+  unittest.main()
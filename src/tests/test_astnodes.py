@@ -0,0 +1,97 @@
+import ast
+import sys
+import unittest
+
+from ..ast.astconverter import ASTConverter
+from ..ast.astnodes import AttributeNode, CallNode, ConstantNode, KeywordNode, NodeTable, SourceSegment, dotted_names, from_json, to_json, value_type
+
+SOURCE = """
+import torch.nn as nn
+from os import path
+layers = {'conv': nn.Conv2d(3, 64, (3, 3)), 'act': nn.ReLU(inplace = True)}
+nn.Sequential().add([nn.Linear(x, 1j)], *{None, b'1'})
+def build(x, *args):
+  return path.join(x, ...).strip()
+"""
+
+class ASTNodesTestClass(unittest.TestCase):
+  def test_to_json(self):
+    call = CallNode(AttributeNode(CallNode('f', [], []), 'g'), [ConstantNode(1)], [KeywordNode('k', 'x + 1')])
+    self.assertEqual(to_json(call), {
+      'type': 'call',
+      'function': {
+        'instance': {'type': 'call', 'function': 'f', 'args': [], 'keywords': []},
+        'attr': 'g'
+      },
+      'args': [{'type': 'constant', 'value': 1}],
+      'keywords': [{'keyword': 'k', 'value': 'x + 1'}]
+    })
+    self.assertEqual(value_type(call), 'call')
+    self.assertIsNone(value_type(call.function))
+    self.assertIsNone(value_type('x + 1'))
+
+  def test_json_round_trip(self):
+    converted = to_json(ASTConverter().run(ast.parse(SOURCE)))
+    # repr also tells lists from tuples.
+    self.assertEqual(repr(to_json(from_json(converted))), repr(converted))
+
+  def test_deep_nesting(self):
+    call = 'f'
+    for _ in range(5000):
+      call = CallNode(AttributeNode(call, 'g'), [], [])
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(200)
+    try:
+      converted = to_json(call)
+      call = from_json(converted)
+    finally:
+      sys.setrecursionlimit(limit)
+    for _ in range(5000):
+      call = call.function.instance
+    self.assertEqual(call, 'f')
+
+  def test_dotted_names_interned(self):
+    converted = ASTConverter().run(ast.parse('import torch\ntorch.nn.Conv2d(1)\ntorch.nn.Conv2d(2)'))
+    first, second = converted['calls']
+    self.assertEqual(first.function, 'torch.nn.Conv2d')
+    self.assertIs(first.function, second.function)
+    self.assertIs(dotted_names['torch.nn', 'Conv2d'], first.function)
+
+  def test_node_table(self):
+    nodes = NodeTable()
+    keyword = nodes.node(KeywordNode, 'inplace', nodes.node(ConstantNode, True, bool))
+    relu = nodes.node(CallNode, 'nn.ReLU', (), (keyword,))
+    self.assertIs(nodes.node(CallNode, 'nn.ReLU', (), (nodes.node(KeywordNode, 'inplace', nodes.node(ConstantNode, True, bool)),)), relu)
+    self.assertEqual(to_json(relu), {'type': 'call', 'function': 'nn.ReLU', 'args': [], 'keywords': [{'keyword': 'inplace', 'value': {'type': 'constant', 'value': True}}]})
+    # 1 == 1.0 == True, but they are different constants.
+    values = [nodes.node(ConstantNode, value, type(value)).value for value in [1, 1.0, True]]
+    self.assertEqual([type(value) for value in values], [int, float, bool])
+    # Fields that cannot be hashed are not shared.
+    first = nodes.node(CallNode, 'f', ({'type': 'f_string'},), ())
+    self.assertIsNot(nodes.node(CallNode, 'f', ({'type': 'f_string'},), ()), first)
+    self.assertEqual(first.args, [{'type': 'f_string'}])
+
+  def test_shared_subtrees(self):
+    source = 'nn.Sequential(nn.ReLU(inplace = True), nn.Conv2d(3, 64))\nnn.ReLU(inplace = True)\nnn.ReLU(inplace = 1)'
+    sequential, relu, other = ASTConverter().run(ast.parse(source))['calls']
+    self.assertIs(sequential.args[0], relu)
+    self.assertIsNot(other, relu)
+    self.assertIs(other.function, relu.function)
+    self.assertEqual(to_json(other.keywords[0].value), {'type': 'constant', 'value': 1})
+
+  def test_source_segments(self):
+    source = """# -*- coding: latin-1 -*-
+f(a+b, *args, x[1:2, ::3], (yield), lambda: 'é', (c
+  for c in d), k = {'x': y if z else -1})
+def g(p, q:  'int'=1, *r):
+  pass
+""".encode('latin-1')
+    tree = ast.parse(source)
+    lazy = ASTConverter().run(tree, source)
+    segments = [arg for arg in lazy['calls'][0].args if isinstance(arg, SourceSegment)]
+    self.assertEqual(len(segments), 6)
+    self.assertIsInstance(lazy['function_defs'][0].args[1], SourceSegment)
+    self.assertEqual(repr(to_json(lazy)), repr(to_json(ASTConverter().run(tree))))
+
+if __name__ == '__main__':
+  unittest.main()
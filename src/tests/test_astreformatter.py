@@ -194,5 +194,46 @@ x.print(hello = 4)"""
     actual = astreformatter.run(filtered_ast)
     self.assertListEqual(actual, expected)
 
+  def test_repeated_calls(self):
+    # The calls share their keyword node, and the first two calls are a
+    # single node.
+    source ="""
+nn.ReLU(inplace = True)
+nn.ReLU(inplace = True)
+other(inplace = True)
+nn.Sequential(nn.ReLU(inplace = True))"""
+
+    relu = {
+      'type': 'call',
+      'function': 'nn.ReLU',
+      'args': [],
+      'keywords': [{
+        'keyword': 'inplace',
+        'value': True
+      }]
+    }
+    expected = [relu, relu, {
+      'type': 'call',
+      'function': 'other',
+      'args': [],
+      'keywords': [{
+        'keyword': 'inplace',
+        'value': True
+      }]
+    }, relu]
+
+    args = {
+      'nn.ReLU': ['inplace'],
+      'other': ['inplace']
+    }
+    astconverter = ASTConverter()
+    astfilter = ASTFilter(args)
+    astreformatter = ASTReformatter(args)
+    
+    converted_ast = astconverter.run(ast.parse(source))
+    filtered_ast = astfilter.run(converted_ast)
+    actual = astreformatter.run(filtered_ast)
+    self.assertListEqual(actual, expected)
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,79 @@
+import ast
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from ..pipeline.budget import FileSkipped, SkipReport, check_node_budget
+from ..pipeline.supervisor import SupervisedExecutor
+
+class BudgetTestClass(unittest.TestCase):
+  def test_node_budget(self):
+    source = 'x = [' + ', '.join(['a'] * 100) + ']'
+    tree = ast.parse(source)
+    check_node_budget(tree, len(source), 1000)
+    with self.assertRaises(FileSkipped) as context:
+      check_node_budget(tree, len(source), 100)
+    self.assertEqual(context.exception.reason, 'nodes')
+
+  def test_node_budget_not_counted(self):
+    # Small sources cannot exceed the budget, so the tree is not walked.
+    check_node_budget(None, 10, 1000)
+    check_node_budget(None, 10 ** 9, None)
+
+  def test_skip_report(self):
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, 'skipped.jsonl')
+      report = SkipReport(path)
+      report.record('a.py', 'time', 'over 1 s')
+      report.record('b.py', 'binary')
+      report.record('c.py', 'time', 'over 1 s')
+      report.close()
+
+      with open(path) as f:
+        entries = [json.loads(line) for line in f]
+      self.assertListEqual([entry['path'] for entry in entries], ['a.py', 'b.py', 'c.py'])
+      self.assertEqual(entries[0]['reason'], 'time')
+      self.assertEqual(report.summary(), 'Skipped: 1 binary, 2 time (see %s)' % path)
+    self.assertEqual(SkipReport().summary(), 'Skipped: none')
+
+class SupervisedExecutorTestClass(unittest.TestCase):
+  def setUp(self):
+    self.executor = SupervisedExecutor(1, timeout = 2)
+
+  def tearDown(self):
+    self.executor.shutdown()
+
+  def assertSkipped(self, future, reason):
+    with self.assertRaises(FileSkipped) as context:
+      future.result()
+    self.assertEqual(context.exception.reason, reason)
+
+  def test_result(self):
+    self.assertEqual(self.executor.submit(max, 1, 3, 2).result(), 3)
+
+  def test_timeout(self):
+    # The worker is killed and replaced, so later tasks still run.
+    start = time.time()
+    self.assertSkipped(self.executor.submit(time.sleep, 60), 'time')
+    self.assertLess(time.time() - start, 30)
+    self.assertEqual(self.executor.submit(max, 1, 2).result(), 2)
+
+  def test_crash(self):
+    self.assertSkipped(self.executor.submit(os._exit, 1), 'crashed')
+    self.assertEqual(self.executor.submit(max, 1, 2).result(), 2)
+
+  def test_error(self):
+    self.assertSkipped(self.executor.submit(int, 'x'), 'error')
+
+  def test_startup_not_timed(self):
+    # The initialization of the worker does not count against the timeout.
+    executor = SupervisedExecutor(1, initializer = time.sleep, initargs = (1.5,), timeout = 1)
+    try:
+      self.assertEqual(executor.submit(max, 1, 2).result(), 2)
+    finally:
+      executor.shutdown()
+
+if __name__ == '__main__':
+  unittest.main()
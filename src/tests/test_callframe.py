@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..output_gen.callframe import CallColumns, load_calls, pd, pivot_keywords
+from ..output_gen.jsonlsink import CompressedJSONLSink
+from ..output_gen.output import FileSink
+from ..output_gen.sqlitesink import SQLiteSink
+
+def call(function, **keywords):
+  return {'type': 'call', 'function': function, 'args': [], 'keywords': [{'keyword': name, 'value': value} for name, value in keywords.items()]}
+
+@unittest.skipIf(pd == None, 'pandas is not installed')
+class CallFrameTestClass(unittest.TestCase):
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.output_path = os.path.join(self.root, 'outputs')
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def test_load_calls(self):
+    project_path = os.path.join(self.root, 'project')
+    sink = FileSink(project_path, os.path.join(self.output_path, 'first'))
+    sink.write(os.path.join(project_path, 'a.py'), [call('torch.nn.Conv2d', stride = 2, bias = False), call('torch.nn.ReLU')])
+    sink.close()
+    sink = CompressedJSONLSink(project_path, os.path.join(self.output_path, 'shards'), 'owner/repo')
+    sink.write(os.path.join(project_path, 'b.py'), [call('torch.nn.ReLU', inplace = True)])
+    sink.write(os.path.join(project_path, 'c.py'), [call('torch.nn.Conv2d', stride = [1, 1], padding = 'same')])
+    sink.close()
+    sink = SQLiteSink(project_path, os.path.join(self.output_path, 'sqlite'), 'other/repo')
+    sink.write(os.path.join(project_path, 'd.py'), [call('torch.nn.Linear', bias = True, out_features = 10)])
+    sink.close()
+
+    calls, keywords = load_calls(self.output_path)
+    self.assertEqual(list(calls['project_type']), ['first', 'first', 'owner', 'owner', 'other'])
+    self.assertEqual(list(calls['function']), ['torch.nn.Conv2d', 'torch.nn.ReLU', 'torch.nn.ReLU', 'torch.nn.Conv2d', 'torch.nn.Linear'])
+    self.assertEqual(calls.index.name, 'call')
+    self.assertEqual(list(keywords['call']), [0, 0, 2, 3, 3, 4, 4])
+    self.assertEqual(list(keywords['keyword']), ['stride', 'bias', 'inplace', 'stride', 'padding', 'bias', 'out_features'])
+    self.assertEqual(list(keywords['value']), [2, False, True, [1, 1], 'same', True, 10])
+    self.assertIs(keywords['value'][1], False)
+    self.assertEqual(calls['function'].dtype.name, 'category')
+    self.assertEqual(keywords['keyword'].dtype.name, 'category')
+
+  def test_empty(self):
+    os.makedirs(self.output_path)
+    calls, keywords = load_calls(self.output_path)
+    self.assertEqual((len(calls), len(keywords)), (0, 0))
+    self.assertEqual(list(keywords.columns), ['call', 'keyword', 'value'])
+    self.assertEqual(pivot_keywords(keywords).shape, (0, 0))
+
+  def test_pivot_keywords(self):
+    columns = CallColumns()
+    columns.append('first', [call('f', a = 1, b = 'x'), call('g'), call('f', b = None)])
+    # A keyword given twice and a keyword argument without a name.
+    columns.append('second', [{'type': 'call', 'function': 'f', 'args': [], 'keywords': [{'keyword': 'a', 'value': 1}, {'keyword': 'a', 'value': 2}, {'keyword': None, 'value': 3}]}])
+    calls, keywords = columns.frames()
+    self.assertTrue(pd.isna(keywords['keyword'][5]))
+
+    wide = pivot_keywords(keywords)
+    self.assertEqual(list(wide.index), [0, 2, 3])
+    self.assertEqual(list(wide.columns), ['a', 'b'])
+    self.assertEqual(wide.at[0, 'a'], 1)
+    self.assertEqual(wide.at[0, 'b'], 'x')
+    self.assertEqual(wide.at[3, 'a'], 2)
+    self.assertTrue(pd.isna(wide.at[2, 'a']))
+
+    wide = pivot_keywords(keywords, ['b'])
+    self.assertEqual(list(wide.columns), ['b'])
+    self.assertEqual(list(calls.join(wide, how = 'inner')['function']), ['f', 'f'])
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,46 @@
+import shutil
+import tempfile
+import unittest
+
+from ..output_gen.dedupstore import DedupStore, MISSING, dedup_report
+from ..output_gen.manifest import content_hash
+
+class DedupStoreTestClass(unittest.TestCase):
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def test_get_put(self):
+    result = [{'type': 'call', 'function': 'print', 'args': [], 'keywords': [{'keyword': 'test', 'value': 7}]}]
+    digest = content_hash(b'print(test = 7)')
+
+    store = DedupStore(self.root, 'config')
+    self.assertIs(store.get(digest), MISSING)
+    store.put(digest, result)
+    store.put(content_hash(b'x = 1'), None)
+
+    store = DedupStore(self.root, 'config')
+    self.assertListEqual(store.get(digest, 15), result)
+    self.assertIsNone(store.get(content_hash(b'x = 1')))
+    self.assertEqual((store.files, store.hits, store.bytes_reused), (2, 2, 15))
+
+    # Results are not shared between configurations.
+    self.assertIs(DedupStore(self.root, 'other').get(digest), MISSING)
+
+  def test_unserializable_result_is_not_stored(self):
+    store = DedupStore(self.root, 'config')
+    digest = content_hash(b"print(test = b'x')")
+    store.put(digest, [{'type': 'call', 'function': 'print', 'args': [], 'keywords': [{'keyword': 'test', 'value': b'x'}]}])
+    self.assertIs(store.get(digest), MISSING)
+
+  def test_report(self):
+    for hits in range(2):
+      store = DedupStore(self.root, 'config')
+      store.files, store.hits = 4, hits
+      store.record_run('project')
+    self.assertIn('2 projects, 8 files, 1 reused', dedup_report(self.root))
+
+if __name__ == '__main__':
+  unittest.main()
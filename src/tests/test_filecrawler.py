@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..readers.filecrawler import crawl_directory, stream_directory
+
+IGNORE_LIST = {
+  'directories': ['^build/$'],
+  'name_patterns': ['^.*$'],
+  'include_patterns': ['^.*\\.py$'],
+  'include_directories': ['^.*/$']
+}
+
+class FileCrawlerTestClass(unittest.TestCase):
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    for rel_path in ['Test/test.py', 'Test/notes.txt', 'Help/helpers.py', 'Help/deep/er/x.py', 'configs.py', 'build/out.py']:
+      os.makedirs(os.path.dirname(os.path.join(self.root, rel_path)), exist_ok = True)
+      open(os.path.join(self.root, rel_path), 'w').close()
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def test_stream_directory_matches_crawl_directory(self):
+    for workers in [1, 4]:
+      expected = sorted(crawl_directory(self.root, IGNORE_LIST))
+      actual = list(stream_directory(self.root, IGNORE_LIST, workers = workers))
+      self.assertListEqual(sorted(actual), expected)
+      # BFS order: files in the root come before files in subdirectories.
+      self.assertEqual(actual[0], os.path.join(self.root, 'configs.py'))
+
+  def test_stream_directory_single_file(self):
+    path = os.path.join(self.root, 'configs.py')
+    self.assertListEqual(list(stream_directory(path, IGNORE_LIST)), [path])
+
+  def test_stream_directory_symlink_loop(self):
+    os.symlink(self.root, os.path.join(self.root, 'Help', 'loop'))
+    os.symlink(os.path.join(self.root, 'Test'), os.path.join(self.root, 'Help', 'test_link'))
+
+    # Symlinked directories are skipped by default, like os.walk.
+    actual = sorted(os.path.relpath(path, self.root) for path in stream_directory(self.root, IGNORE_LIST))
+    self.assertListEqual(actual, ['Help/deep/er/x.py', 'Help/helpers.py', 'Test/test.py', 'build/out.py', 'configs.py'])
+
+    # When following links, every directory is visited once.
+    actual = sorted(os.path.relpath(path, self.root) for path in stream_directory(self.root, IGNORE_LIST, follow_links = True))
+    self.assertListEqual(actual, ['Help/deep/er/x.py', 'Help/helpers.py', 'Test/test.py', 'build/out.py', 'configs.py'])
+
+  def test_stream_directory_early_exit(self):
+    paths = stream_directory(self.root, IGNORE_LIST)
+    self.assertEqual(next(paths), os.path.join(self.root, 'configs.py'))
+    paths.close()
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,53 @@
+import ast
+import unittest
+
+from ..ast.astfusedfilter import FusedASTFilter
+from ..ast.astreformatter import ASTReformatter
+from ..readers.functionmatcher import FunctionMatcher
+
+ARGS = {
+  'torch.nn.Conv2d': ['in_channels', 'out_channels'],
+  'torch.nn.*': ['inplace'],
+  'torch.*.relu': [],
+  'keras.*.*': ['units'],
+  'print': []
+}
+
+class FunctionMatcherTestClass(unittest.TestCase):
+  def test_exact(self):
+    matcher = FunctionMatcher(ARGS)
+    self.assertEqual(matcher.arguments('torch.nn.Conv2d'), frozenset(['in_channels', 'out_channels']))
+    self.assertEqual(matcher.arguments('print'), frozenset())
+    self.assertTrue(matcher.matches('print'))
+    self.assertFalse(matcher.matches('torch'))
+    self.assertEqual(len(matcher), 5)
+
+  def test_wildcards(self):
+    matcher = FunctionMatcher(ARGS)
+    self.assertEqual(matcher.arguments('torch.nn.ReLU'), frozenset(['inplace']))
+    self.assertEqual(matcher.arguments('keras.layers.Dense'), frozenset(['units']))
+    # A wildcard matches exactly one segment.
+    self.assertIsNone(matcher.arguments('torch.nn.functional.relu'))
+    self.assertIsNone(matcher.arguments('keras.Model'))
+    self.assertIsNone(matcher.arguments('torch.nn'))
+    # Literal segments win over wildcards.
+    self.assertEqual(matcher.arguments('torch.nn.relu'), frozenset(['inplace']))
+    self.assertEqual(matcher.arguments('torch.functional.relu'), frozenset())
+    # Results are cached, including misses.
+    self.assertIsNone(matcher.arguments('torch.nn.functional.relu'))
+    self.assertIn('torch.nn.functional.relu', matcher.cache)
+
+  def test_of(self):
+    matcher = FunctionMatcher(ARGS)
+    self.assertIs(FunctionMatcher.of(matcher), matcher)
+    self.assertTrue(FunctionMatcher.of({'f': []}).matches('f'))
+
+  def test_reformat_with_wildcard(self):
+    source = 'from torch import nn\nnn.ReLU(inplace = True)\nnn.Conv2d(in_channels = 1, out_channels = 2, inplace = 3)\nnn.functional.relu(x)'
+    matcher = FunctionMatcher(ARGS)
+    result = ASTReformatter(matcher).run(FusedASTFilter(matcher).run(ast.parse(source)))
+    self.assertEqual([call['function'] for call in result], ['torch.nn.ReLU', 'torch.nn.Conv2d'])
+    self.assertEqual([keyword['keyword'] for keyword in result[0]['keywords']], ['inplace'])
+
+if __name__ == '__main__':
+  unittest.main()
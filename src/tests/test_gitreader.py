@@ -0,0 +1,61 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from ..readers.gitreader import GitRepository
+
+IGNORE_LIST = {
+  'directories': ['^build/$'],
+  'name_patterns': ['^.*\\.md$'],
+  'include_patterns': [],
+  'include_directories': []
+}
+
+FILES = {
+  'configs.py': b'x = 1\n',
+  'README.md': b'# readme\n',
+  'Test/test.py': b'print(test = 7)\n',
+  'Help/deep/helpers.py': b'# -*- coding: latin-1 -*-\ns = "\xe9"\n',
+  'build/out.py': b'ignored()\n',
+}
+
+@unittest.skipIf(shutil.which('git') == None, 'git is not installed')
+class GitReaderTestClass(unittest.TestCase):
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    work_tree = os.path.join(self.root, 'work')
+    for rel_path, contents in FILES.items():
+      path = os.path.join(work_tree, rel_path)
+      os.makedirs(os.path.dirname(path), exist_ok = True)
+      with open(path, 'wb') as f:
+        f.write(contents)
+    os.symlink('configs.py', os.path.join(work_tree, 'link.py'))
+
+    def git(*args):
+      subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com'] + list(args), cwd = work_tree, check = True, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+    git('init', '-q')
+    git('add', '-A')
+    git('commit', '-q', '-m', 'fixture')
+
+    self.bare_path = os.path.join(self.root, 'repo.git')
+    subprocess.run(['git', 'clone', '-q', '--bare', work_tree, self.bare_path], check = True)
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def test_stream_sources(self):
+    with GitRepository(self.bare_path) as repo:
+      actual = {os.path.relpath(path, self.bare_path): source for path, source in repo.stream_sources(IGNORE_LIST)}
+
+    expected = {rel_path: FILES[rel_path] for rel_path in ['configs.py', 'Test/test.py', 'Help/deep/helpers.py']}
+    self.assertDictEqual(actual, expected)
+
+  def test_non_bare_repository(self):
+    with GitRepository(os.path.join(self.root, 'work')) as repo:
+      rel_paths = sorted(rel_path for rel_path, _ in repo.list_files())
+    self.assertListEqual(rel_paths, sorted(FILES.keys()))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..readers.filecrawler import crawl_directory, is_pattern_match, is_valid_file
+from ..readers.ignore import handle_pattern
+from ..readers.ignorematcher import IgnoreMatcher
+
+def build_ignore_dict(lines):
+  '''Mirrors ignore.create_ignore_dict() for an in-memory list of lines.'''
+  output_dict = {'directories': [], 'name_patterns': [], 'include_patterns': [], 'include_directories': []}
+  for line in lines:
+    if line.startswith('!'):
+      key = 'include_directories' if line.endswith('/') else 'include_patterns'
+      output_dict[key] = output_dict[key] + handle_pattern(line[1:])
+    elif line.endswith('/'):
+      output_dict['directories'] = output_dict['directories'] + handle_pattern(line)
+    else:
+      output_dict['name_patterns'] = output_dict['name_patterns'] + handle_pattern(line)
+  return output_dict
+
+def is_valid_directory(dir_name, ignore_list):
+  '''Directory check as originally written in crawl_directory.'''
+  in_include_list = is_pattern_match(dir_name, ignore_list['include_patterns']) or is_pattern_match(dir_name + '/', ignore_list['include_directories'])
+  in_ignore_list = is_pattern_match(dir_name, ignore_list['name_patterns']) or is_pattern_match(dir_name + '/', ignore_list['directories'])
+  return in_include_list or not in_ignore_list
+
+IGNORE_FILES = [
+  ['!*.py', '!*/', '*'],
+  ['*.pyc', 'build/', 'configs.py', '!keep_configs.py'],
+  ['test_?.py', '*.tar.gz', 'docs/**/build', '!*.md', '*+x.py'],
+  ['!(a|b).py', '[cd].py'],
+  [],
+]
+
+NAMES = [
+  'test.py', 'test_1.py', 'test_12.py', 'configs.py', 'keep_configs.py',
+  'README.md', 'x.pyc', 'a.py', 'b.py', 'c.py', 'd.py', 'archive.tar.gz',
+  'build', 'docs', 'src', '.py', 'py', 'a+x.py', 'aax.py', 'line\nbreak.py',
+  'trailing.py\n', '/abs/path/to/file.py', 'with space.py', 'ümlaut.py'
+]
+
+class IgnoreMatcherTestClass(unittest.TestCase):
+  def test_is_valid_file_matches_original(self):
+    for lines in IGNORE_FILES:
+      ignore_list = build_ignore_dict(lines)
+      matcher = IgnoreMatcher(ignore_list)
+      for name in NAMES:
+        # Checked twice to exercise the memoized path.
+        for _ in range(2):
+          self.assertEqual(matcher.is_valid_file(name), is_valid_file(name, ignore_list), (lines, name))
+
+  def test_is_valid_directory_matches_original(self):
+    for lines in IGNORE_FILES:
+      ignore_list = build_ignore_dict(lines)
+      matcher = IgnoreMatcher(ignore_list)
+      for name in NAMES:
+        for _ in range(2):
+          self.assertEqual(matcher.is_valid_directory(name), is_valid_directory(name, ignore_list), (lines, name))
+
+  def test_crawl_directory(self):
+    root = tempfile.mkdtemp()
+    try:
+      for rel_path in ['Test/test.py', 'Test/notes.txt', 'Help/helpers.py', 'configs.py', 'build/out.py']:
+        os.makedirs(os.path.dirname(os.path.join(root, rel_path)), exist_ok = True)
+        open(os.path.join(root, rel_path), 'w').close()
+
+      ignore_list = build_ignore_dict(['!*.py', '!*/', '*'])
+      actual = sorted(os.path.relpath(path, root) for path in crawl_directory(root, ignore_list))
+      self.assertListEqual(actual, ['Help/helpers.py', 'Test/test.py', 'build/out.py', 'configs.py'])
+
+      ignore_list = build_ignore_dict(['build/', 'configs.py', '*.txt'])
+      actual = sorted(os.path.relpath(path, root) for path in crawl_directory(root, ignore_list))
+      self.assertListEqual(actual, ['Help/helpers.py', 'Test/test.py'])
+    finally:
+      shutil.rmtree(root)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,183 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..output_gen.journal import RunJournal, journal_path, read_journal
+from ..output_gen.jsonlsink import CompressedJSONLSink, JSONLSink, list_shards, read_records
+from ..output_gen.output import FileSink, get_output_file
+from ..output_gen.sqlitesink import DATABASE_NAME, SQLiteSink
+from ..output_gen.sqlitesink import read_records as read_database_records
+
+def calls(index):
+  return [{'type': 'call', 'function': 'print', 'args': [index], 'keywords': []}]
+
+class RunJournalTestClass(unittest.TestCase):
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.project_path = os.path.join(self.root, 'project')
+    self.output_path = os.path.join(self.root, 'output')
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def path(self, index):
+    return os.path.join(self.project_path, '%d.py' % index)
+
+  def journal(self, repo = None):
+    return RunJournal(journal_path(self.output_path, repo), self.project_path)
+
+  def resume(self, sink_class, **kwargs):
+    # Resumes the run over files 0-9 and writes the files that are not done.
+    journal = self.journal('user/repo')
+    sink = sink_class(self.project_path, self.output_path, 'user/repo', journal = journal, **kwargs)
+    completed = journal.resume(sink)
+    for index in range(10):
+      if '%d.py' % index not in completed:
+        sink.write(self.path(index), calls(index))
+    sink.close()
+    journal.remove()
+    return completed
+
+  def test_file_sink(self):
+    journal = self.journal()
+    sink = FileSink(self.project_path, self.output_path, journal = journal)
+    for index in range(3):
+      sink.write(self.path(index), calls(index))
+    journal.record(self.path(3))
+    # The run is killed: the output of a file is cut off and another file
+    # is not recorded.
+    with open(get_output_file(self.path(1), self.project_path, self.output_path), 'r+b') as f:
+      f.truncate(10)
+    sink.write(self.path(4), calls(4))
+    journal.close()
+    with open(journal.path, 'rb+') as f:
+      f.truncate(f.seek(0, os.SEEK_END) - 3)
+    # It was killed while writing the output of another file.
+    with open(get_output_file(self.path(5), self.project_path, self.output_path) + '.tmp', 'wb') as f:
+      f.write(b'[{"type"')
+
+    journal = self.journal()
+    completed = journal.resume(FileSink(self.project_path, self.output_path, journal = journal))
+    self.assertEqual(completed, {'0.py', '2.py', '3.py'})
+    self.assertEqual([rel_path for rel_path, _ in read_journal(journal.path)[1]], ['0.py', '2.py', '3.py'])
+    journal.remove()
+    self.assertEqual(sorted(os.listdir(self.output_path)), ['0_py_output.json', '1_py_output.json', '2_py_output.json', '4_py_output.json'])
+
+  def test_no_output(self):
+    journal = self.journal()
+    sink = FileSink(self.project_path, self.output_path, journal = journal)
+    journal.record(self.path(0))
+    sink.close()
+    journal.remove()
+    self.assertFalse(os.path.exists(self.output_path))
+
+  def test_complete(self):
+    journal = self.journal('user/repo')
+    sink = JSONLSink(self.project_path, self.output_path, 'user/repo', journal = journal)
+    sink.write(self.path(0), calls(0))
+    sink.close()
+    self.assertFalse(journal.is_complete())
+    journal.complete()
+    self.assertTrue(self.journal('user/repo').is_complete())
+    self.assertEqual(read_journal(journal.path)[1], [('0.py', [0, os.path.getsize(list_shards(self.output_path)[0])])])
+    # A new run overwrites the journal.
+    journal = self.journal('user/repo')
+    journal.record(self.path(0))
+    self.assertFalse(journal.is_complete())
+    journal.close()
+
+  def test_jsonl_sink(self):
+    sink = JSONLSink(self.project_path, self.output_path, 'user/first')
+    sink.write(self.path(0), calls(0))
+    sink.close()
+
+    journal = self.journal('user/repo')
+    sink = JSONLSink(self.project_path, self.output_path, 'user/repo', max_bytes = 200, journal = journal)
+    for index in range(6):
+      sink.write(self.path(index), calls(index))
+    # Records are written when a shard is rotated.
+    done = set(rel_path for rel_path, _ in read_journal(journal.path)[1])
+    self.assertTrue(0 < len(done) < 6)
+    # The run is killed after writing part of the buffered records.
+    sink.shard_file.write(b''.join(sink.buffer)[:30])
+    sink.shard_file.close()
+    journal.close()
+    self.assertGreater(len(list_shards(self.output_path)), 2)
+
+    completed = self.resume(JSONLSink, max_bytes = 200)
+    self.assertEqual(completed, done)
+    records = list(read_records(self.output_path))
+    self.assertEqual([record['repo'] for record in records], ['user/first'] + ['user/repo'] * 10)
+    self.assertEqual(sorted(record['calls'][0]['args'][0] for record in records[1:]), list(range(10)))
+
+  def test_compressed_sink(self):
+    journal = self.journal('user/repo')
+    sink = CompressedJSONLSink(self.project_path, self.output_path, 'user/repo', block_bytes = 150, journal = journal)
+    for index in range(5):
+      sink.write(self.path(index), calls(index))
+    done = set(rel_path for rel_path, _ in read_journal(journal.path)[1])
+    # The run is killed after a block is listed in the index but before its
+    # files are recorded.
+    sink.journal = None
+    sink.finish_block()
+    sink.shard_file.close()
+    sink.index_file.close()
+    journal.close()
+
+    completed = self.resume(CompressedJSONLSink, block_bytes = 150)
+    self.assertTrue(0 < len(completed) < 5)
+    self.assertTrue(completed <= done)
+    records = list(read_records(self.output_path))
+    self.assertEqual(sorted(record['calls'][0]['args'][0] for record in records), list(range(10)))
+
+  def test_shared_directory(self):
+    for sink_class in (JSONLSink, CompressedJSONLSink):
+      shutil.rmtree(self.output_path, ignore_errors = True)
+      journal = self.journal('user/repo')
+      sink = sink_class(self.project_path, self.output_path, 'user/repo', journal = journal)
+      sink.write(self.path(0), calls(0))
+      sink.close()
+      sink = sink_class(self.project_path, self.output_path, 'user/repo', journal = journal)
+      for index in range(1, 4):
+        sink.write(self.path(index), calls(index))
+      # The run is killed after writing records that are not recorded, and
+      # part of one more, then another repository is appended.
+      if sink_class == JSONLSink:
+        sink.shard_file.write(b''.join(sink.buffer))
+        sink.shard_file.write(sink.encode(self.path(4), calls(4))[:20])
+      else:
+        sink.journal = None
+        sink.finish_block()
+        sink.index_file.close()
+      sink.shard_file.close()
+      journal.close()
+      sink = sink_class(self.project_path, self.output_path, 'user/other')
+      sink.write(self.path(0), calls(0))
+      sink.close()
+
+      completed = self.resume(sink_class)
+      self.assertEqual(completed, set('%d.py' % index for index in range(4)))
+      records = list(read_records(self.output_path))
+      self.assertEqual([record['repo'] for record in records], ['user/repo'] * 4 + ['user/other'] + ['user/repo'] * 6)
+      self.assertEqual([record['calls'][0]['args'][0] for record in records], [0, 1, 2, 3, 0] + list(range(4, 10)))
+
+  def test_sqlite_sink(self):
+    journal = self.journal('user/repo')
+    sink = SQLiteSink(self.project_path, self.output_path, 'user/repo', batch_size = 3, journal = journal)
+    for index in range(8):
+      sink.write(self.path(index), calls(index))
+    # The run is killed after the third batch is committed but before its
+    # files are recorded.
+    sink.journal = None
+    sink.flush()
+    sink.connection.close()
+    journal.close()
+
+    completed = self.resume(SQLiteSink, batch_size = 3)
+    self.assertEqual(completed, set('%d.py' % index for index in range(6)))
+    records = list(read_database_records(os.path.join(self.output_path, DATABASE_NAME)))
+    self.assertEqual(sorted(record['calls'][0]['args'][0] for record in records), list(range(10)))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,151 @@
+import gzip
+import json
+import lzma
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..output_gen.jsonlsink import BLOCK_SECONDS, WRITE_BUFFER_SECONDS, CompressedJSONLSink, JSONLSink, list_shards, read_index, read_records
+
+class JSONLSinkTestClass(unittest.TestCase):
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.project_path = os.path.join(self.root, 'project')
+    self.output_path = os.path.join(self.root, 'output')
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def calls(self, index):
+    return [{'type': 'call', 'function': 'print', 'args': [], 'keywords': [{'keyword': 'end', 'value': {'type': 'constant', 'value': str(index)}}]}]
+
+  def test_records(self):
+    sink = JSONLSink(self.project_path, self.output_path, 'user/repo')
+    sink.write(os.path.join(self.project_path, 'pkg', 'a.py'), self.calls(0))
+    sink.write(os.path.join(self.project_path, 'b.py'), self.calls(1))
+    sink.close()
+
+    shards = list_shards(self.output_path)
+    self.assertEqual(len(shards), 1)
+    with open(shards[0], 'rb') as f:
+      lines = f.read().split(b'\n')
+    self.assertEqual(lines[-1], b'')
+    self.assertEqual(json.loads(lines[0]), {'repo': 'user/repo', 'path': os.path.join('pkg', 'a.py'), 'calls': self.calls(0)})
+    self.assertNotIn(b': ', lines[0])
+    self.assertEqual([record['path'] for record in read_records(self.output_path)], [os.path.join('pkg', 'a.py'), 'b.py'])
+
+    # A record cut off by a crash is left out.
+    with open(shards[0], 'ab') as f:
+      f.write(b'{"repo":"user/repo","pa')
+    self.assertEqual([record['path'] for record in read_records(self.output_path)], [os.path.join('pkg', 'a.py'), 'b.py'])
+
+  def test_rotation(self):
+    line_size = len(json.dumps({'repo': 'user/repo', 'path': 'a.py', 'calls': self.calls(0)}, separators = (',', ':'))) + 1
+    sink = JSONLSink(self.project_path, self.output_path, 'user/repo', max_bytes = 2 * line_size)
+    for index in range(5):
+      sink.write(os.path.join(self.project_path, 'a.py'), self.calls(index))
+    sink.close()
+
+    shards = list_shards(self.output_path)
+    self.assertEqual([os.path.basename(shard) for shard in shards], ['calls-00000.jsonl', 'calls-00001.jsonl', 'calls-00002.jsonl'])
+    for shard in shards:
+      self.assertLessEqual(os.path.getsize(shard), 2 * line_size)
+    self.assertEqual([record['calls'] for record in read_records(self.output_path)], [self.calls(index) for index in range(5)])
+
+  def test_oversized_record(self):
+    # A record larger than a shard gets a shard of its own.
+    sink = JSONLSink(self.project_path, self.output_path, 'user/repo', max_bytes = 10)
+    sink.write(os.path.join(self.project_path, 'a.py'), self.calls(0))
+    sink.write(os.path.join(self.project_path, 'b.py'), self.calls(1))
+    sink.close()
+
+    self.assertEqual(len(list_shards(self.output_path)), 2)
+
+  def test_append_to_last_shard(self):
+    sink = JSONLSink(self.project_path, self.output_path, 'user/first')
+    sink.write(os.path.join(self.project_path, 'a.py'), self.calls(0))
+    sink.close()
+    sink = JSONLSink(self.project_path, self.output_path, 'user/second')
+    sink.write(os.path.join(self.project_path, 'a.py'), self.calls(1))
+    sink.close()
+
+    self.assertEqual(len(list_shards(self.output_path)), 1)
+    self.assertEqual([record['repo'] for record in read_records(self.output_path)], ['user/first', 'user/second'])
+
+  def test_poll(self):
+    # Buffered records are written once they are old enough, also if no
+    # other record arrives.
+    sink = JSONLSink(self.project_path, self.output_path, 'user/repo')
+    sink.write(os.path.join(self.project_path, 'a.py'), self.calls(0))
+    sink.poll()
+    self.assertEqual(list(read_records(self.output_path)), [])
+    sink.flush_time -= WRITE_BUFFER_SECONDS
+    sink.poll()
+    self.assertEqual(len(list(read_records(self.output_path))), 1)
+    sink.close()
+
+    sink = CompressedJSONLSink(self.project_path, self.output_path, 'user/repo')
+    sink.write(os.path.join(self.project_path, 'a.py'), self.calls(1))
+    sink.poll()
+    self.assertEqual(len(list(read_records(self.output_path))), 1)
+    sink.block_time -= BLOCK_SECONDS
+    sink.poll()
+    self.assertEqual(len(list(read_records(self.output_path))), 2)
+    sink.close()
+
+  def test_no_output(self):
+    sink = JSONLSink(self.project_path, self.output_path, 'user/repo')
+    sink.close()
+
+    self.assertFalse(os.path.exists(self.output_path))
+    self.assertEqual(list(read_records(self.output_path)), [])
+
+  def write_repo(self, repo, files, **kwargs):
+    sink = CompressedJSONLSink(self.project_path, self.output_path, repo, **kwargs)
+    for index in range(files):
+      sink.write(os.path.join(self.project_path, '%d.py' % index), self.calls(index))
+    sink.close()
+
+  def test_compressed(self):
+    for compression, open_shard in (('gzip', gzip.open), ('lzma', lzma.open)):
+      self.write_repo('user/first', 10, compression = compression, block_bytes = 500)
+      self.write_repo('user/second', 3, compression = compression, block_bytes = 500)
+
+      shards = list_shards(self.output_path)
+      self.assertEqual(len(shards), 1)
+      blocks = read_index(shards[0])
+      self.assertGreater(len(blocks), 2)
+      self.assertEqual(sum(block['records'] for block in blocks), 13)
+
+      # Shards are complete .gz and .xz files as well.
+      with open_shard(shards[0], 'rb') as f:
+        self.assertEqual([json.loads(line) for line in f], list(read_records(self.output_path)))
+      self.assertEqual([record['repo'] for record in read_records(self.output_path)], ['user/first'] * 10 + ['user/second'] * 3)
+      self.assertEqual([record['calls'] for record in read_records(self.output_path, repo = 'user/second')], [self.calls(index) for index in range(3)])
+      shutil.rmtree(self.output_path)
+
+  def test_compressed_rotation(self):
+    self.write_repo('user/repo', 50, block_bytes = 300, max_bytes = 500)
+
+    shards = list_shards(self.output_path)
+    self.assertGreater(len(shards), 1)
+    self.assertEqual([record['calls'] for record in read_records(self.output_path)], [self.calls(index) for index in range(50)])
+
+  def test_compressed_crash(self):
+    self.write_repo('user/first', 5)
+    shard = list_shards(self.output_path)[0]
+    # A block and an index line cut off by a crash.
+    with open(shard, 'ab') as f:
+      f.write(gzip.compress(b'{"repo":"user/lost"}\n')[:10])
+    with open(shard + '.idx', 'ab') as f:
+      f.write(b'{"offset":')
+    self.assertEqual(len(list(read_records(self.output_path))), 5)
+
+    self.write_repo('user/second', 2)
+    self.assertEqual([record['repo'] for record in read_records(self.output_path)], ['user/first'] * 5 + ['user/second'] * 2)
+    with gzip.open(shard, 'rb') as f:
+      self.assertEqual(len(f.read().splitlines()), 7)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..output_gen.manifest import Manifest, config_hash, content_hash
+from ..output_gen.output import create_output_directory, remove_output_file
+
+class ManifestTestClass(unittest.TestCase):
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.project_path = os.path.join(self.root, 'project')
+    self.output_path = os.path.join(self.root, 'output')
+    os.makedirs(self.project_path)
+    os.makedirs(self.output_path)
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def write_file(self, rel_path, source):
+    path = os.path.join(self.project_path, rel_path)
+    with open(path, 'wb') as f:
+      f.write(source)
+    return path
+
+  def test_unchanged_and_changed_files(self):
+    config = config_hash({'print': ['test']})
+    path = self.write_file('test.py', b'print(test = 1)')
+    stat = os.stat(path)
+
+    manifest = Manifest.load(self.output_path, config)
+    self.assertFalse(manifest.is_unchanged('test.py', stat))
+    manifest.update('test.py', stat, content_hash(b'print(test = 1)'))
+    manifest.save()
+
+    manifest = Manifest.load(self.output_path, config)
+    self.assertTrue(manifest.is_unchanged('test.py', stat))
+    self.assertTrue(manifest.has_hash('test.py', content_hash(b'print(test = 1)')))
+    self.assertFalse(manifest.has_hash('test.py', content_hash(b'print(test = 2)')))
+
+    # A different configuration invalidates every entry.
+    manifest = Manifest.load(self.output_path, config_hash({'print': []}))
+    self.assertFalse(manifest.is_unchanged('test.py', stat))
+
+  def test_removed_paths(self):
+    manifest = Manifest(self.output_path)
+    stat = os.stat(self.write_file('a.py', b''))
+    manifest.update('a.py', stat, content_hash(b''))
+    manifest.update('b.py', stat, content_hash(b''))
+    manifest.save()
+
+    manifest = Manifest.load(self.output_path)
+    manifest.is_unchanged('a.py', stat)
+    self.assertListEqual(manifest.removed_paths(), ['b.py'])
+    self.assertListEqual(list(manifest.files.keys()), ['a.py'])
+
+  def test_remove_output_file(self):
+    path = os.path.join(self.project_path, 'sub', 'test.py')
+    output_file = create_output_directory(path, self.project_path, self.output_path)
+    open(output_file, 'w').close()
+
+    remove_output_file(path, self.project_path, self.output_path)
+    self.assertFalse(os.path.exists(output_file))
+    self.assertFalse(os.path.exists(os.path.dirname(output_file)))
+    self.assertTrue(os.path.exists(self.output_path))
+
+if __name__ == '__main__':
+  unittest.main()
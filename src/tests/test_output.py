@@ -0,0 +1,61 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..output_gen.output import FileSink, get_output_file
+from ..output_gen.serializer import StdlibSerializer
+
+class FileSinkTestClass(unittest.TestCase):
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.project_path = os.path.join(self.root, 'project')
+    self.output_path = os.path.join(self.root, 'output')
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def read_output(self, rel_path):
+    with open(get_output_file(os.path.join(self.project_path, rel_path), self.project_path, self.output_path), 'rb') as f:
+      return f.read()
+
+  def test_write(self):
+    result = [{'type': 'call', 'function': 'print', 'args': [], 'keywords': []}]
+    sink = FileSink(self.project_path, self.output_path)
+    sink.write(os.path.join(self.project_path, 'pkg', 'a.py'), result)
+    sink.write(os.path.join(self.project_path, 'pkg', 'b.py'), result)
+    sink.close()
+
+    self.assertEqual(self.read_output(os.path.join('pkg', 'a.py')), json.dumps(result, indent = 2).encode())
+    self.assertEqual(json.loads(self.read_output(os.path.join('pkg', 'b.py'))), result)
+
+    sink = FileSink(self.project_path, self.output_path, StdlibSerializer())
+    sink.write(os.path.join(self.project_path, 'c.py'), result)
+    self.assertEqual(self.read_output('c.py'), json.dumps(result, separators = (',', ':')).encode())
+
+  def test_write_after_remove(self):
+    # Directories left empty by remove() are created again.
+    sink = FileSink(self.project_path, self.output_path)
+    sink.write(os.path.join(self.project_path, 'pkg', 'a.py'), [])
+    sink.remove(os.path.join(self.project_path, 'pkg', 'a.py'))
+    self.assertFalse(os.path.exists(os.path.join(self.output_path, 'pkg')))
+    sink.write(os.path.join(self.project_path, 'pkg', 'b.py'), [])
+    sink.close()
+
+    self.assertEqual(self.read_output(os.path.join('pkg', 'b.py')), b'[]')
+
+  def test_write_error(self):
+    # A result that cannot be serialized is rejected before anything is
+    # written, and the temporary file of a write that fails is removed.
+    sink = FileSink(self.project_path, self.output_path)
+    with self.assertRaises(TypeError):
+      sink.encode(os.path.join(self.project_path, 'pkg', 'a.py'), [{'type': 'constant', 'value': Ellipsis}])
+    self.assertFalse(os.path.exists(self.output_path))
+    with self.assertRaises(TypeError):
+      sink.write_encoded(os.path.join(self.project_path, 'pkg', 'a.py'), 'not bytes')
+    sink.close()
+    self.assertListEqual(os.listdir(os.path.join(self.output_path, 'pkg')), [])
+
+if __name__ == '__main__':
+  unittest.main()
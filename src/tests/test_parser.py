@@ -0,0 +1,58 @@
+import ast
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..readers.parser import SNIFF_BYTES, check_source, parse_source, read_source
+
+class ParserTestClass(unittest.TestCase):
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def write_file(self, name, contents):
+    path = os.path.join(self.root, name)
+    with open(path, 'wb') as f:
+      f.write(contents)
+    return path
+
+  def test_encoding_declaration(self):
+    path = self.write_file('latin.py', b'# -*- coding: latin-1 -*-\ns = "\xe9"\n')
+    source, reason = read_source(path)
+    self.assertIsNone(reason)
+    tree = parse_source(path, source)
+    self.assertEqual(tree.body[0].value.value, '\xe9')
+
+  def test_byte_order_mark(self):
+    path = self.write_file('bom.py', b'\xef\xbb\xbfx = 1\n')
+    tree = parse_source(path, read_source(path)[0])
+    self.assertIsInstance(tree.body[0], ast.Assign)
+
+  def test_large_file(self):
+    contents = b'x = 1\n' * (SNIFF_BYTES // 3)
+    source, reason = read_source(self.write_file('large.py', contents))
+    self.assertEqual(bytes(source), contents)
+    self.assertIsNone(reason)
+
+  def test_binary_file(self):
+    path = self.write_file('binary.py', b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR')
+    self.assertEqual(read_source(path), (None, 'binary'))
+    self.assertEqual(check_source(b'x = 1\x00'), 'binary')
+    # NUL bytes past the first bytes are left to the parser.
+    self.assertIsNone(check_source(b'#' * SNIFF_BYTES + b'\x00'))
+
+  def test_oversized_file(self):
+    path = self.write_file('big.py', b'x = 1\n' * 100)
+    self.assertEqual(read_source(path, max_bytes = 100), (None, 'oversized'))
+    self.assertEqual(check_source(b'x = 1\n' * 100, max_bytes = 100), 'oversized')
+    self.assertIsNone(read_source(path, max_bytes = 600)[1])
+
+  def test_empty_file(self):
+    source, reason = read_source(self.write_file('empty.py', b''))
+    self.assertEqual((bytes(source), reason), (b'', None))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,191 @@
+from concurrent.futures.process import BrokenProcessPool
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from ..output_gen.dedupstore import MISSING
+from ..output_gen.output import FileSink
+from ..output_gen.sqlitesink import DATABASE_NAME, SQLiteSink, read_records
+from ..pipeline.budget import SkipReport
+from ..pipeline.pipeline import Pipeline
+from ..pipeline.stages import FileTask, WriteStage, skip_failed_task
+from ..ast.astcache import converter_fingerprint
+from ..pipeline.workers import AnalysisPool, analysis_fingerprint
+
+class PipelineTestClass(unittest.TestCase):
+  def test_run(self):
+    pipeline = Pipeline(queue_size = 2)
+    pipeline.add_stage('double', lambda x: x * 2)
+    pipeline.add_stage('drop_odd_tens', lambda x: None if x % 20 == 10 else x)
+    self.assertListEqual(list(pipeline.run(range(10))), [0, 2, 4, 6, 8, 12, 14, 16, 18])
+
+  def test_backpressure(self):
+    # The source can only run ahead of the consumer by the capacity of the
+    # queues between the stages.
+    produced = []
+    def source():
+      for i in range(100):
+        produced.append(i)
+        yield i
+
+    pipeline = Pipeline(queue_size = 2)
+    pipeline.add_stage('identity', lambda x: x)
+    items = pipeline.run(source())
+    self.assertEqual(next(items), 0)
+    self.assertLessEqual(len(produced), 1 + 3 * 2 + 2)
+    items.close()
+
+  def test_stage_error(self):
+    def fail(x):
+      if x == 3:
+        raise ValueError('bad item')
+      return x
+
+    pipeline = Pipeline()
+    pipeline.add_stage('fail', fail)
+    with self.assertRaises(RuntimeError) as context:
+      list(pipeline.run(range(10)))
+    self.assertIsInstance(context.exception.__cause__, ValueError)
+
+  def test_on_error(self):
+    def fail(x):
+      if x == 3:
+        raise ValueError('bad item')
+      return x
+
+    errors = []
+    def on_error(name, item, exception):
+      errors.append((name, item))
+      return -item
+
+    pipeline = Pipeline(on_error = on_error)
+    pipeline.add_stage('fail', fail)
+    self.assertListEqual(list(pipeline.run(range(5))), [0, 1, 2, -3, 4])
+    self.assertListEqual(errors, [('fail', 3)])
+
+    # Errors of a stage that does not handle them stop the pipeline.
+    pipeline = Pipeline(on_error = on_error)
+    pipeline.add_stage('identity', lambda x: x)
+    pipeline.add_stage('fail', fail, handle_errors = False)
+    with self.assertRaises(RuntimeError):
+      list(pipeline.run(range(5)))
+    self.assertListEqual(errors, [('fail', 3)])
+
+  def test_on_idle(self):
+    # The stage is idle while the source waits.
+    idle = []
+    def source():
+      yield 1
+      time.sleep(0.5)
+      yield 2
+
+    pipeline = Pipeline()
+    pipeline.add_stage('identity', lambda x: x, on_idle = lambda: idle.append(len(idle)))
+    self.assertListEqual(list(pipeline.run(source())), [1, 2])
+    self.assertGreater(len(idle), 1)
+
+  def test_drain(self):
+    # The items taken from the source before drain() still come out.
+    pipeline = Pipeline(queue_size = 2)
+    pipeline.add_stage('identity', lambda x: x)
+    items = pipeline.run(range(100))
+    results = [next(items)]
+    pipeline.drain()
+    results.extend(items)
+    self.assertLess(len(results), 100)
+    self.assertListEqual(results, list(range(len(results))))
+
+  def test_stop(self):
+    pipeline = Pipeline(queue_size = 2)
+    pipeline.add_stage('identity', lambda x: x)
+    items = pipeline.run(range(100))
+    self.assertEqual(next(items), 0)
+    pipeline.stop()
+    self.assertListEqual(list(items), [])
+
+class WriteStageTestClass(unittest.TestCase):
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.project_path = os.path.join(self.root, 'project')
+    self.output_path = os.path.join(self.root, 'output')
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def task(self, name, value):
+    task = FileTask(os.path.join(self.project_path, name))
+    task.result = [{'type': 'call', 'function': 'torch.nn.Softmax', 'args': [], 'keywords': [{'keyword': 'dim', 'value': value}]}]
+    return task
+
+  def test_unserializable(self):
+    # A keyword value of '...' cannot be serialized, so the file is skipped
+    # without adding any of its rows and the other files are written.
+    skip_report = SkipReport()
+    sink = SQLiteSink(self.project_path, self.output_path, 'user/repo')
+    write_stage = WriteStage(sink, on_error = skip_failed_task(skip_report))
+    for name, value in (('a.py', 1), ('b.py', [Ellipsis]), ('c.py', -1)):
+      write_stage(self.task(name, value))
+    sink.close()
+
+    self.assertEqual(write_stage.written, 2)
+    self.assertDictEqual(skip_report.counts, {'error': 1})
+    records = list(read_records(os.path.join(self.output_path, DATABASE_NAME)))
+    self.assertListEqual([record['path'] for record in records], ['a.py', 'c.py'])
+    self.assertListEqual([record['calls'][0]['keywords'][0]['value'] for record in records], [1, -1])
+
+    # Without an on_error function the error fails the stage.
+    sink = SQLiteSink(self.project_path, self.output_path, 'user/repo')
+    with self.assertRaises(TypeError):
+      WriteStage(sink)(self.task('b.py', Ellipsis))
+    sink.close()
+
+  def test_write_error(self):
+    # Errors of the write itself fail the stage even with an on_error
+    # function, so that the file is not recorded as having no output.
+    class ClosedSink(FileSink):
+      def write_encoded(self, path, data):
+        raise ValueError('I/O operation on closed file')
+
+    skip_report = SkipReport()
+    write_stage = WriteStage(ClosedSink(self.project_path, self.output_path), on_error = skip_failed_task(skip_report))
+    with self.assertRaises(ValueError):
+      write_stage(self.task('a.py', 1))
+    self.assertDictEqual(skip_report.counts, {})
+
+class AnalysisPoolTestClass(unittest.TestCase):
+  def test_analysis_fingerprint(self):
+    # The fingerprint covers more modules than that of the converter cache.
+    self.assertEqual(analysis_fingerprint(), analysis_fingerprint())
+    self.assertEqual(len(analysis_fingerprint()), 12)
+    self.assertNotEqual(analysis_fingerprint(), converter_fingerprint())
+
+  def test_killed_worker(self):
+    # A worker that is killed breaks the pool, which fails the run instead
+    # of skipping every file after it.
+    pool = AnalysisPool(1, {'print': []})
+    def source():
+      task = FileTask('0.py', b'print(1)')
+      yield task
+      while task.result is MISSING:
+        time.sleep(0.01)
+      for process in list(pool.executor._processes.values()):
+        process.kill()
+      for index in range(1, 4):
+        yield FileTask('%d.py' % index, b'print(1)')
+
+    skip_report = SkipReport()
+    pipeline = Pipeline(on_error = skip_failed_task(skip_report))
+    pipeline.add_stage('submit', pool.submit)
+    pipeline.add_stage('collect', pool.collect)
+    try:
+      with self.assertRaises(RuntimeError) as context:
+        list(pipeline.run(source()))
+    finally:
+      pool.close()
+    self.assertIsInstance(context.exception.__cause__, BrokenProcessPool)
+    self.assertDictEqual(skip_report.counts, {})
+
+if __name__ == '__main__':
+  unittest.main()
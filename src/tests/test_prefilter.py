@@ -0,0 +1,62 @@
+import ast
+import unittest
+
+from ..ast.astconverter import ASTConverter
+from ..ast.astfilter import ASTFilter
+from ..ast.astreformatter import ASTReformatter
+from ..readers.prefilter import SourcePrefilter, build_trie_pattern
+
+ARGS = {
+  'torch.nn.Conv2d': ['in_channels', 'out_channels'],
+  'torch.nn.ReLU': ['inplace'],
+  'print': ['end']
+}
+
+SOURCES = [
+  b'import torch.nn as nn\nnn.Conv2d(in_channels = 3, out_channels = 8)',
+  b'from torch.nn import ReLU as R\nR(inplace = True)',
+  b'from torch import nn\nx = [nn.ReLU(inplace = True)]',
+  b'print("hello", end = "")',
+  b'import numpy as np\nnp.zeros(3)',
+  b'torch_nn.Conv2dx(in_channels = 3, out_channels = 8)',
+  b'# torch is only in a comment\nConv2d(3)',
+  # Identifiers are NFKC normalized by Python: \xef\xbd\x90 is a fullwidth 'p'.
+  'ｐrint(end = "")'.encode('utf-8'),
+]
+
+def has_output(source):
+  converted_ast = ASTConverter().run(ast.parse(source))
+  filtered_ast = ASTFilter(ARGS).run(converted_ast)
+  return filtered_ast != None and len(ASTReformatter(ARGS).run(filtered_ast)) > 0
+
+class PrefilterTestClass(unittest.TestCase):
+  def test_build_trie_pattern(self):
+    self.assertEqual(build_trie_pattern(['Conv1d', 'Conv2d', 'Linear']), b'(?:Conv(?:1d|2d)|Linear)')
+    self.assertEqual(build_trie_pattern(['nn', 'nnx']), b'nn(?:x)?')
+
+  def test_never_rejects_files_with_output(self):
+    prefilter = SourcePrefilter(ARGS)
+    for source in SOURCES:
+      if has_output(source):
+        self.assertTrue(prefilter.accepts(source), source)
+
+  def test_rejects_files_without_candidates(self):
+    prefilter = SourcePrefilter(ARGS)
+    self.assertFalse(prefilter.accepts(b'import numpy as np\nnp.zeros(3)'))
+    self.assertFalse(prefilter.accepts(b'torch_nn.Conv2dx(in_channels = 3, out_channels = 8)'))
+    self.assertTrue(prefilter.accepts(b'# torch is only in a comment\nConv2d(3)'))
+    self.assertEqual((prefilter.files, prefilter.rejected), (3, 2))
+
+  def test_disabled_for_non_identifier_names(self):
+    prefilter = SourcePrefilter({'x[0]': []})
+    self.assertTrue(prefilter.accepts(b'y = 1'))
+
+  def test_wildcards(self):
+    prefilter = SourcePrefilter({'torch.nn.*': ['inplace'], 'keras.*.Dense': []})
+    self.assertTrue(prefilter.accepts(b'from torch import nn\nnn.Anything()'))
+    self.assertTrue(prefilter.accepts(b'from keras.layers import Dense\nDense(3)'))
+    self.assertFalse(prefilter.accepts(b'import keras\nkeras.Model()'))
+    self.assertTrue(SourcePrefilter({'*.relu': []}).accepts(b'y = 1'))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,50 @@
+import io
+import json
+import unittest
+
+from ..output_gen.serializer import ORJSONSerializer, StdlibSerializer, get_serializer, orjson
+
+RESULT = [{'type': 'call', 'function': 'torch.nn.Conv2d', 'args': [{'type': 'constant', 'value': 3}, ('a', 1.5)], 'keywords': [{'keyword': 'bias', 'value': {'type': 'constant', 'value': None}}]}]
+
+class SerializerTestClass(unittest.TestCase):
+  def test_stdlib(self):
+    self.assertEqual(StdlibSerializer().dumps(RESULT), json.dumps(RESULT, separators = (',', ':')).encode())
+    self.assertEqual(StdlibSerializer(indent = 2).dumps(RESULT), json.dumps(RESULT, indent = 2).encode())
+
+    output_file = io.BytesIO()
+    StdlibSerializer(indent = 2).dump(RESULT, output_file)
+    self.assertEqual(output_file.getvalue(), json.dumps(RESULT, indent = 2).encode())
+
+  def test_get_serializer(self):
+    self.assertIsInstance(get_serializer(), StdlibSerializer)
+    self.assertIsInstance(get_serializer('stdlib'), StdlibSerializer)
+    self.assertEqual(get_serializer('auto').name, 'orjson' if orjson != None else 'stdlib')
+    self.assertIsNone(get_serializer('unknown'))
+
+  @unittest.skipIf(orjson == None, 'orjson is not installed')
+  def test_orjson(self):
+    for indent in (None, 2):
+      self.assertEqual(ORJSONSerializer(indent).dumps(RESULT), StdlibSerializer(indent).dumps(RESULT))
+    self.assertRaises(ValueError, ORJSONSerializer, 4)
+
+    value = [{'type': 'constant', 'value': 'Größe'}]
+    self.assertEqual(json.loads(ORJSONSerializer().dumps(value)), value)
+
+  @unittest.skipIf(orjson == None, 'orjson is not installed')
+  def test_orjson_fallback(self):
+    # orjson rejects these values, so they are serialized by the json module.
+    for value in ([{'type': 'constant', 'value': 1 << 70}], [{'type': 'constant', 'value': '\ud800'}]):
+      self.assertEqual(ORJSONSerializer().dumps(value), StdlibSerializer().dumps(value))
+
+  @unittest.skipIf(orjson == None, 'orjson is not installed')
+  def test_orjson_non_finite(self):
+    # orjson writes non-finite floats as null, so they are serialized by the
+    # json module instead.
+    for number in (float('inf'), float('-inf')):
+      value = [{'type': 'constant', 'value': number}, {'type': 'constant', 'value': None}]
+      self.assertEqual(json.loads(ORJSONSerializer().dumps(value)), json.loads(StdlibSerializer().dumps(value)))
+    value = [{'type': 'constant', 'value': float('nan')}]
+    self.assertEqual(ORJSONSerializer().dumps(value), StdlibSerializer().dumps(value))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,67 @@
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..output_gen.sqlitesink import DATABASE_NAME, SQLiteSink, connect, find_repos, read_records
+
+def conv(stride, bias = False):
+  return {'type': 'call', 'function': 'torch.nn.Conv2d', 'args': [3, 64], 'keywords': [{'keyword': 'stride', 'value': stride}, {'keyword': 'bias', 'value': bias}]}
+
+class SQLiteSinkTestClass(unittest.TestCase):
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.project_path = os.path.join(self.root, 'project')
+    self.output_path = os.path.join(self.root, 'output')
+    self.database_path = os.path.join(self.output_path, DATABASE_NAME)
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def write_repo(self, repo, results, batch_size = 2):
+    sink = SQLiteSink(self.project_path, self.output_path, repo, batch_size)
+    for index, result in enumerate(results):
+      sink.write(os.path.join(self.project_path, 'pkg', '%d.py' % index), result)
+    sink.close()
+
+  def test_records(self):
+    # Keyword values that are not SQL values are stored as JSON.
+    results = [[conv(2), conv(1, None)], [], [conv('(2, 2)', [1, 1]), conv(1.5, 1 << 70)], [conv(float('nan'))]]
+    self.write_repo('user/repo', results)
+
+    records = list(read_records(self.database_path))
+    self.assertEqual([record['path'] for record in records], [os.path.join('pkg', '%d.py' % index) for index in range(4)])
+    self.assertEqual([record['calls'] for record in records][:3], results[:3])
+    self.assertTrue(math.isnan(records[3]['calls'][0]['keywords'][0]['value']))
+
+  def test_find_repos(self):
+    self.write_repo('user/first', [[conv(2)], [conv(1)]])
+    self.write_repo('user/second', [[conv(1, True)]])
+
+    connection = connect(self.database_path)
+    self.assertEqual(find_repos(connection, 'torch.nn.Conv2d'), ['user/first', 'user/second'])
+    self.assertEqual(find_repos(connection, 'torch.nn.Conv2d', 'stride', 2), ['user/first'])
+    self.assertEqual(find_repos(connection, 'torch.nn.Conv2d', 'bias', True), ['user/second'])
+    # Booleans are not compared equal to integers.
+    self.assertEqual(find_repos(connection, 'torch.nn.Conv2d', 'stride', True), [])
+    self.assertEqual(find_repos(connection, 'torch.nn.Linear'), [])
+    connection.close()
+
+  def test_replace_repo(self):
+    self.write_repo('user/first', [[conv(2)], [conv(1)], [conv(3)]])
+    self.write_repo('user/second', [[conv(1)]])
+    self.write_repo('user/first', [[conv(4)]])
+
+    records = list(read_records(self.database_path))
+    self.assertEqual([(record['repo'], record['calls']) for record in records], [('user/second', [conv(1)]), ('user/first', [conv(4)])])
+    self.assertEqual([record['calls'] for record in read_records(self.database_path, repo = 'user/first')], [[conv(4)]])
+
+  def test_no_output(self):
+    sink = SQLiteSink(self.project_path, self.output_path, 'user/repo')
+    sink.close()
+
+    self.assertFalse(os.path.exists(self.output_path))
+
+if __name__ == '__main__':
+  unittest.main()